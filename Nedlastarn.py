@@ -1,24 +1,43 @@
-import os
+import time
+_T0 = time.perf_counter()  # Starttidspunkt for oppstartsrapporten
 import sys
+
+if __name__ == "__main__" and ("--batch" in sys.argv or "--resume" in sys.argv):
+    # Hodeløs kjøring (server/cron): ingen Tk eller customtkinter
+    from nedlastarn_cli import main
+    sys.exit(main(sys.argv[1:]))
+
+import os
 import json
-import threading
 import queue
-import shutil
+import threading
 from pathlib import Path
+from typing import TYPE_CHECKING
 import tkinter as tk
 from tkinter import filedialog, messagebox
 import customtkinter as ctk
 
+from nedlastarn_config import (DEFAULT_CONFIG, LOG_PATH, LOG_MAX_LINES, REPORT_DIR, get_file_logger,
+                               load_config, save_config, ensure_ffmpeg_on_path, _check_ffmpeg, autodetect_browser,
+                               format_eta, parse_work_hours)
+from nedlastarn_urls import UrlAnalyzer
 
 # Avhengigheter:
 # pip install yt-dlp customtkinter pyperclip (pyperclip er valgfri)
-try:
-    from yt_dlp import YoutubeDL
-    from yt_dlp.utils import DownloadError, DownloadCancelled
-except Exception as e:
-    raise SystemExit(
-        "Mangler 'yt_dlp'. Installer med: pip install yt-dlp\nFeil: " + str(e)
-    )
+# yt-dlp (nedlastarn_core) lastes i bakgrunnen etter at vinduet vises – se App._warm_up
+if TYPE_CHECKING:
+    from nedlastarn_core import Downloader
+
+# Visningsnavn i GUI-et → verdier for Downloader
+QUALITY_CHOICES = {"Beste": "best", "1080p": "1080p", "720p": "720p", "480p": "480p"}
+BROWSER_CHOICES = {"Ingen": "none", "Chrome": "chrome", "Edge": "edge", "Firefox": "firefox"}
+PLAYLIST_CHOICES = {"Alle": None, "Kun første": "1", "Spør": "ASK"}
+ANALYZE_DELAY_MS = 400  # URL-analyse og forhåndshenting starter når brukeren har sluttet å skrive/lime inn så lenge
+INVALID_MARK_MAX = 1000  # Maks antall ugyldige linjer som markeres i URL-feltet
+INVALID_SHOW_MAX = 20  # Maks antall ugyldige linjer som listes i feilmeldingen
+URL_INFO_LINES = 4  # Linjer med forhåndshentet info som vises under URL-feltet
+JOB_STATE_LABELS = {"queued": "I kø", "paused": "Pauset", "running": "Laster ned", "postprocessing": "Etterbehandler",
+                    "done": "Ferdig", "skipped": "Hoppet over", "failed": "Feilet", "cancelled": "Avbrutt"}
 
 # Valgfri avhengighet for utklippstavle
 HAS_PYPERCLIP = False
@@ -29,250 +48,8 @@ except ImportError:
     pass
 
 
-APP_NAME = "Nedlastarn"
-CONFIG_DIR = Path(os.environ.get("APPDATA", str(Path.home()))) / APP_NAME
-CONFIG_PATH = CONFIG_DIR / "config.json"
-
-# Konstanter for filnavn-maler
-DEFAULT_OUTPUT_TEMPLATE = "%(title)s [%(id)s].%(ext)s"
-SIMPLE_OUTPUT_TEMPLATE = "%(title)s.%(ext)s"
-
-
-
-
-def ensure_ffmpeg_on_path():
-    app_dir = Path(getattr(sys, "_MEIPASS", Path(__file__).resolve().parent))
-    candidates = [
-        app_dir / "ffmpeg.exe",
-        Path.cwd() / "ffmpeg.exe",
-        Path(os.environ.get("PROGRAMFILES", "")) / "ffmpeg/bin/ffmpeg.exe",
-        Path(os.environ.get("PROGRAMFILES(X86)", "")) / "ffmpeg/bin/ffmpeg.exe",
-    ]
-    if shutil.which("ffmpeg"):
-        return
-    for exe in candidates:
-        if exe and exe.exists():
-            os.environ["PATH"] = str(exe.parent) + os.pathsep + os.environ.get("PATH", "")
-            break
-
-
-ensure_ffmpeg_on_path()
-
-
-BROWSER_CANDIDATES = {
-    "chrome": [
-        Path(os.environ.get("PROGRAMFILES", "")) / "Google/Chrome/Application/chrome.exe",
-        Path(os.environ.get("PROGRAMFILES(X86)", "")) / "Google/Chrome/Application/chrome.exe",
-        Path.home() / "AppData/Local/Google/Chrome/Application/chrome.exe",
-    ],
-    "edge": [
-        Path(os.environ.get("PROGRAMFILES", "")) / "Microsoft/Edge/Application/msedge.exe",
-        Path(os.environ.get("PROGRAMFILES(X86)", "")) / "Microsoft/Edge/Application/msedge.exe",
-        Path.home() / "AppData/Local/Microsoft/Edge/Application/msedge.exe",
-    ],
-    "firefox": [
-        Path(os.environ.get("PROGRAMFILES", "")) / "Mozilla Firefox/firefox.exe",
-        Path(os.environ.get("PROGRAMFILES(X86)", "")) / "Mozilla Firefox/firefox.exe",
-        Path.home() / "AppData/Local/Mozilla Firefox/firefox.exe",
-    ],
-}
-
-
-def _check_ffmpeg() -> bool:
-    """Sjekk om FFmpeg er tilgjengelig"""
-    return shutil.which("ffmpeg") is not None
-
-
-def autodetect_browser() -> str:
-    for key, paths in BROWSER_CANDIDATES.items():
-        for p in paths:
-            if p and p.exists():
-                return key
-    return "none"
-
-
-DEFAULT_CONFIG = {
-    "keep_norwegian_chars": False,
-    "default_dir": str(Path.home() / "Nedlastinger"),
-    "overwrite_existing": False,
-    "dark_mode": True,
-}
-
-
-def load_config() -> dict:
-    try:
-        if CONFIG_PATH.exists():
-            return {**DEFAULT_CONFIG, **json.loads(CONFIG_PATH.read_text(encoding="utf-8"))}
-    # Din forbedrede feilhåndtering:
-    except (json.JSONDecodeError, PermissionError) as e:
-        print(f"Advarsel: Kunne ikke laste konfigurasjonsfilen ({CONFIG_PATH}). Bruker standardinnstillinger. Feil: {e}")
-    except Exception as e:
-        # En generell fallback for andre uventede feil
-        print(f"Advarsel: En uventet feil oppstod ved lasting av config. Bruker standardinnstillinger. Feil: {e}")
-   
-    return DEFAULT_CONFIG.copy()
-
-
-def save_config(cfg: dict):
-    try:
-        CONFIG_DIR.mkdir(parents=True, exist_ok=True)
-        CONFIG_PATH.write_text(json.dumps(cfg, indent=2, ensure_ascii=False), encoding="utf-8")
-    except Exception as e:
-        print("Kunne ikke lagre config:", e)
-
-
-class Downloader(threading.Thread):
-    def __init__(self, urls: list[str], out_dir: Path, mode: str, quality: str,
-                 browser: str, keep_norwegian: bool, overwrites: bool, msgs: queue.Queue,
-                 mp3_quality: str = "192", playlist_items: str | None = None):
-        super().__init__(daemon=True)
-        self.urls = urls
-        self.out_dir = out_dir
-        self.mode = mode
-        self.quality = quality
-        self.browser = browser
-        self.keep_norwegian = keep_norwegian
-        self.overwrites = overwrites
-        self.msgs = msgs
-        self.mp3_quality = mp3_quality
-        self.playlist_items = playlist_items
-        self._cancel = False
-        self._last_filename = None
-        self._last_pl_index = None
-        self._pl_decision_q: queue.Queue[str] = queue.Queue()
-
-
-    def log(self, text: str):
-        self.msgs.put(("log", text))
-
-
-    def prog(self, pct: float | None, speed_bps: float | None, eta_s: int | None, filename: str | None = None, item_info: dict | None = None):
-        self.msgs.put(("progress", pct, speed_bps, eta_s, filename, item_info))
-
-
-    def _request_playlist_decision(self, approx_total):
-        self.msgs.put(("ask_playlist", approx_total))
-
-
-    def set_playlist_decision(self, choice: str):
-        self._pl_decision_q.put(choice)
-
-
-    def progress_hook(self, d):
-        if self._cancel:
-            raise DownloadCancelled("User cancelled")
-        status = d.get("status")
-        info = d.get("info_dict", {}) or {}
-        fname = d.get("filename") or info.get("_filename")
-        if fname:
-            self._last_filename = fname
-        pl_index = info.get("playlist_index")
-        n_entries = info.get("n_entries") or info.get("playlist_count")
-        if pl_index and pl_index != self._last_pl_index:
-            self._last_pl_index = pl_index
-            total = int(n_entries) if n_entries else "?"
-            self.log(f"  Spilleliste-element: {pl_index} av {total}")
-        item_info = {"i": None, "n": None, "title": info.get("title")}
-        try:
-            if pl_index: item_info["i"] = int(pl_index)
-            if n_entries: item_info["n"] = int(n_entries)
-        except Exception: pass
-        if status == "downloading":
-            p = d.get("downloaded_bytes", 0)
-            t = d.get("total_bytes") or d.get("total_bytes_estimate", 0)
-            pct = (p / t * 100) if t else 0
-            spd = d.get("speed")
-            eta = d.get("eta")
-            if item_info.get("i") and item_info.get("n"):
-                overall_pct = ((item_info["i"] - 1) + (pct / 100.0)) / item_info["n"] * 100.0
-            else:
-                overall_pct = pct
-            self.prog(overall_pct, spd, eta, fname, item_info)
-        elif status == "finished":
-            self.log("  Ferdig nedlastet. Konverterer (ffmpeg)…")
-            self.prog(100.0, None, None, fname, item_info)
-
-
-    def _fmt_for_quality(self):
-        hmax = {"1080p": 1080, "720p": 720, "480p": 480}.get(self.quality)
-        if self.mode == "mp3": return "bestaudio/best"
-        if hmax: return f"bv*[height<={hmax}]+ba/best[height<={hmax}]"
-        return "bv*+ba/best"
-
-
-    def run(self):
-        try:
-            self.out_dir.mkdir(parents=True, exist_ok=True)
-            base_opts = {
-                "outtmpl": str(self.out_dir / DEFAULT_OUTPUT_TEMPLATE),
-                "progress_hooks": [self.progress_hook], "noprogress": True, "nopart": True,
-                "concurrent_fragment_downloads": 5, "retries": 5, "fragment_retries": 5,
-                "socket_timeout": 20, "overwrites": self.overwrites,
-                "restrictfilenames": not self.keep_norwegian, "windowsfilenames": True,
-                "trim_file_name": 200, "download_archive": str(self.out_dir / "downloaded.txt"),
-                "quiet": True, "no_warnings": True, "extractor_args": {"youtube": {"skip": ["translated_subs"]}},
-                "postprocessor_hooks": [lambda d: (_ for _ in ()).throw(DownloadCancelled("User cancelled")) if self._cancel else None],
-            }
-            fmt = self._fmt_for_quality()
-            for url in self.urls:
-                if self._cancel: raise DownloadCancelled("User cancelled")
-                self.log(f"\n▶ Nedlasting: {url}")
-                self.prog(0.0, None, None, None)
-                is_nrk_url = "nrk.no" in url.lower()
-                if self.mode == "mp4":
-                    merge_fmt, pp_key = ("mkv", "FFmpegVideoRemuxer") if is_nrk_url else ("mp4", "FFmpegVideoConvertor")
-                    ydl_opts = {**base_opts, "format": fmt, "merge_output_format": merge_fmt, "postprocessors": [{"key": pp_key, "preferedformat": merge_fmt}]}
-                elif self.mode == "mp3":
-                    ydl_opts = {**base_opts, "format": fmt, "postprocessors": [{"key": "FFmpegExtractAudio", "preferredcodec": "mp3", "preferredquality": self.mp3_quality}, {"key": "EmbedThumbnail"}, {"key": "FFmpegMetadata"}], "writethumbnail": True}
-                else:
-                    ydl_opts = {**base_opts, "format": fmt}
-                if self.browser and self.browser.lower() != "none":
-                    ydl_opts["cookiesfrombrowser"] = (self.browser.lower(),)
-                    self.log(f"Bruker cookies fra nettleser: {self.browser}")
-                if self.playlist_items and self.playlist_items != "ASK":
-                    ydl_opts["playlist_items"] = self.playlist_items
-                with YoutubeDL(ydl_opts) as ydl:
-                    self.log("Starter nedlasting…")
-                    info = ydl.extract_info(url, download=False)
-                    is_playlist = isinstance(info, dict) and info.get("entries") is not None
-                    if is_playlist and self.playlist_items == "ASK":
-                        approx_total = info.get("n_entries") or info.get("playlist_count") or "?"
-                        self._request_playlist_decision(approx_total)
-                        decision = self._pl_decision_q.get(timeout=3600)
-                        if decision == "cancel": raise DownloadCancelled("User cancelled")
-                        elif decision == "first": ydl.params["playlist_items"] = "1"
-                        else: ydl.params.pop("playlist_items", None)
-                    final_path = None
-                    if not is_playlist and isinstance(info, dict):
-                        prep_name = ydl.prepare_filename(info)
-                        if self.mode == "mp3": final_path = Path(prep_name).with_suffix(".mp3")
-                        elif self.mode == "mp4": final_path = Path(prep_name).with_suffix(".mkv" if is_nrk_url else ".mp4")
-                        else: final_path = Path(prep_name)
-                        if prep_name: self._last_filename = str(final_path)
-                    elif is_playlist: self.log("📜 Playliste oppdaget – flere filer forventes.")
-                    if not is_playlist and final_path and final_path.exists():
-                        if not self.overwrites:
-                            self.log(f"⚠ Fil finnes allerede – hopper over: {final_path.name}")
-                            continue
-                        else: self.log(f"↻ Overskriver eksisterende fil: {final_path.name}")
-                    ydl.download([url])
-                self.prog(100.0, None, None, self._last_filename)
-                if self._last_filename: self.log(f"✅ Lagret: {Path(self._last_filename).name}")
-                else: self.log("✅ Ferdig for denne URLen.")
-                self._last_filename = None
-            self.log(f"\n🎉 Alle nedlastinger fullført. Filer i: {self.out_dir}")
-        except DownloadCancelled: self.log("⛔ Avbrutt.")
-        except DownloadError as e: self.log(f"❌ Nedlastingsfeil: {e}")
-        except FileNotFoundError: self.log("❌ FFmpeg ikke funnet. Legg ffmpeg.exe i samme mappe.")
-        except Exception as e: self.log(f"❌ Uventet feil: {e}")
-
-
-    def cancel(self):
-        self._cancel = True
-
-
 class App(ctk.CTk):
-    def __init__(self):
+    def __init__(self, startup_report: str | None = None):
         super().__init__()
         self.cfg = load_config()
         # Sett dark mode basert på konfigurasjon
@@ -292,11 +69,122 @@ class App(ctk.CTk):
         self.geometry(f"980x720+{x}+{y}")
        
         self.worker: Downloader | None = None
+        self._job_progress: dict[int, tuple] = {}
+        self._shown_text: dict = {}
+        self._shown_bar = 0.0
+        self._pending_log: list[str] = []
+        self._file_log = get_file_logger()
+        self.core = None  # nedlastarn_core, satt når oppvarmingen er ferdig
+        self.info_cache = None
+        self.cookie_store = None
+        self.fragment_tuner = None
+        self.journal = None
+        self.prefetcher = None
+        self._url_info: dict[str, dict] = {}  # URL → sammendrag fra Prefetcher
+        self._analysis: dict | None = None  # Siste resultat fra UrlAnalyzer
+        self._analysis_gen = 0
+        self._analyze_job = None
+        self._analyzed_text: str | None = None
+        self._queue_win = None
+        self._queue_dirty = False
+        self._queue_ids: list[int] = []
+        self.detected_browser = "none"
+        self._startup_report = startup_report
+        self._startup_times: dict[str, float] = {}
+        self._window_at: float | None = None
         self.msg_q: queue.Queue[str] = queue.Queue()
+        self.url_analyzer = UrlAnalyzer(lambda gen, result: self.msg_q.put(("urls_analyzed", gen, result)))
         self._build_ui()
         self._poll_messages()
         self._try_enable_dnd()
-        self._update_nrk_hint()
+        self.after_idle(self._on_window_shown)
+        threading.Thread(target=self._warm_up, daemon=True, name="Nedlastarn-warmup").start()
+
+
+    def _on_window_shown(self):
+        self._startup_times["window"] = time.perf_counter() - _T0
+        self._window_at = time.time()  # Veggklokke, så measure_startup.py kan måle fra prosessstart
+
+
+    def _warm_up(self):
+        """Tungt oppstartsarbeid i bakgrunnen: yt-dlp med extractorer, ffmpeg-søk og nettleserdeteksjon"""
+        t = time.perf_counter()
+        try:
+            import nedlastarn_core as core
+        except BaseException as e:  # nedlastarn_core kaster SystemExit når yt-dlp mangler
+            self.msg_q.put(("warm_up_failed", str(e)))
+            return
+        core.warm_up()
+        self._startup_times["yt_dlp"] = time.perf_counter() - t
+        t = time.perf_counter()
+        ensure_ffmpeg_on_path()
+        self.detected_browser = autodetect_browser()
+        self._startup_times["probes"] = time.perf_counter() - t
+        self.msg_q.put(("warm_up_done", core))
+
+
+    def _on_warm_up_done(self, core):
+        self.core = core
+        self.info_cache = core.InfoCache.from_config(self.cfg)
+        self.cookie_store = core.CookieStore.from_config(self.cfg)
+        self.fragment_tuner = core.FragmentTuner.from_config(self.cfg)
+        self.journal = core.BatchJournal()
+        if self.cfg.get("prefetch_enabled", DEFAULT_CONFIG["prefetch_enabled"]):
+            self.prefetcher = core.Prefetcher(cookie_store=self.cookie_store)
+        # Analyser på nytt med extractor-basert duplikatnøkkel og spillelistegjenkjenning
+        self.url_analyzer.set_classifier(core.classify_url)
+        self._schedule_analysis(force=True)
+        self._startup_times["ready"] = time.perf_counter() - _T0
+        self.btn_start.configure(text="Last ned", state="normal")
+        times = self._startup_times
+        self._log(f"⏱ Oppstart: vindu {times.get('window', 0):.2f} s, klar {times['ready']:.2f} s "
+                  f"(yt-dlp {times['yt_dlp']:.2f} s, ffmpeg/nettleser {times['probes']:.2f} s i bakgrunnen)")
+        self._log("Klar. Lim inn én eller flere URLer og trykk 'Last ned'.")
+        if self._startup_report:
+            self._write_startup_report()
+        else:
+            self._offer_resume()
+
+
+    def _write_startup_report(self):
+        """Skriv oppstartstidene som JSON (brukes av measure_startup.py) og lukk"""
+        report = {k: round(v, 4) for k, v in self._startup_times.items()}
+        report.update(window_at=self._window_at, ready_at=time.time())
+        if self._startup_report == "-": print(json.dumps(report))
+        else: Path(self._startup_report).write_text(json.dumps(report), encoding="utf-8")
+        self.after(50, self.destroy)
+
+
+    def _offer_resume(self):
+        """Tilby å fortsette en batch som krasjet eller ble avbrutt forrige gang"""
+        pending = self.journal.pending()
+        if not pending: return
+        self._flush_log()
+        mb = pending["bytes_done"] / 1024 / 1024
+        if not messagebox.askyesno("Uferdig batch", f"Forrige batch ble ikke fullført: {len(pending['urls'])} URL(er) gjenstår"
+                                   f"{f' ({mb:.0f} MB allerede lastet ned)' if mb >= 1 else ''}.\n\nFortsette der den stoppet?"):
+            self.journal.discard(pending["id"])
+            return
+        settings = pending["settings"]
+        self.url_box.delete("1.0", tk.END)
+        self.url_box.insert("1.0", "\n".join(pending["urls"]) + "\n")
+        self.dir_var.set(settings["out_dir"])
+        self.format_var.set(settings["mode"])
+        if settings.get("outputs"):
+            for mode, var in self.output_vars.items(): var.set(any(m == mode for m, _ in settings["outputs"]))
+        self.quality_var.set({v: k for k, v in QUALITY_CHOICES.items()}.get(settings["quality"], "Beste"))
+        self.mp3_quality_var.set(settings["mp3_quality"])
+        self.browser_var.set({v: k for k, v in BROWSER_CHOICES.items()}.get(settings["browser"], "Ingen"))
+        self.pl_mode_var.set({v: k for k, v in PLAYLIST_CHOICES.items()}.get(settings["playlist_items"], "Spør"))
+        self._toggle_quality_state()
+        self._schedule_analysis()
+        self._start_download(batch_id=pending["id"])
+
+
+    def _core_ready(self) -> bool:
+        if self.core is None:
+            self._log("⏳ Starter fortsatt opp – prøv igjen om et øyeblikk.")
+        return self.core is not None
 
 
     def _build_ui(self):
@@ -313,11 +201,16 @@ class App(ctk.CTk):
         ctk.CTkLabel(url_row, text="Video-URL(er) – én per linje").pack(anchor="w")
         self.url_box = ctk.CTkTextbox(url_row, height=160)
         self.url_box.pack(fill="x", expand=True)
-        self.url_box.bind("<KeyRelease>", self._update_nrk_hint)
+        self.url_box.tag_config("invalid_url", foreground="#e5534b", underline=True)
+        self.url_box.bind("<KeyRelease>", self._schedule_analysis)
         btns = ctk.CTkFrame(url_row)
         btns.pack(fill="x", pady=(6, 0))
         ctk.CTkButton(btns, text="Lim inn", command=self._paste_clipboard).pack(side="left")
-        ctk.CTkButton(btns, text="Tøm", command=lambda: (self.url_box.delete("1.0", tk.END), self._update_nrk_hint())).pack(side="left", padx=(8, 0))
+        ctk.CTkButton(btns, text="Tøm", command=lambda: (self.url_box.delete("1.0", tk.END), self._schedule_analysis())).pack(side="left", padx=(8, 0))
+        self.url_counts = ctk.CTkLabel(btns, text="")
+        self.url_counts.pack(side="left", padx=(12, 0))
+        self.url_info = ctk.CTkLabel(url_row, text="", justify="left", anchor="w", font=("Consolas", 11))
+        self.url_info.pack(anchor="w", pady=(4, 0))
         self.nrk_hint = ctk.CTkLabel(url_row, text="", wraplength=700)
         self.nrk_hint.pack(anchor="w", pady=(4, 0))
         dir_row = ctk.CTkFrame(container)
@@ -333,31 +226,42 @@ class App(ctk.CTk):
         fmt_frame.pack(side="left", padx=(0, 8))
         ctk.CTkLabel(fmt_frame, text="Format").pack(anchor="w")
         self.format_var = tk.StringVar(value="mp4")
-        for text, val in (("MP4 (video)", "mp4"), ("MP3 (kun lyd)", "mp3"), ("Behold original", "best")):
+        for text, val in (("MP4 (video)", "mp4"), ("MP3 (kun lyd)", "mp3"), ("Behold original", "best"), ("Flere (én nedlasting)", "multi")):
             ctk.CTkRadioButton(fmt_frame, text=text, value=val, variable=self.format_var, command=self._toggle_quality_state).pack(anchor="w")
+        # Utformatene i flerformat-modus; MP4 bruker valgt kvalitet og MP3 valgt MP3-kvalitet
+        outputs_row = ctk.CTkFrame(fmt_frame, fg_color="transparent")
+        outputs_row.pack(anchor="w", padx=(24, 0))
+        self.output_vars = {"mp4": tk.BooleanVar(value=True), "mp3": tk.BooleanVar(value=True), "best": tk.BooleanVar(value=False)}
+        self.output_boxes = [ctk.CTkCheckBox(outputs_row, text=text, variable=self.output_vars[val], width=60, state="disabled",
+                                             command=self._render_url_info)
+                             for text, val in (("MP4", "mp4"), ("MP3", "mp3"), ("Original", "best"))]
+        for box in self.output_boxes: box.pack(side="left")
         qual_frame = ctk.CTkFrame(row2)
         qual_frame.pack(side="left", padx=(8, 8))
         ctk.CTkLabel(qual_frame, text="Kvalitet").pack(anchor="w")
         self.quality_var = tk.StringVar(value="Beste")
-        self.quality_box = ctk.CTkComboBox(qual_frame, variable=self.quality_var, state="readonly", values=["Beste", "1080p", "720p", "480p"])
+        self.quality_box = ctk.CTkComboBox(qual_frame, variable=self.quality_var, state="readonly", values=["Beste", "1080p", "720p", "480p"],
+                                           command=lambda _: self._render_url_info())
         self.quality_box.pack()
         mp3_frame = ctk.CTkFrame(row2)
         mp3_frame.pack(side="left", padx=(8, 8))
         ctk.CTkLabel(mp3_frame, text="MP3-kvalitet (kbps)").pack(anchor="w")
         self.mp3_quality_var = tk.StringVar(value="192")
-        self.mp3_quality_box = ctk.CTkComboBox(mp3_frame, variable=self.mp3_quality_var, state="disabled", values=["128", "192", "256", "320"])
+        self.mp3_quality_box = ctk.CTkComboBox(mp3_frame, variable=self.mp3_quality_var, state="disabled", values=["128", "192", "256", "320"],
+                                               command=lambda _: self._render_url_info())
         self.mp3_quality_box.pack()
         cookie_frame = ctk.CTkFrame(row2)
         cookie_frame.pack(side="left", padx=(8, 8))
         ctk.CTkLabel(cookie_frame, text="Cookies fra nettleser").pack(anchor="w")
-        # Auto-detect browser hvis mulig
-        detected_browser = autodetect_browser()
+        # Nettleserdeteksjonen kjører i oppvarmingstråden (self.detected_browser)
         browser_values = ["Ingen", "Chrome", "Edge", "Firefox"]
         default_browser = "Ingen"  # Endret fra autodetektert til alltid "Ingen"
         
         self.browser_var = tk.StringVar(value=default_browser)
-        self.browser_box = ctk.CTkComboBox(cookie_frame, variable=self.browser_var, state="readonly", values=browser_values)
+        self.browser_box = ctk.CTkComboBox(cookie_frame, variable=self.browser_var, state="readonly", values=browser_values,
+                                           command=lambda _: self._submit_prefetch())
         self.browser_box.pack()
+        ctk.CTkButton(cookie_frame, text="Oppdater cookies", height=24, command=self._refresh_cookies).pack(fill="x", pady=(4, 0))
         pl_frame = ctk.CTkFrame(row2)
         pl_frame.pack(side="left", padx=(8, 0))
         ctk.CTkLabel(pl_frame, text="Spillelistehåndtering").pack(anchor="w")
@@ -366,12 +270,14 @@ class App(ctk.CTk):
         self.pl_mode_box.pack()
         btn_row = ctk.CTkFrame(container)
         btn_row.pack(fill="x", padx=pad, pady=8)
-        self.btn_start = ctk.CTkButton(btn_row, text="Last ned", command=self._start_download)
+        self.btn_start = ctk.CTkButton(btn_row, text="Starter opp…", command=self._start_download, state="disabled")
         self.btn_start.pack(side="left")
         self.btn_cancel = ctk.CTkButton(btn_row, text="Avbryt", command=self._cancel_download, state="disabled")
         self.btn_cancel.pack(side="left", padx=(8, 0))
         self.btn_open = ctk.CTkButton(btn_row, text="Åpne mappe", command=self._open_folder)
         self.btn_open.pack(side="left", padx=(8, 0))
+        ctk.CTkButton(btn_row, text="Kø", width=70, command=self._open_queue).pack(side="left", padx=(8, 0))
+        ctk.CTkButton(btn_row, text="Åpne logg", command=self._open_log_file).pack(side="right")
         prog_frame = ctk.CTkFrame(container)
         prog_frame.pack(fill="x", padx=pad, pady=(5, 0))
         self.progbar = ctk.CTkProgressBar(prog_frame)
@@ -381,25 +287,27 @@ class App(ctk.CTk):
         self.speed_label.pack(side="left")
         self.current_item_label = ctk.CTkLabel(prog_frame, text="Element: –")
         self.current_item_label.pack(side="left", padx=(10, 0))
+        self.pp_label = ctk.CTkLabel(prog_frame, text="")
+        self.pp_label.pack(side="left", padx=(10, 0))
         log_frame = ctk.CTkFrame(container)
         log_frame.pack(fill="both", expand=True, padx=pad, pady=(5, pad))
         self.log = ctk.CTkTextbox(log_frame, state="disabled")
         self.log.pack(fill="both", expand=True)
-        self._log("Klar. Lim inn én eller flere URLer og trykk 'Last ned'.")
+        self._log("⏳ Laster yt-dlp i bakgrunnen…")
 
 
     def _open_settings(self):
         win = ctk.CTkToplevel(self)
         win.title("Innstillinger")
-        win.geometry("520x300")
+        win.geometry("520x680")
         win.resizable(False, False)
         win.transient(self); win.grab_set()
         
         # Sentrer vinduet på hovedvinduet
         win.update_idletasks()  # Oppdater vinduet før vi beregner posisjon
         x = self.winfo_x() + (self.winfo_width() // 2) - (520 // 2)
-        y = self.winfo_y() + (self.winfo_height() // 2) - (300 // 2)
-        win.geometry(f"520x300+{x}+{y}")
+        y = self.winfo_y() + (self.winfo_height() // 2) - (680 // 2)
+        win.geometry(f"520x680+{x}+{y}")
         frm = ctk.CTkFrame(win); frm.pack(fill="both", expand=True, padx=14, pady=14)
         self.keep_norw_var = tk.BooleanVar(value=self.cfg.get("keep_norwegian_chars", False))
         ctk.CTkCheckBox(frm, text="Behold norske tegn i filnavn (æ/ø/å)", variable=self.keep_norw_var).pack(anchor="w", pady=(0,8))
@@ -407,6 +315,53 @@ class App(ctk.CTk):
         ctk.CTkCheckBox(frm, text="Overskriv eksisterende filer", variable=self.overwrite_var).pack(anchor="w", pady=(0,8))
         self.dark_mode_var = tk.BooleanVar(value=self.cfg.get("dark_mode", True))
         ctk.CTkCheckBox(frm, text="Mørk modus", variable=self.dark_mode_var).pack(anchor="w", pady=(0,8))
+        par_row = ctk.CTkFrame(frm); par_row.pack(fill="x", pady=(0,8))
+        ctk.CTkLabel(par_row, text="Samtidige nedlastinger:").pack(side="left")
+        self.max_workers_var = tk.StringVar(value=str(self.cfg.get("max_workers", DEFAULT_CONFIG["max_workers"])))
+        ctk.CTkComboBox(par_row, variable=self.max_workers_var, state="readonly", width=70, values=[str(n) for n in range(1, 9)]).pack(side="left", padx=(8,16))
+        ctk.CTkLabel(par_row, text="Maks per nettsted:").pack(side="left")
+        self.per_host_var = tk.StringVar(value=str(self.cfg.get("per_host_limit", DEFAULT_CONFIG["per_host_limit"])))
+        ctk.CTkComboBox(par_row, variable=self.per_host_var, state="readonly", width=70, values=[str(n) for n in range(1, 5)]).pack(side="left", padx=(8,0))
+        frag_row = ctk.CTkFrame(frm); frag_row.pack(fill="x", pady=(0,8))
+        ctk.CTkLabel(frag_row, text="Fragmenter:").pack(side="left")
+        fixed = self.cfg.get("fragment_concurrency", DEFAULT_CONFIG["fragment_concurrency"])
+        self.frag_fixed_var = tk.StringVar(value=str(fixed) if fixed else "Auto")
+        ctk.CTkComboBox(frag_row, variable=self.frag_fixed_var, state="readonly", width=80, values=["Auto"] + [str(n) for n in range(1, 33)]).pack(side="left", padx=(8,16))
+        ctk.CTkLabel(frag_row, text="Auto min:").pack(side="left")
+        self.frag_min_var = tk.StringVar(value=str(self.cfg.get("fragment_min", DEFAULT_CONFIG["fragment_min"])))
+        ctk.CTkComboBox(frag_row, variable=self.frag_min_var, state="readonly", width=60, values=[str(n) for n in range(1, 17)]).pack(side="left", padx=(8,16))
+        ctk.CTkLabel(frag_row, text="maks:").pack(side="left")
+        self.frag_max_var = tk.StringVar(value=str(self.cfg.get("fragment_max", DEFAULT_CONFIG["fragment_max"])))
+        ctk.CTkComboBox(frag_row, variable=self.frag_max_var, state="readonly", width=60, values=[str(n) for n in range(2, 33)]).pack(side="left", padx=(8,0))
+        seg_row = ctk.CTkFrame(frm); seg_row.pack(fill="x", pady=(0,8))
+        ctk.CTkLabel(seg_row, text="Tilkoblinger per stor fil:").pack(side="left")
+        conns = self.cfg.get("segment_connections", DEFAULT_CONFIG["segment_connections"])
+        self.seg_conn_var = tk.StringVar(value=str(conns) if conns > 1 else "Av")
+        ctk.CTkComboBox(seg_row, variable=self.seg_conn_var, state="readonly", width=70, values=["Av", "2", "4", "8", "16"]).pack(side="left", padx=(8,16))
+        ctk.CTkLabel(seg_row, text="fra (MB):").pack(side="left")
+        self.seg_min_var = tk.StringVar(value=str(self.cfg.get("segment_min_mb", DEFAULT_CONFIG["segment_min_mb"])))
+        ctk.CTkEntry(seg_row, textvariable=self.seg_min_var, width=60).pack(side="left", padx=(8,0))
+        rate_row = ctk.CTkFrame(frm); rate_row.pack(fill="x", pady=(0,8))
+        ctk.CTkLabel(rate_row, text="Fartsgrense for alle nedlastinger (Mbit/s, 0 = ingen):").pack(side="left")
+        self.rate_limit_var = tk.StringVar(value=str(self.cfg.get("rate_limit_mbps", DEFAULT_CONFIG["rate_limit_mbps"])))
+        ctk.CTkEntry(rate_row, textvariable=self.rate_limit_var, width=60).pack(side="left", padx=(8,0))
+        work_row = ctk.CTkFrame(frm); work_row.pack(fill="x", pady=(0,8))
+        ctk.CTkLabel(work_row, text="Arbeidstid (hverdager):").pack(side="left")
+        self.work_hours_var = tk.StringVar(value=self.cfg.get("work_hours", DEFAULT_CONFIG["work_hours"]))
+        ctk.CTkEntry(work_row, textvariable=self.work_hours_var, width=110, placeholder_text="08:00-16:00").pack(side="left", padx=(8,16))
+        ctk.CTkLabel(work_row, text="Grense da (Mbit/s):").pack(side="left")
+        self.work_limit_var = tk.StringVar(value=str(self.cfg.get("work_hours_limit_mbps", DEFAULT_CONFIG["work_hours_limit_mbps"])))
+        ctk.CTkEntry(work_row, textvariable=self.work_limit_var, width=60).pack(side="left", padx=(8,0))
+        self.work_hold_var = tk.BooleanVar(value=self.cfg.get("work_hours_hold", False))
+        ctk.CTkCheckBox(frm, text="Start nye nedlastinger først etter arbeidstid", variable=self.work_hold_var).pack(anchor="w", pady=(0,8))
+        cache_row = ctk.CTkFrame(frm); cache_row.pack(fill="x", pady=(0,8))
+        self.info_cache_var = tk.BooleanVar(value=self.cfg.get("info_cache_enabled", True))
+        ctk.CTkCheckBox(cache_row, text="Buffre metadata (raskere gjentatte nedlastinger)", variable=self.info_cache_var).pack(side="left")
+        ctk.CTkButton(cache_row, text="Tøm buffer", width=90, command=self._clear_info_cache).pack(side="right")
+        self.prefetch_var = tk.BooleanVar(value=self.cfg.get("prefetch_enabled", DEFAULT_CONFIG["prefetch_enabled"]))
+        ctk.CTkCheckBox(frm, text="Hent info om URLer med en gang de limes inn", variable=self.prefetch_var).pack(anchor="w", pady=(0,8))
+        self.perf_report_var = tk.BooleanVar(value=self.cfg.get("perf_report", DEFAULT_CONFIG["perf_report"]))
+        ctk.CTkCheckBox(frm, text="Lagre ytelsesrapport (tidsbruk per fase) etter hver batch", variable=self.perf_report_var).pack(anchor="w", pady=(0,8))
         dir_row = ctk.CTkFrame(frm); dir_row.pack(fill="x", pady=(6,6))
         ctk.CTkLabel(dir_row, text="Standard lagringsmappe:").pack(anchor="w")
         self.cfg_dir_var = tk.StringVar(value=self.cfg.get("default_dir", DEFAULT_CONFIG["default_dir"]))
@@ -417,12 +372,33 @@ class App(ctk.CTk):
         ctk.CTkButton(btns, text="Avbryt", command=win.destroy).pack(side="right", padx=(8,0))
 
 
+    def _refresh_cookies(self):
+        if not self._core_ready(): return
+        self.cookie_store.refresh()
+        self._log("Cookies leses på nytt fra nettleseren ved neste nedlasting.")
+
+
+    def _clear_info_cache(self):
+        if not self._core_ready(): return
+        (self.info_cache or self.core.InfoCache()).clear()
+        self._log("Metadata-bufferen er tømt.")
+
+
     def _pick_cfg_dir(self, entry):
         path = filedialog.askdirectory(initialdir=self.cfg_dir_var.get() or str(Path.home()))
         if path: self.cfg_dir_var.set(path)
 
 
     def _save_settings(self, win):
+        try:
+            rate_limit = float(self.rate_limit_var.get().replace(",", ".") or 0)
+            work_limit = float(self.work_limit_var.get().replace(",", ".") or 0)
+            segment_min = float(self.seg_min_var.get().replace(",", ".") or 0)
+            parse_work_hours(self.work_hours_var.get())
+        except ValueError:
+            messagebox.showerror("Innstillinger", "Ugyldig fartsgrense, arbeidstid eller filstørrelse.\nBruk f.eks. 5, 08:00-16:00 og 20.", parent=win)
+            return
+
         # Hent den nye verdien fra avkrysningsboksen
         new_dark_mode = bool(self.dark_mode_var.get())
         
@@ -430,8 +406,30 @@ class App(ctk.CTk):
         self.cfg["keep_norwegian_chars"] = bool(self.keep_norw_var.get())
         self.cfg["overwrite_existing"] = bool(self.overwrite_var.get())
         self.cfg["dark_mode"] = new_dark_mode
+        self.cfg["max_workers"] = int(self.max_workers_var.get())
+        self.cfg["per_host_limit"] = int(self.per_host_var.get())
+        self.cfg["fragment_concurrency"] = 0 if self.frag_fixed_var.get() == "Auto" else int(self.frag_fixed_var.get())
+        self.cfg["fragment_min"], self.cfg["fragment_max"] = sorted((int(self.frag_min_var.get()), int(self.frag_max_var.get())))
+        self.cfg["segment_connections"] = 0 if self.seg_conn_var.get() == "Av" else int(self.seg_conn_var.get())
+        self.cfg["segment_min_mb"] = segment_min
+        self.cfg["rate_limit_mbps"] = rate_limit
+        self.cfg["work_hours"] = self.work_hours_var.get().strip()
+        self.cfg["work_hours_limit_mbps"] = work_limit
+        self.cfg["work_hours_hold"] = bool(self.work_hold_var.get())
+        self.cfg["info_cache_enabled"] = bool(self.info_cache_var.get())
+        self.cfg["perf_report"] = bool(self.perf_report_var.get())
+        self.cfg["prefetch_enabled"] = bool(self.prefetch_var.get())
         self.cfg["default_dir"] = self.cfg_dir_var.get() or DEFAULT_CONFIG["default_dir"]
         save_config(self.cfg)
+        if self.core:
+            self.info_cache = self.core.InfoCache.from_config(self.cfg)
+            self.fragment_tuner = self.core.FragmentTuner.from_config(self.cfg)
+            if self.cfg["prefetch_enabled"] != (self.prefetcher is not None):
+                self.prefetcher = self.core.Prefetcher(cookie_store=self.cookie_store) if self.cfg["prefetch_enabled"] else None
+                self._url_info = {}
+                self._submit_prefetch()
+            if self.worker and self.worker.is_alive():
+                self.worker.rate_limiter = self.core.RateLimiter.from_config(self.cfg)  # Gjelder med en gang
         
         # Oppdater standardmappen i hovedvinduet
         self.dir_var.set(self.cfg["default_dir"])
@@ -463,14 +461,85 @@ class App(ctk.CTk):
         data = (getattr(event, "data", "") or "").strip().strip("{}")
         if data:
             self.url_box.insert(tk.END, data.replace("\r", "\n") + "\n")
-        self._update_nrk_hint()
+        self._schedule_analysis()
+
+
+    def _schedule_analysis(self, *_, force: bool = False):
+        """Analyser URL-feltet i bakgrunnen når brukeren har sluttet å skrive eller lime inn en liten stund"""
+        if self._analyze_job is not None: self.after_cancel(self._analyze_job)
+        if force: self._analyzed_text = None
+        self._analyze_job = self.after(ANALYZE_DELAY_MS, self._submit_analysis)
+
+
+    def _submit_analysis(self):
+        self._analyze_job = None
+        text = self.url_box.get("1.0", tk.END)
+        if text == self._analyzed_text: return  # F.eks. piltaster – ingenting er endret
+        self._analyzed_text = text
+        self._analysis_gen += 1
+        self.url_analyzer.submit(self._analysis_gen, text)
+
+
+    def _on_urls_analyzed(self, gen: int, result: dict):
+        if gen != self._analysis_gen: return  # Teksten er endret siden – et nyere resultat kommer
+        self._analysis = result
+        counts = result["counts"]
+        self.nrk_hint.configure(text="Tips: NRK-linker lagres som MKV for best kvalitet. Andre lagres som MP4." if counts["nrk"] else "")
+        parts = [f"{counts['urls']} URL(er)"] if counts["urls"] or counts["invalid"] else []
+        if counts["sites"] > 1: parts.append(f"{counts['sites']} nettsteder")
+        if counts["playlists"]: parts.append(f"{counts['playlists']} spilleliste(r)")
+        if counts["duplicates"]: parts.append(f"{counts['duplicates']} duplikat(er)")
+        if counts["invalid"]: parts.append(f"⚠ {counts['invalid']} ugyldig(e)")
+        self._configure_text(self.url_counts, " · ".join(parts))
+        self.url_box.tag_remove("invalid_url", "1.0", tk.END)
+        for n, _ in result["invalid"][:INVALID_MARK_MAX]:
+            self.url_box.tag_add("invalid_url", f"{n}.0", f"{n}.end")
+        self._submit_prefetch()
+
+
+    def _submit_prefetch(self):
+        if self.prefetcher is None or self._analysis is None: return
+        urls = self._analysis["urls"]
+        self.prefetcher.submit(urls, BROWSER_CHOICES[self.browser_var.get()])
+        self._url_info = {url: info for url, info in self._url_info.items() if url in set(urls)}
+        self._render_url_info()
+
+
+    def _render_url_info(self):
+        """Tittel, varighet og anslått størrelse (for valgt format og kvalitet) for de forhåndshentede linjene"""
+        if not self._url_info or self._analysis is None:
+            self._configure_text(self.url_info, "")
+            return
+        lines, total = [], 0
+        for n, url in self._analysis["lines"]:
+            if (info := self._url_info.get(url)) is None: continue
+            lines.append(f"{n:>3}: {self._describe_url(info)}")
+            total += self._estimated_size(info) or 0
+        shown = lines[:URL_INFO_LINES] + ([f"     … og {len(lines) - URL_INFO_LINES} til"] if len(lines) > URL_INFO_LINES else [])
+        if total: shown.append(f"     Anslått totalt: ~{total / 1024 / 1024:.0f} MB for {len(lines)} URL(er)")
+        self._configure_text(self.url_info, "\n".join(shown))
+
+
+    def _describe_url(self, info: dict) -> str:
+        if "error" in info: return f"⚠ {info['error'][:90]}"
+        title = (info.get("title") or "")[:60]
+        if info.get("playlist"): return f"📜 {title} ({info.get('count') or '?'} elementer)"
+        size = self._estimated_size(info)
+        return " · ".join([title] + ([format_eta(info["duration"])] if info.get("duration") else [])
+                          + ([f"~{size / 1024 / 1024:.0f} MB"] if size else []))
+
+
+    def _estimated_size(self, info: dict) -> int | None:
+        if info.get("playlist") or "error" in info: return None
+        mp3 = int((info.get("duration") or 0) * int(self.mp3_quality_var.get()) * 125)
+        sizes = info.get("sizes") or {}
+        video = sizes.get(QUALITY_CHOICES[self.quality_var.get()]) or sizes.get("best") or 0
+        if self.format_var.get() == "multi":
+            return sum({"mp4": video, "mp3": mp3, "best": sizes.get("best") or 0}[mode]
+                       for mode, var in self.output_vars.items() if var.get()) or None
+        return (mp3 if self.format_var.get() == "mp3" else video) or None
 
 
-    def _update_nrk_hint(self, *_):
-        content = self.url_box.get("1.0", tk.END).lower()
-        if "nrk.no" in content: self.nrk_hint.configure(text="Tips: NRK-linker lagres som MKV for best kvalitet. Andre lagres som MP4.")
-        else: self.nrk_hint.configure(text="")
-           
     def _paste_clipboard(self):
         text = None
         
@@ -491,7 +560,7 @@ class App(ctk.CTk):
         
         if text:
             self.url_box.insert(tk.END, text.strip() + "\n")
-            self._update_nrk_hint()
+            self._schedule_analysis()
 
 
     def _choose_folder(self):
@@ -520,24 +589,16 @@ class App(ctk.CTk):
             # Generell feilhåndtering
             messagebox.showerror("Åpne mappe", f"En feil oppstod ved forsøk på å åpne mappen:\n{e}")
            
-    def _validate_urls(self, urls: list[str]):
-        from urllib.parse import urlparse
-        valid, invalid = [], []
-        for u in urls:
-            try:
-                p = urlparse(u)
-                if p.scheme in ("http", "https") and p.netloc: valid.append(u)
-                else: invalid.append(u)
-            except Exception: invalid.append(u)
-        return valid, invalid
-   
     def _set_ui_enabled(self, enabled: bool):
         state = "normal" if enabled else "disabled"
-        for widget in [self.url_box, self.dir_entry, self.btn_start, self.btn_open]:
+        for widget in [self.dir_entry, self.btn_open]:
             widget.configure(state=state)
+        # URL-feltet og knappen er åpne under nedlasting, så nye URLer kan legges i køen
+        self.btn_start.configure(text="Last ned" if enabled else "Legg i kø")
         self.browser_box.configure(state="readonly" if enabled else "disabled")
         self.quality_box.configure(state="readonly" if (enabled and self.format_var.get() != "mp3") else "disabled")
-        self.mp3_quality_box.configure(state="readonly" if (enabled and self.format_var.get() == "mp3") else "disabled")
+        self.mp3_quality_box.configure(state="readonly" if (enabled and self.format_var.get() in ("mp3", "multi")) else "disabled")
+        for box in self.output_boxes: box.configure(state="normal" if (enabled and self.format_var.get() == "multi") else "disabled")
         for child in self.winfo_children():
             if isinstance(child, ctk.CTkFrame):
                 for grandchild in child.winfo_children():
@@ -546,17 +607,20 @@ class App(ctk.CTk):
         self.btn_cancel.configure(state="normal" if not enabled else "disabled")
 
 
-    def _start_download(self):
-        if self.worker and self.worker.is_alive():
-            messagebox.showinfo("Opptatt", "En nedlasting kjører allerede.")
-            return
-        urls = [u.strip() for u in self.url_box.get("1.0", tk.END).splitlines() if u.strip()]
-        if not urls:
+    def _start_download(self, batch_id: str | None = None):
+        if not self._core_ready(): return
+        analysis = self.url_analyzer.analyze(self.url_box.get("1.0", tk.END), classify=False)  # Bare gyldighet – raskt
+        valid, invalid = analysis["urls"], analysis["invalid"]
+        if not valid and not invalid:
             messagebox.showinfo("Mangler URL", "Lim inn minst én URL først.")
             return
-        valid, invalid = self._validate_urls(urls)
         if invalid:
-            messagebox.showerror("Ugyldige URLer", "Disse er ikke gyldige URLer:\n\n" + "\n".join(invalid))
+            shown = [f"Linje {n}: {text[:100]}" for n, text in invalid[:INVALID_SHOW_MAX]]
+            if len(invalid) > INVALID_SHOW_MAX: shown.append(f"… og {len(invalid) - INVALID_SHOW_MAX} til (markert i rødt)")
+            messagebox.showerror("Ugyldige URLer", "Disse er ikke gyldige URLer:\n\n" + "\n".join(shown))
+            return
+        if self.worker and self.worker.is_alive():
+            self._enqueue(valid)
             return
         
         # Sjekk FFmpeg før nedlasting starter
@@ -568,17 +632,123 @@ class App(ctk.CTk):
             return
         out_dir = Path(self.dir_var.get())
         mode = self.format_var.get()
-        quality = {"Beste": "best", "1080p": "1080p", "720p": "720p", "480p": "480p"}[self.quality_var.get()]
-        browser = {"Ingen": "none", "Chrome": "chrome", "Edge": "edge", "Firefox": "firefox"}[self.browser_var.get()]
-        pl_map = {"Alle": None, "Kun første": "1", "Spør": "ASK"}
+        outputs = self._selected_outputs() if mode == "multi" else None
+        if mode == "multi" and not outputs:
+            messagebox.showinfo("Flere formater", "Velg minst ett format (MP4, MP3 eller Original).")
+            return
+        quality = QUALITY_CHOICES[self.quality_var.get()]
+        browser = BROWSER_CHOICES[self.browser_var.get()]
         self._clear_log()
         self._set_progress(None)
-        self.worker = Downloader(valid, out_dir, mode, quality, browser, self.cfg["keep_norwegian_chars"], self.cfg["overwrite_existing"], self.msg_q, mp3_quality=self.mp3_quality_var.get(), playlist_items=pl_map[self.pl_mode_var.get()])
+        self._job_progress = {}
+        self.worker = self.core.Downloader(valid, out_dir, mode, quality, browser, self.cfg["keep_norwegian_chars"], self.cfg["overwrite_existing"], self.msg_q,
+                                 mp3_quality=self.mp3_quality_var.get(), playlist_items=PLAYLIST_CHOICES[self.pl_mode_var.get()],
+                                 max_workers=self.cfg.get("max_workers", DEFAULT_CONFIG["max_workers"]),
+                                 per_host_limit=self.cfg.get("per_host_limit", DEFAULT_CONFIG["per_host_limit"]),
+                                 info_cache=self.info_cache, cookie_store=self.cookie_store,
+                                 progress_hz=self.cfg.get("progress_hz", DEFAULT_CONFIG["progress_hz"]),
+                                 pp_workers=self.cfg.get("pp_workers", DEFAULT_CONFIG["pp_workers"]),
+                                 fragment_tuner=self.fragment_tuner, journal=self.journal, batch_id=batch_id,
+                                 rate_limiter=self.core.RateLimiter.from_config(self.cfg),
+                                 prefetcher=self.prefetcher,
+                                 segments=self.cfg.get("segment_connections", DEFAULT_CONFIG["segment_connections"]),
+                                 segment_min_mb=self.cfg.get("segment_min_mb", DEFAULT_CONFIG["segment_min_mb"]),
+                                 report_path=REPORT_DIR / f"batch_{time.strftime('%Y%m%d_%H%M%S')}.json" if self.cfg.get("perf_report") else None,
+                                 outputs=outputs)
         self.worker.start()
         self._set_ui_enabled(False)
         self._log("Starter…")
 
 
+    def _selected_outputs(self) -> list[tuple[str, str]]:
+        """Utformatene for "Flere (én nedlasting)", som for parse_outputs"""
+        quality = {"mp4": QUALITY_CHOICES[self.quality_var.get()], "mp3": self.mp3_quality_var.get(), "best": ""}
+        return [(mode, quality[mode]) for mode, var in self.output_vars.items() if var.get()]
+
+
+    def _enqueue(self, urls: list[str]):
+        """Legg URLer til i batchen som kjører (med batchens innstillinger for format og mappe)"""
+        added = self.worker.add_urls(urls)
+        if added is None:
+            messagebox.showinfo("Opptatt", "Nedlastingen avsluttes – prøv igjen om et øyeblikk.")
+        elif added:
+            dup = f", {len(urls) - len(added)} var allerede i køen" if len(urls) > len(added) else ""
+            self._log(f"➕ La til {len(added)} URL(er) i køen{dup} (bruker innstillingene til nedlastingen som kjører).")
+            self._queue_dirty = True
+        else:
+            self._log("Ingen nye URLer å legge til – alle (eller varianter av dem) er allerede i køen.")
+
+
+    def _open_queue(self):
+        if self._queue_win is not None and self._queue_win.winfo_exists():
+            self._queue_win.lift()
+            return
+        win = ctk.CTkToplevel(self)
+        win.title("Nedlastingskø")
+        win.geometry("720x380")
+        win.transient(self)
+        frm = ctk.CTkFrame(win); frm.pack(fill="both", expand=True, padx=14, pady=14)
+        dark = ctk.get_appearance_mode().lower() == "dark"
+        self.queue_list = tk.Listbox(frm, activestyle="none", exportselection=False, font=("Consolas", 10), borderwidth=0,
+                                     bg="#2b2b2b" if dark else "#ffffff", fg="#dce4ee" if dark else "#1a1a1a",
+                                     selectbackground="#1f6aa5", highlightthickness=0)
+        self.queue_list.pack(side="left", fill="both", expand=True)
+        side = ctk.CTkFrame(frm); side.pack(side="left", fill="y", padx=(10, 0))
+        for text, action in (("↑ Opp", lambda job_id: self.worker.move(job_id, -1)),
+                             ("↓ Ned", lambda job_id: self.worker.move(job_id, 1)),
+                             ("Høy prioritet", lambda job_id: self.worker.set_priority(job_id, 1)),
+                             ("Normal prioritet", lambda job_id: self.worker.set_priority(job_id, 0)),
+                             ("Lav prioritet", lambda job_id: self.worker.set_priority(job_id, -1)),
+                             ("⏸ Pause", lambda job_id: self.worker.pause(job_id)),
+                             ("▶ Fortsett", lambda job_id: self.worker.unpause(job_id)),
+                             ("↻ Prøv igjen", lambda job_id: self.worker.retry(job_id)),
+                             ("Fartsgrense…", self._ask_job_rate_limit),
+                             ("⛔ Avbryt", lambda job_id: self.worker.cancel(job_id))):
+            ctk.CTkButton(side, text=text, width=140, command=lambda a=action: self._queue_action(a)).pack(pady=(0, 6))
+        self._queue_win = win
+        self._refresh_queue()
+
+
+    def _queue_action(self, action):
+        sel = self.queue_list.curselection()
+        if not sel: return
+        if not (self.worker and self.worker.is_alive()):
+            messagebox.showinfo("Nedlastingskø", "Ingen nedlasting kjører nå.", parent=self._queue_win)
+            return
+        job_id = self._queue_ids[sel[0]]
+        action(job_id)
+        self._refresh_queue(select=job_id)
+
+
+    def _ask_job_rate_limit(self, job_id: int):
+        answer = ctk.CTkInputDialog(title="Fartsgrense", text="Fartsgrense for denne jobben i Mbit/s\n(tomt = felles grense, 0 = ubegrenset):").get_input()
+        if answer is None: return
+        try:
+            limit = self.core.mbps_to_bytes(float(answer.replace(",", "."))) if answer.strip() else None
+        except ValueError:
+            messagebox.showerror("Fartsgrense", f"Ugyldig tall: {answer}", parent=self._queue_win)
+            return
+        self.worker.set_rate_limit(job_id, limit)
+
+
+    def _refresh_queue(self, select: int | None = None):
+        """Tegn køen på nytt (kalles når jobber endrer tilstand og etter handlinger i køvinduet)"""
+        self._queue_dirty = False
+        if self._queue_win is None or not self._queue_win.winfo_exists(): return
+        if select is None and self.queue_list.curselection():
+            select = self._queue_ids[self.queue_list.curselection()[0]]
+        jobs = self.worker.queue_order() if self.worker else []
+        self._queue_ids = [job.id for job in jobs]
+        self.queue_list.delete(0, tk.END)
+        for job in jobs:
+            prio = {1: "⬆", -1: "⬇"}.get(job.priority, " ")
+            limit = "" if job.limiter is None else f" [{job.limiter.limit * 8 / 1_000_000:g} Mbit/s]" if job.limiter.limit else " [ubegrenset]"
+            name = f"↳ {job.extra_info.get('title') or job.url}" if job.parent else job.url
+            self.queue_list.insert(tk.END, f"{prio} #{job.id:<3} {JOB_STATE_LABELS.get(job.state, job.state):<15} {name}{limit}")
+        if select in self._queue_ids:
+            self.queue_list.selection_set(self._queue_ids.index(select))
+
+
     def _cancel_download(self):
         if self.worker and self.worker.is_alive():
             self.worker.cancel()
@@ -586,13 +756,34 @@ class App(ctk.CTk):
             self._log("Avbryter…")
            
     def _log(self, text: str):
+        """Legg linjen i kø; den vises ved neste _flush_log (hvert poll-tikk)"""
+        self._pending_log.append(text)
+        self._file_log.info(text.strip("\n"))
+
+
+    def _flush_log(self):
+        """Sett inn alle ventende linjer i én operasjon og trim loggvinduet til LOG_MAX_LINES"""
+        if not self._pending_log: return
+        text = "\n".join(self._pending_log) + "\n"
+        self._pending_log.clear()
         self.log.configure(state="normal")
-        self.log.insert(tk.END, text + "\n")
+        self.log.insert(tk.END, text)
+        excess = int(self.log.index("end-1c").split(".")[0]) - 1 - LOG_MAX_LINES
+        if excess > 0:
+            self.log.delete("1.0", f"{excess + 1}.0")
         self.log.see(tk.END)
         self.log.configure(state="disabled")
 
 
+    def _open_log_file(self):
+        try:
+            os.startfile(str(LOG_PATH))
+        except Exception as e:
+            messagebox.showerror("Åpne logg", f"Kunne ikke åpne loggfilen:\n{LOG_PATH}\n\n{e}")
+
+
     def _clear_log(self):
+        self._pending_log.clear()
         self.log.configure(state="normal")
         self.log.delete("1.0", tk.END)
         self.log.configure(state="disabled")
@@ -602,51 +793,119 @@ class App(ctk.CTk):
         try:
             while True:
                 kind, *data = self.msg_q.get_nowait()
-                if kind == "log": self._log(data[0])
-                elif kind == "progress": self._set_progress(*data)
+                if kind == "log": self._log(self._tag_job(data[0], data[1]))
+                elif kind == "job": self._queue_dirty = True
                 elif kind == "ask_playlist":
-                    ans = messagebox.askyesnocancel("Spilleliste funnet", f"Fant spilleliste (~{data[0]} videoer).\n\nLaste ned alle?\n\n(Ja=Alle, Nei=Kun første, Avbryt=Ingen)")
+                    self._flush_log()
+                    ans = messagebox.askyesnocancel("Spilleliste funnet", f"{self._tag_job('', data[0])}Fant spilleliste (~{data[1]} videoer).\n\nLaste ned alle?\n\n(Ja=Alle, Nei=Kun første, Avbryt=Ingen)")
                     choice = "cancel" if ans is None else ("all" if ans else "first")
-                    if self.worker: self.worker.set_playlist_decision(choice)
+                    if self.worker: self.worker.set_playlist_decision(data[0], choice)
+                elif kind == "urls_analyzed": self._on_urls_analyzed(*data)
+                elif kind == "warm_up_done": self._on_warm_up_done(data[0])
+                elif kind == "warm_up_failed":
+                    self._flush_log()
+                    self.btn_start.configure(text="Last ned")
+                    messagebox.showerror("Mangler yt-dlp", data[0])
+                elif kind == "pp_status":
+                    active, queued = data
+                    self._configure_text(self.pp_label, f"Etterbehandling: {active} aktive, {queued} i kø" if active or queued else "")
         except queue.Empty: pass
+        if self.prefetcher is not None and not self.prefetcher.results.empty():
+            while not self.prefetcher.results.empty():
+                url, summary = self.prefetcher.results.get_nowait()
+                self._url_info[url] = summary
+            self._render_url_info()
+        self._flush_log()
+        if self._queue_dirty: self._refresh_queue()
+        if self.worker:
+            for job_id, state in self.worker.progress.drain(force=not self.worker.is_alive()).items():
+                self._update_job_progress(job_id, state)
         if self.worker and not self.worker.is_alive():
             self._set_ui_enabled(True)
             self.btn_cancel.configure(text="Avbryt")  # Tilbakestill knapptekst
+            self._save_fragment_hosts()
             self.worker = None
         self.after(100, self._poll_messages)
 
 
+    def _save_fragment_hosts(self):
+        """Husk beste antall samtidige fragmenter per nettsted til neste gang"""
+        learned = self.worker.fragment_tuner.learned()
+        if learned != self.cfg.get("fragment_hosts"):
+            self.cfg["fragment_hosts"] = learned
+            save_config(self.cfg)
+
+
+    def _tag_job(self, text: str, job_id: int | None) -> str:
+        """Merk linjen med jobb-id når flere URLer kjører samtidig"""
+        if job_id is None or not self.worker or len(self.worker.jobs) < 2: return text
+        stripped = text.lstrip("\n")
+        return f"{text[:len(text) - len(stripped)]}[#{job_id}] {stripped}"
+
+
+    def _update_job_progress(self, job_id: int, state: tuple):
+        """Slå sammen fremdriften til alle jobber i batchen til én visning"""
+        self._job_progress[job_id] = state
+        n_jobs = len(self.worker.jobs) if self.worker else len(self._job_progress)
+        if n_jobs <= 1:
+            self._set_progress(*state)
+            return
+        total_pct = sum(s[0] or 0.0 for s in self._job_progress.values()) / n_jobs
+        active = [s for s in self._job_progress.values() if (s[0] or 0.0) < 100.0]
+        speed = sum(s[1] or 0.0 for s in active) or None
+        etas = [s[2] for s in active if s[2] is not None]
+        latest = state if (state[0] or 0.0) < 100.0 else (active[-1] if active else state)
+        item_info = dict(latest[4] or {})
+        item_info["connections"] = sum((s[4] or {}).get("connections") or 0 for s in active) or None
+        if len(active) > 1:
+            item_info["title"] = f"{len(active)} aktive – {item_info.get('title') or (Path(latest[3]).name if latest[3] else '–')}"
+        self._set_progress(total_pct, speed, max(etas) if etas else None, latest[3], item_info)
+
+
     def _fmt_eta(self, secs: int | None) -> str:
-        if secs is None: return "–"
-        secs = max(0, int(secs))
-        h, m, s = secs // 3600, (secs % 3600) // 60, secs % 60
-        return f"{h:d}:{m:02d}:{s:02d}" if h else f"{m:d}:{s:02d}"
+        return format_eta(secs)
+
+
+    def _configure_text(self, widget, text: str):
+        """Oppdater en etikett bare når teksten faktisk endres"""
+        if self._shown_text.get(widget) != text:
+            self._shown_text[widget] = text
+            widget.configure(text=text)
 
 
     def _set_progress(self, pct: float | None, speed_bps: float = None, eta_s: int = None, filename: str = None, item_info: dict = None):
         if pct is None:
             self.progbar.set(0)
-            self.speed_label.configure(text="Hastighet: –   |   Gjenstår: –")
-            self.current_item_label.configure(text="Element: –")
+            self._shown_bar = 0.0
+            self._configure_text(self.speed_label, "Hastighet: –   |   Gjenstår: –")
+            self._configure_text(self.current_item_label, "Element: –")
             return
-        self.progbar.set(max(0.0, min(100.0, pct)) / 100.0)
+        bar = round(max(0.0, min(100.0, pct)) / 100.0, 3)
+        if bar != self._shown_bar:
+            self._shown_bar = bar
+            self.progbar.set(bar)
         spd_txt = f"{speed_bps/1024/1024:.2f} MB/s" if speed_bps else "–"
-        self.speed_label.configure(text=f"Hastighet: {spd_txt}   |   Gjenstår: {self._fmt_eta(eta_s)}")
+        limit = self.worker.rate_limiter.current_limit() if self.worker else 0
+        if limit: spd_txt += f" (grense {limit/1024/1024:.2f} MB/s)"
+        if item_info and item_info.get("connections"): spd_txt += f" · {item_info['connections']} tilkoblinger"
+        self._configure_text(self.speed_label, f"Hastighet: {spd_txt}   |   Gjenstår: {self._fmt_eta(eta_s)}")
         if item_info and (item_info.get("title") or item_info.get("i") or item_info.get("n")):
             i, n, title = item_info.get("i"), item_info.get("n"), item_info.get("title")
             idx_txt = f"{i}/{n} – " if i and n else ""
             shown = title or (Path(filename).name if filename else "–")
-            self.current_item_label.configure(text=f"Element: {idx_txt}{shown}")
+            self._configure_text(self.current_item_label, f"Element: {idx_txt}{shown}")
         elif filename: 
-            self.current_item_label.configure(text=f"Element: {Path(filename).name}")
+            self._configure_text(self.current_item_label, f"Element: {Path(filename).name}")
         else: 
-            self.current_item_label.configure(text="Element: –")
+            self._configure_text(self.current_item_label, "Element: –")
 
 
     def _toggle_quality_state(self):
-        is_mp3 = self.format_var.get() == 'mp3'
-        self.quality_box.configure(state='disabled' if is_mp3 else 'readonly')
-        self.mp3_quality_box.configure(state='readonly' if is_mp3 else 'disabled')
+        mode = self.format_var.get()
+        self._render_url_info()
+        self.quality_box.configure(state='disabled' if mode == 'mp3' else 'readonly')
+        self.mp3_quality_box.configure(state='readonly' if mode in ('mp3', 'multi') else 'disabled')
+        for box in self.output_boxes: box.configure(state='normal' if mode == 'multi' else 'disabled')
         if self.worker and not self.worker.is_alive():
             self._set_ui_enabled(True)
 
@@ -692,6 +951,11 @@ class App(ctk.CTk):
 
 
 if __name__ == "__main__":
-    app = App()
+    # --startup-report [FIL]: skriv oppstartstider som JSON (eller til stdout) og avslutt
+    report = None
+    if "--startup-report" in sys.argv:
+        i = sys.argv.index("--startup-report")
+        report = sys.argv[i + 1] if i + 1 < len(sys.argv) else "-"
+    app = App(startup_report=report)
     app.mainloop()
 
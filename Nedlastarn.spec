@@ -1,5 +1,12 @@
 # -*- mode: python ; coding: utf-8 -*-
+import os
 
+# onefile (default) or onedir (startup-optimized): set NEDLASTARN_BUILD_MODE=onedir
+MODE = os.environ.get("NEDLASTARN_BUILD_MODE", "onefile")
+EXCLUDES = ['tkinter.test', 'test', 'unittest', 'pydoc', 'doctest']
+if MODE == 'onedir':
+    EXCLUDES += ['lib2to3', 'pdb', 'pydoc_data', 'idlelib', 'turtle', 'turtledemo',
+                 'xmlrpc', 'curses', 'distutils', 'setuptools', 'pip', 'yt_dlp.__main__']
 
 a = Analysis(
     ['C:\\Users\\nytro\\Desktop\\Nedlastarn\\Nedlastarn.py'],
@@ -10,29 +17,57 @@ a = Analysis(
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=['tkinter.test', 'test', 'unittest', 'pydoc', 'doctest'],
+    excludes=EXCLUDES,
     noarchive=False,
     optimize=2,
 )
 pyz = PYZ(a.pure)
 
-exe = EXE(
-    pyz,
-    a.scripts,
-    a.binaries,
-    a.datas,
-    [('O', None, 'OPTION'), ('O', None, 'OPTION')],
-    name='Nedlastarn',
-    debug=False,
-    bootloader_ignore_signals=False,
-    strip=True,
-    upx=True,
-    upx_exclude=[],
-    runtime_tmpdir=None,
-    console=False,
-    disable_windowed_traceback=False,
-    argv_emulation=False,
-    target_arch=None,
-    codesign_identity=None,
-    entitlements_file=None,
-)
+if MODE == 'onedir':
+    # Nothing to unpack at launch, and no UPX decompression of DLLs
+    exe = EXE(
+        pyz,
+        a.scripts,
+        [('O', None, 'OPTION'), ('O', None, 'OPTION')],
+        exclude_binaries=True,
+        name='Nedlastarn',
+        debug=False,
+        bootloader_ignore_signals=False,
+        strip=True,
+        upx=False,
+        console=False,
+        disable_windowed_traceback=False,
+        argv_emulation=False,
+        target_arch=None,
+        codesign_identity=None,
+        entitlements_file=None,
+    )
+    coll = COLLECT(
+        exe,
+        a.binaries,
+        a.datas,
+        strip=True,
+        upx=False,
+        name='Nedlastarn',
+    )
+else:
+    exe = EXE(
+        pyz,
+        a.scripts,
+        a.binaries,
+        a.datas,
+        [('O', None, 'OPTION'), ('O', None, 'OPTION')],
+        name='Nedlastarn',
+        debug=False,
+        bootloader_ignore_signals=False,
+        strip=True,
+        upx=True,
+        upx_exclude=[],
+        runtime_tmpdir=None,
+        console=False,
+        disable_windowed_traceback=False,
+        argv_emulation=False,
+        target_arch=None,
+        codesign_identity=None,
+        entitlements_file=None,
+    )
@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+End-to-end throughput benchmark for the Downloader engine
+
+Starts a local HTTP server with synthetic media (progressive files, HLS and DASH
+manifests, RSS playlists) with configurable bandwidth and latency, runs Downloader against it
+through yt-dlp's generic extractor and reports MB/s, time-to-first-byte,
+per-URL overhead, queue message rate and peak RSS for each batch size.
+
+Every run happens in a fresh child process with its own config dir, so memory
+numbers are not mixed between runs and the real download archive is untouched.
+Results are saved as JSON; use --compare to diff against an earlier run.
+
+    python benchmark.py --kinds progressive,hls --sizes 1,5,20 --bandwidth-mbps 50
+    python benchmark.py --kinds progressive --sizes 1 --file-mb 100 --bandwidth-mbps 50 --connections 4
+    python benchmark.py --kinds progressive --sizes 2 --file-mb 30 --connections 4 --limit-mbps 16   # exits 1 if over the limit
+    python benchmark.py --compare build/benchmarks/benchmark_20250101_1200.json
+"""
+
+import argparse
+import json
+import os
+import queue
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+KINDS = ("progressive", "hls", "dash", "playlist")
+CHUNK = 64 * 1024
+
+
+class MediaHandler(BaseHTTPRequestHandler):
+    """Synthetic media, paths encode the sizes so the server needs no state:
+
+    /p/<bytes>/<name>.mp4                  progressive file (supports Range)
+    /hls/<segments>/<bytes>/<name>.m3u8    HLS media playlist, segments at .../<name>/<i>.ts
+    /dash/<segments>/<bytes>/<name>.mpd    DASH manifest, init + segments at .../<name>/
+    /rss/<count>/<bytes>/<name>.xml        RSS feed (a playlist) with <count> progressive files
+    """
+    protocol_version = "HTTP/1.1"
+    bandwidth = 0  # Bytes/s per connection, 0 = unlimited
+    latency = 0.0  # Seconds before each response
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        self._serve(head=True)
+
+    def do_GET(self):
+        self._serve(head=False)
+
+    def _serve(self, head: bool):
+        if self.latency:
+            time.sleep(self.latency)
+        parts = self.path.split("?")[0].strip("/").split("/")
+        try:
+            if parts[0] == "p" and len(parts) == 3:
+                return self._send_bytes(int(parts[1]), "video/mp4", head)
+            if parts[0] == "rss" and len(parts) == 4:
+                base = f"http://{self.headers['Host']}"
+                return self._send_text(rss_feed(base, int(parts[1]), int(parts[2]), parts[3][:-4]), "application/rss+xml", head)
+            if parts[0] in ("hls", "dash"):
+                segments, seg_bytes, name = int(parts[1]), int(parts[2]), parts[3]
+                if len(parts) == 4 and name.endswith(".m3u8"):
+                    return self._send_text(hls_playlist(segments, name[:-5]), "application/vnd.apple.mpegurl", head)
+                if len(parts) == 4 and name.endswith(".mpd"):
+                    return self._send_text(dash_manifest(segments, name[:-4]), "application/dash+xml", head)
+                if len(parts) == 5:
+                    return self._send_bytes(1024 if parts[4].startswith("init") else seg_bytes, "video/mp4", head)
+        except (ValueError, IndexError):
+            pass
+        self.send_error(404)
+
+    def _send_text(self, text: str, content_type: str, head: bool):
+        body = text.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+
+    def _send_bytes(self, size: int, content_type: str, head: bool):
+        start, end = 0, size - 1
+        match = re.match(r"bytes=(\d*)-(\d*)", self.headers.get("Range", ""))
+        if match and (match.group(1) or match.group(2)):
+            if match.group(1):
+                start = int(match.group(1))
+                end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+            else:
+                start = max(0, size - int(match.group(2)))
+            if start >= size:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+        if head:
+            return
+        remaining, started = end - start + 1, time.monotonic()
+        sent = 0
+        try:
+            while remaining > 0:
+                n = min(CHUNK, remaining)
+                self.wfile.write(b"\0" * n)
+                remaining -= n
+                sent += n
+                if self.bandwidth:
+                    ahead = sent / self.bandwidth - (time.monotonic() - started)
+                    if ahead > 0:
+                        time.sleep(ahead)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+def hls_playlist(segments: int, name: str) -> str:
+    lines = ["#EXTM3U", "#EXT-X-VERSION:3", "#EXT-X-TARGETDURATION:4", "#EXT-X-MEDIA-SEQUENCE:0"]
+    for i in range(segments):
+        lines += ["#EXTINF:4.0,", f"{name}/{i}.ts"]
+    return "\n".join(lines + ["#EXT-X-ENDLIST", ""])
+
+
+def rss_feed(base: str, count: int, size: int, name: str) -> str:
+    items = "".join(f"<item><title>{name} {i}</title><guid>{name}_{i}</guid>"
+                    f"<enclosure url=\"{base}/p/{size}/{name}_{i}.mp4\" type=\"video/mp4\"/></item>" for i in range(count))
+    return f'<?xml version="1.0"?><rss version="2.0"><channel><title>{name}</title>{items}</channel></rss>'
+
+
+def dash_manifest(segments: int, name: str) -> str:
+    urls = "".join(f'<SegmentURL media="{name}/{i}.m4s"/>' for i in range(segments))
+    return (
+        '<?xml version="1.0"?>'
+        '<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" type="static" minBufferTime="PT2S" '
+        f'mediaPresentationDuration="PT{segments * 4}S" profiles="urn:mpeg:dash:profile:isoff-on-demand:2011">'
+        '<Period><AdaptationSet mimeType="video/mp4">'
+        '<Representation id="1" bandwidth="1000000" codecs="avc1.4d401f,mp4a.40.2" width="640" height="360">'
+        f'<SegmentList duration="4" timescale="1"><Initialization sourceURL="{name}/init.mp4"/>{urls}</SegmentList>'
+        '</Representation></AdaptationSet></Period></MPD>'
+    )
+
+
+def start_server(bandwidth_mbps: float, latency_ms: float) -> ThreadingHTTPServer:
+    handler = type("Handler", (MediaHandler,), {
+        # Decimal Mbit/s, like RateLimiter (mbps_to_bytes in nedlastarn_core)
+        "bandwidth": int(bandwidth_mbps * 1_000_000 / 8), "latency": latency_ms / 1000.0})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def media_urls(base: str, kind: str, count: int, file_mb: float, segments: int, run_id: str) -> list[str]:
+    size = int(file_mb * 1024 * 1024)
+    seg_bytes = max(1, size // segments)
+    urls = []
+    for i in range(count):
+        name = f"{kind}_{run_id}_{i}"
+        if kind == "progressive":
+            urls.append(f"{base}/p/{size}/{name}.mp4")
+        elif kind == "playlist":
+            return [f"{base}/rss/{count}/{size}/{name}.xml"]  # One playlist URL with <count> entries
+        elif kind == "hls":
+            urls.append(f"{base}/hls/{segments}/{seg_bytes}/{name}.m3u8")
+        else:
+            urls.append(f"{base}/dash/{segments}/{seg_bytes}/{name}.mpd")
+    return urls
+
+
+def peak_rss_mb() -> float | None:
+    """Peak resident memory for this process"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(peak / 1024 / (1024 if sys.platform == "darwin" else 1), 1)
+    except ImportError:
+        pass
+    try:
+        import ctypes
+        import ctypes.wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [("cb", ctypes.wintypes.DWORD), ("PageFaultCount", ctypes.wintypes.DWORD),
+                        ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                        ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        ctypes.windll.psapi.GetProcessMemoryInfo(ctypes.windll.kernel32.GetCurrentProcess(),
+                                                 ctypes.byref(counters), counters.cb)
+        return round(counters.PeakWorkingSetSize / 1024 / 1024, 1)
+    except Exception:
+        return None
+
+
+def run_child(spec: dict) -> dict:
+    """One benchmark run (in the child process): drive Downloader and collect timings"""
+    import nedlastarn_core as core
+
+    msgs: queue.Queue = queue.Queue()
+    out_dir = Path(spec["out_dir"])
+    worker = core.Downloader(spec["urls"], out_dir, "best", "best", "none", True, True, msgs,
+                             max_workers=spec["jobs"], per_host_limit=spec["jobs"],
+                             info_cache=None, cookie_store=core.CookieStore(persist=False),
+                             segments=spec["connections"], segment_min_mb=0,
+                             rate_limiter=core.RateLimiter(limit=core.mbps_to_bytes(spec["limit_mbps"])))
+    last_state, first_byte, job_started = {}, {}, {}
+    n_msgs = n_progress = 0
+    t0 = time.monotonic()
+    worker.start()
+    while True:
+        alive = worker.is_alive()
+        while True:
+            try:
+                kind, *data = msgs.get_nowait()
+            except queue.Empty:
+                break
+            n_msgs += 1
+            if kind == "job":
+                now = time.monotonic() - t0
+                if data[1] == "running":
+                    job_started.setdefault(data[0], now)
+                last_state[data[0]] = data[1]
+        for job_id, state in worker.progress.drain(force=True).items():
+            n_progress += 1
+            if state[0] and job_id not in first_byte:
+                first_byte[job_id] = time.monotonic() - t0
+        if not alive:
+            break
+        time.sleep(0.02)
+    wall = time.monotonic() - t0
+
+    total_bytes = sum(p.stat().st_size for p in out_dir.rglob("*") if p.is_file())
+    setup = [first_byte[j] - job_started[j] for j in first_byte if j in job_started]
+    limit = {}
+    if spec["limit_mbps"] and job_started:
+        # Aggregate bytes from the first job start may not exceed the limit plus the token bucket's burst
+        # (first_byte is only seen at the next progress drain, so it would shorten the window)
+        allowed = core.mbps_to_bytes(spec["limit_mbps"]) * (wall - min(job_started.values()) + core.RateLimiter.BURST_S)
+        limit = {"limit_ratio": round(total_bytes / allowed, 3), "within_limit": total_bytes <= allowed}
+    return {
+        "wall_s": round(wall, 3),
+        "bytes": total_bytes,
+        "mb_s": round(total_bytes / 1024 / 1024 / wall, 2) if wall else None,
+        "ttfb_s": round(min(first_byte.values()), 3) if first_byte else None,
+        "per_url_overhead_s": round(sum(setup) / len(setup), 3) if setup else None,
+        "msg_rate": round(n_msgs / wall, 1) if wall else None,
+        "progress_rate": round(n_progress / wall, 1) if wall else None,
+        "peak_rss_mb": peak_rss_mb(),
+        "states": {s: sum(1 for v in last_state.values() if v == s) for s in set(last_state.values())},
+        **limit,
+    }
+
+
+def run_one(urls: list[str], jobs: int, connections: int, limit_mbps: float, timeout: float) -> dict:
+    """Start a child process for one run with a throwaway config dir and output folder"""
+    with tempfile.TemporaryDirectory() as tmp:
+        spec = {"urls": urls, "jobs": jobs, "connections": connections, "limit_mbps": limit_mbps, "out_dir": str(Path(tmp) / "out")}
+        env = {**os.environ, "APPDATA": str(Path(tmp) / "appdata")}
+        proc = subprocess.run([sys.executable, __file__, "--child", json.dumps(spec)], env=env,
+                              capture_output=True, text=True, timeout=timeout, cwd=Path(__file__).parent)
+    if proc.returncode != 0:
+        return {"error": (proc.stderr or proc.stdout).strip()[-500:]}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def compare(old_path: Path, results: list[dict]):
+    old = {(r["kind"], r["batch"]): r for r in json.loads(old_path.read_text(encoding="utf-8"))["results"]}
+    print(f"\nCompared with {old_path.name}:")
+    print(f"{'Kind':<12}{'Batch':>6}{'MB/s':>16}{'Overhead/URL':>22}{'Peak RSS':>20}")
+    for r in results:
+        o = old.get((r["kind"], r["batch"]))
+        if not o or "error" in r or "error" in o:
+            continue
+        def delta(key):
+            if r.get(key) is None or o.get(key) is None:
+                return "–"
+            return f"{r[key]} ({r[key] - o[key]:+.3g})"
+        print(f"{r['kind']:<12}{r['batch']:>6}{delta('mb_s'):>16}{delta('per_url_overhead_s'):>22}{delta('peak_rss_mb'):>20}")
+
+
+def benchmark(kinds: list[str], sizes: list[int], jobs: int, file_mb: float, segments: int, connections: int, limit_mbps: float,
+              bandwidth_mbps: float, latency_ms: float, timeout: float, output: Path | None, compare_with: Path | None):
+    """Run every kind x batch size and save the results"""
+    server = start_server(bandwidth_mbps, latency_ms)
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    config = {"kinds": kinds, "sizes": sizes, "jobs": jobs, "file_mb": file_mb, "segments": segments,
+              "connections": connections, "limit_mbps": limit_mbps, "bandwidth_mbps": bandwidth_mbps, "latency_ms": latency_ms, "python": sys.version.split()[0]}
+    print(f"Benchmark server: {base}  (bandwidth {bandwidth_mbps or 'unlimited'} Mbit/s per connection, latency {latency_ms} ms)")
+    results = []
+    try:
+        for kind in kinds:
+            for size in sizes:
+                run_id = datetime.now().strftime("%H%M%S%f")
+                print(f"  {kind:<12} batch {size:>3} ...", end=" ", flush=True)
+                result = run_one(media_urls(base, kind, size, file_mb, segments, run_id), jobs, connections, limit_mbps, timeout)
+                results.append({"kind": kind, "batch": size, **result})
+                if "error" in result:
+                    print("ERROR\n" + result["error"])
+                else:
+                    print(f"{result['mb_s']} MB/s, TTFB {result['ttfb_s']} s, "
+                          f"overhead/URL {result['per_url_overhead_s']} s, {result['msg_rate']} msg/s, "
+                          f"peak RSS {result['peak_rss_mb']} MB"
+                          + (f", {result['limit_ratio']:.0%} of limit" if "limit_ratio" in result else "")
+                          + ("  OVER LIMIT" if result.get("within_limit") is False else ""))
+    finally:
+        server.shutdown()
+
+    if output is None:
+        output = Path(__file__).parent / "build" / "benchmarks" / f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps({"config": config, "results": results}, indent=2), encoding="utf-8")
+    print(f"\nResults saved to: {output}")
+    if compare_with:
+        compare(compare_with, results)
+    return results
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "--child":
+        print(json.dumps(run_child(json.loads(sys.argv[2]))))
+        sys.exit(0)
+    parser = argparse.ArgumentParser(description="End-to-end throughput benchmark for Nedlastarn")
+    parser.add_argument("--kinds", default=",".join(KINDS), help="Comma-separated: progressive,hls,dash,playlist")
+    parser.add_argument("--sizes", default="1,5,20", help="Batch sizes (number of URLs), comma-separated")
+    parser.add_argument("--jobs", type=int, default=3, help="Downloader workers (default: 3)")
+    parser.add_argument("--file-mb", type=float, default=5.0, help="Size of each synthetic file in MB")
+    parser.add_argument("--segments", type=int, default=10, help="Segments per HLS/DASH stream")
+    parser.add_argument("--connections", type=int, default=0,
+                        help="Range connections per progressive file (0 = single connection)")
+    parser.add_argument("--limit-mbps", type=float, default=0.0,
+                        help="Global Downloader rate limit in Mbit/s; runs that exceed it are flagged (0 = none)")
+    parser.add_argument("--bandwidth-mbps", type=float, default=0.0, help="Per-connection limit in Mbit/s (0 = unlimited)")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Added latency per request")
+    parser.add_argument("--timeout", type=float, default=600.0, help="Seconds before a run is aborted")
+    parser.add_argument("--output", type=Path, help="Result file (default: build/benchmarks/benchmark_<time>.json)")
+    parser.add_argument("--compare", type=Path, help="Earlier result file to compare against")
+    opts = parser.parse_args()
+    kinds = [k.strip() for k in opts.kinds.split(",") if k.strip()]
+    unknown = [k for k in kinds if k not in KINDS]
+    if unknown:
+        parser.error(f"unknown kinds: {', '.join(unknown)}")
+    results = benchmark(kinds, [int(s) for s in opts.sizes.split(",") if s.strip()], opts.jobs, opts.file_mb, opts.segments, opts.connections, opts.limit_mbps,
+              opts.bandwidth_mbps, opts.latency_ms, opts.timeout, opts.output, opts.compare)
+    sys.exit(1 if any(r.get("within_limit") is False for r in results) else 0)
@@ -1,69 +1,175 @@
 #!/usr/bin/env python3
 """
 Build script for Nedlastarn executable
+
+Modes:
+  onefile  Single Nedlastarn.exe (default). Unpacks the whole bundle to a temp
+           dir on every launch, so it starts slower.
+  onedir   Startup-optimized: dist/Nedlastarn/ folder with Nedlastarn.exe and an
+           optimized bytecode archive. Nothing is unpacked at launch, UPX is off
+           (no decompression of DLLs) and unused modules are excluded.
+
+Use --extractors to bundle only some yt-dlp extractors (e.g. youtube,nrk).
+Measure the result with measure_startup.py.
 """
 
 import PyInstaller.__main__
-import os
+import argparse
+import ast
+import json
 import sys
 from pathlib import Path
 
-def build_executable():
+MODES = ("onefile", "onedir")
+
+# Modules never used by the app
+BASE_EXCLUDES = ["tkinter.test", "test", "unittest", "pydoc", "doctest"]
+
+# Extra excludes for the startup-optimized mode - fewer files to analyze, bundle and load
+ONEDIR_EXCLUDES = ["lib2to3", "pdb", "pydoc_data", "idlelib", "turtle", "turtledemo",
+                   "xmlrpc", "curses", "distutils", "setuptools", "pip", "yt_dlp.__main__"]
+
+# Extractor modules that are always kept: the base classes and the generic fallback
+CORE_EXTRACTOR_MODULES = {"__init__", "common", "commonmistakes", "commonprotocols", "generic",
+                          "extractors", "lazy_extractors", "openload"}
+
+
+def _relative_imports(path: Path, depth: int) -> set[str]:
+    """Top-level extractor modules imported with `from .x import ...` (depth 1) or `from ..x` inside packages"""
+    names = set()
+    for node in ast.walk(ast.parse(path.read_text(encoding="utf-8"))):
+        if isinstance(node, ast.ImportFrom) and node.level == depth:
+            if node.module:
+                names.add(node.module.split(".")[0])
+            else:
+                names.update(alias.name for alias in node.names)
+    return names
+
+
+def _extractors_used_by_core(package_dir: Path) -> set[str]:
+    """Extractor modules imported directly by the rest of yt-dlp (e.g. adobepass from yt_dlp/__init__.py)"""
+    names = set()
+    for path in package_dir.rglob("*.py"):
+        if "extractor" in path.relative_to(package_dir).parts[:1]:
+            continue
+        for node in ast.walk(ast.parse(path.read_text(encoding="utf-8"))):
+            if isinstance(node, ast.ImportFrom) and node.module:
+                parts = node.module.split(".")
+                if len(parts) > 1 and parts[0] == "extractor":
+                    names.add(parts[1])
+    return names
+
+
+def trim_extractors(wanted: list[str], work_dir: Path) -> tuple[list[str], Path]:
+    """Compute yt-dlp extractor modules to exclude and write the kept extractor names.
+
+    Returns (modules to exclude, path to extractors.json). The JSON file is bundled
+    with the app, which then restricts yt-dlp to these extractors so the excluded
+    modules are never imported.
+    """
+    import yt_dlp.extractor
+    try:
+        from yt_dlp.extractor.lazy_extractors import _CLASS_LOOKUP
+    except ImportError:
+        sys.exit("--extractors requires a yt-dlp install with lazy_extractors (the normal pip package)")
+
+    ext_dir = Path(yt_dlp.extractor.__file__).parent
+    modules = {p.stem: [p] for p in ext_dir.glob("*.py")}
+    modules.update({p.name: sorted(p.rglob("*.py")) for p in ext_dir.iterdir() if (p / "__init__.py").exists()})
+    unknown = [m for m in wanted if m not in modules]
+    if unknown:
+        sys.exit(f"Unknown extractor modules: {', '.join(unknown)}")
+
+    # Follow imports between extractor modules so nothing we keep imports an excluded module
+    keep, todo = set(), [*CORE_EXTRACTOR_MODULES, *_extractors_used_by_core(ext_dir.parent), *wanted]
+    while todo:
+        name = todo.pop()
+        if name in keep or name not in modules or name == "_extractors":
+            continue
+        keep.add(name)
+        for path in modules[name]:
+            depth = len(path.relative_to(ext_dir).parts)
+            todo.extend(_relative_imports(path, depth))
+
+    # _extractors imports every extractor; it is only used when lazy_extractors is missing
+    excludes = [f"yt_dlp.extractor.{name}" for name in sorted(set(modules) - keep)]
+    ie_names = sorted({cls.IE_NAME.lower() for cls in _CLASS_LOOKUP.values()
+                       if cls._module.split(".")[2] in keep})
+    work_dir.mkdir(parents=True, exist_ok=True)
+    manifest = work_dir / "extractors.json"
+    manifest.write_text(json.dumps({"modules": sorted(keep), "ie_names": ie_names}, indent=2), encoding="utf-8")
+    print(f"Keeping {len(keep)} of {len(modules)} extractor modules ({len(ie_names)} extractors)")
+    return excludes, manifest
+
+
+def build_executable(mode: str = "onefile", extractors: list[str] | None = None):
     """Build Nedlastarn as a standalone executable"""
-    
+
     # Get the current directory
     current_dir = Path(__file__).parent
-    
+
     # Define paths
     main_script = current_dir / "Nedlastarn.py"
     icon_path = current_dir / "icon.ico"  # Optional icon file
-    
+
     # PyInstaller arguments
     args = [
         str(main_script),
         "--name=Nedlastarn",
-        "--onefile",  # Create a single executable file
+        f"--{mode}",  # onefile: single executable, onedir: folder (no unpacking at launch)
         "--windowed",  # No console window (GUI app)
         "--clean",  # Clean cache before building
         "--noconfirm",  # Overwrite output directory without asking
-        
+
         # Add data files
         "--add-data=README.md;.",  # Include README
         "--add-data=LICENSE;.",  # Include LICENSE
-        
+
         # Optimize for size
         "--strip",  # Strip debug symbols
-        "--optimize=2",  # Python optimization level
-        
-        # Exclude unnecessary modules to reduce size
-        "--exclude-module=tkinter.test",
-        "--exclude-module=test",
-        "--exclude-module=unittest",
-        "--exclude-module=pydoc",
-        "--exclude-module=doctest",
-        
+        "--optimize=2",  # Python optimization level (bytecode in the archive is precompiled with -OO)
+
         # Custom options
         "--distpath=dist",  # Output directory
         "--workpath=build",  # Temporary files directory
-        "--specpath=.",  # Spec file location
+        "--specpath=build",  # Generated spec file location (keeps the maintained Nedlastarn.spec intact)
     ]
-    
+
+    # Exclude unnecessary modules to reduce size
+    excludes = BASE_EXCLUDES + (ONEDIR_EXCLUDES if mode == "onedir" else [])
+    if mode == "onedir":
+        args.append("--noupx")  # UPX-compressed DLLs must be decompressed on every launch
+    if extractors:
+        extractor_excludes, manifest = trim_extractors(extractors, current_dir / "build")
+        excludes += extractor_excludes
+        args.append(f"--add-data={manifest};.")
+    args.extend(f"--exclude-module={name}" for name in excludes)
+
     # Add icon if it exists
     if icon_path.exists():
         args.extend(["--icon", str(icon_path)])
-    
-    print("Building Nedlastarn executable...")
+
+    print(f"Building Nedlastarn executable ({mode})...")
     print(f"Working directory: {current_dir}")
     print(f"Main script: {main_script}")
-    
+
     try:
         PyInstaller.__main__.run(args)
         print("Build completed successfully!")
-        print("Executable created in: dist/Nedlastarn.exe")
-        
+        if mode == "onedir":
+            print("Executable created in: dist/Nedlastarn/Nedlastarn.exe")
+        else:
+            print("Executable created in: dist/Nedlastarn.exe")
+
     except Exception as e:
         print(f"Build failed: {e}")
         sys.exit(1)
 
 if __name__ == "__main__":
-    build_executable()
+    parser = argparse.ArgumentParser(description="Build Nedlastarn with PyInstaller")
+    parser.add_argument("--mode", choices=MODES, default="onefile",
+                        help="onefile (single exe) or onedir (startup-optimized folder)")
+    parser.add_argument("--extractors", default="",
+                        help="Comma-separated yt-dlp extractor modules to bundle, e.g. youtube,nrk (default: all)")
+    opts = parser.parse_args()
+    build_executable(opts.mode, [e.strip() for e in opts.extractors.split(",") if e.strip()] or None)
@@ -3,19 +3,32 @@
 Create distribution package for Nedlastarn
 """
 
+import argparse
 import zipfile
 import os
 from pathlib import Path
 from datetime import datetime
 
-def create_distribution():
+def find_build(dist_dir: Path, mode: str | None = None) -> tuple[str, Path] | None:
+    """Return (mode, path) of the build to package; the newest one if both modes exist"""
+    builds = {
+        "onefile": dist_dir / "Nedlastarn.exe",
+        "onedir": dist_dir / "Nedlastarn" / "Nedlastarn.exe",
+    }
+    found = {m: p for m, p in builds.items() if p.exists() and (mode is None or m == mode)}
+    if not found:
+        return None
+    newest = max(found, key=lambda m: found[m].stat().st_mtime)
+    return newest, found[newest]
+
+def create_distribution(mode: str | None = None):
     """Create a distribution ZIP package"""
     
     # Get current directory
     current_dir = Path(__file__).parent
     
     # Define paths
-    exe_path = current_dir / "dist" / "Nedlastarn.exe"
+    build = find_build(current_dir / "dist", mode)
     readme_path = current_dir / "README.md"
     license_path = current_dir / "LICENSE"
     
@@ -25,20 +38,29 @@ def create_distribution():
     
     # Create ZIP filename with timestamp
     timestamp = datetime.now().strftime("%Y%m%d_%H%M")
-    zip_filename = f"Nedlastarn_v1.0_{timestamp}.zip"
+    build_mode = build[0] if build else "onefile"
+    zip_filename = f"Nedlastarn_v1.0_{build_mode}_{timestamp}.zip"
     zip_path = dist_dir / zip_filename
     
     print(f"Creating distribution package: {zip_filename}")
     
     # Create ZIP file
     with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-        # Add executable
-        if exe_path.exists():
-            zipf.write(exe_path, "Nedlastarn.exe")
-            print(f"Added: Nedlastarn.exe ({exe_path.stat().st_size / 1024 / 1024:.1f} MB)")
-        else:
+        # Add executable (onefile) or the whole program folder (onedir)
+        if build is None:
             print("ERROR: Nedlastarn.exe not found!")
             return False
+        exe_path = build[1]
+        if build_mode == "onedir":
+            app_dir = exe_path.parent
+            files = [p for p in app_dir.rglob("*") if p.is_file()]
+            for file in files:
+                zipf.write(file, str(Path("Nedlastarn") / file.relative_to(app_dir)))
+            total = sum(p.stat().st_size for p in files)
+            print(f"Added: Nedlastarn/ ({len(files)} files, {total / 1024 / 1024:.1f} MB)")
+        else:
+            zipf.write(exe_path, "Nedlastarn.exe")
+            print(f"Added: Nedlastarn.exe ({exe_path.stat().st_size / 1024 / 1024:.1f} MB)")
         
         # Add README
         if readme_path.exists():
@@ -73,4 +95,7 @@ For more information, see: https://ffmpeg.org/download.html
     return True
 
 if __name__ == "__main__":
-    create_distribution()
+    parser = argparse.ArgumentParser(description="Create a distribution ZIP for Nedlastarn")
+    parser.add_argument("--mode", choices=("onefile", "onedir"),
+                        help="Build to package (default: the most recently built)")
+    create_distribution(parser.parse_args().mode)
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Measure launch-to-window time and bundle size for each build mode
+
+Runs every build found in dist/ (and the source version) several times with
+--startup-report and prints a table, so the fastest mode can be picked for
+deployment. Build the modes first with build_exe.py --mode onefile/onedir.
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+
+def bundle_size(path: Path) -> int:
+    """Size in bytes of a file or of everything in a folder"""
+    if path.is_file():
+        return path.stat().st_size
+    return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+
+
+def find_targets(current_dir: Path, include_source: bool) -> list[tuple[str, list[str], Path]]:
+    """(mode, command, bundle path) for each available build"""
+    dist = current_dir / "dist"
+    targets = []
+    if (dist / "Nedlastarn.exe").exists():
+        targets.append(("onefile", [str(dist / "Nedlastarn.exe")], dist / "Nedlastarn.exe"))
+    if (dist / "Nedlastarn" / "Nedlastarn.exe").exists():
+        targets.append(("onedir", [str(dist / "Nedlastarn" / "Nedlastarn.exe")], dist / "Nedlastarn"))
+    if include_source:
+        targets.append(("source", [sys.executable, str(current_dir / "Nedlastarn.py")], current_dir / "Nedlastarn.py"))
+    return targets
+
+
+def measure_once(command: list[str], timeout: float) -> dict | None:
+    """Launch once; returns seconds from launch to window shown and to ready"""
+    with tempfile.TemporaryDirectory() as tmp:
+        report_path = Path(tmp) / "startup.json"
+        launched = time.time()
+        proc = subprocess.Popen(command + ["--startup-report", str(report_path)])
+        try:
+            proc.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            return None
+        if not report_path.exists():
+            return None
+        report = json.loads(report_path.read_text(encoding="utf-8"))
+    if not report.get("window_at"):
+        return None
+    return {"window": report["window_at"] - launched, "ready": report["ready_at"] - launched}
+
+
+def measure_startup(runs: int = 5, include_source: bool = True, timeout: float = 60.0):
+    """Measure all available builds and print a comparison"""
+    current_dir = Path(__file__).parent
+    targets = find_targets(current_dir, include_source)
+    if not targets:
+        print("No builds found in dist/. Run build_exe.py --mode onefile and/or --mode onedir first.")
+        return []
+
+    results = []
+    for mode, command, path in targets:
+        print(f"Measuring {mode} ({runs} runs)...")
+        samples = [s for s in (measure_once(command, timeout) for _ in range(runs)) if s]
+        if not samples:
+            print(f"  {mode}: no startup report (did the app start?)")
+            continue
+        results.append({
+            "mode": mode,
+            "size_mb": round(bundle_size(path) / 1024 / 1024, 1),
+            "first_window_s": round(samples[0]["window"], 3),  # Cold start, e.g. onefile unpacking
+            "window_s": round(statistics.median(s["window"] for s in samples), 3),
+            "ready_s": round(statistics.median(s["ready"] for s in samples), 3),
+        })
+
+    print(f"\n{'Mode':<10}{'Size (MB)':>11}{'First window':>15}{'Window (median)':>18}{'Ready (median)':>17}")
+    for r in results:
+        print(f"{r['mode']:<10}{r['size_mb']:>11}{r['first_window_s']:>14}s{r['window_s']:>17}s{r['ready_s']:>16}s")
+    builds = [r for r in results if r["mode"] != "source"]
+    if builds:
+        fastest = min(builds, key=lambda r: r["window_s"])
+        print(f"\nFastest to window: {fastest['mode']}")
+
+    out_path = current_dir / "build" / "startup_measurements.json"
+    out_path.parent.mkdir(exist_ok=True)
+    out_path.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    print(f"Results saved to: {out_path}")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure Nedlastarn startup time per build mode")
+    parser.add_argument("--runs", type=int, default=5, help="Launches per mode (default: 5)")
+    parser.add_argument("--no-source", action="store_true", help="Skip measuring python Nedlastarn.py")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Seconds to wait for each launch")
+    opts = parser.parse_args()
+    measure_startup(opts.runs, not opts.no_source, opts.timeout)
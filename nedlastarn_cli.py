@@ -0,0 +1,210 @@
+"""Hodeløs batch-modus: samme Downloader-motor som GUI-et, uten Tk (for servere, cron og målinger)
+
+    python Nedlastarn.py --batch urls.txt --mode mp3 --jobs 4
+    python nedlastarn_cli.py --batch - --json < urls.txt
+    python Nedlastarn.py --resume           # fortsett siste uferdige batch fra journalen
+    python Nedlastarn.py --batch urls.txt --outputs mp4:1080p,mp3:320   # én nedlasting, flere formater
+
+Avslutningskoder: 0 = alt fullført/hoppet over, 1 = noe feilet, 2 = ugyldig bruk/URL,
+3 = mangler yt-dlp eller FFmpeg, 130 = avbrutt (Ctrl+C).
+"""
+import sys
+import json
+import time
+import queue
+import argparse
+from pathlib import Path
+
+from nedlastarn_config import (DEFAULT_CONFIG, load_config, save_config, ensure_ffmpeg_on_path, _check_ffmpeg,
+                               validate_urls, format_eta, parse_outputs)
+
+EXIT_OK, EXIT_FAILED, EXIT_USAGE, EXIT_MISSING_DEP, EXIT_CANCELLED = 0, 1, 2, 3, 130
+
+
+def read_urls(source: str) -> list[str]:
+    """URLer fra fil (eller "-" for stdin), én per linje; tomme linjer og #-kommentarer hoppes over"""
+    text = sys.stdin.read() if source == "-" else Path(source).read_text(encoding="utf-8-sig")
+    return [line.strip() for line in text.splitlines() if line.strip() and not line.strip().startswith("#")]
+
+
+def build_parser(cfg: dict) -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="Nedlastarn", description="Last ned en liste med URLer uten GUI")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--batch", metavar="FIL", help='fil med én URL per linje, eller "-" for stdin')
+    source.add_argument("--resume", action="store_true",
+                        help="fortsett siste uferdige batch (URLer, mappe og format fra batch-journalen)")
+    parser.add_argument("--mode", choices=("mp4", "mp3", "best"), default="mp4", help="format (standard: mp4)")
+    parser.add_argument("--quality", choices=("best", "1080p", "720p", "480p"), default="best")
+    parser.add_argument("--mp3-quality", choices=("128", "192", "256", "320"), default="192")
+    parser.add_argument("--outputs", metavar="LISTE",
+                        help='flere formater fra én nedlasting, f.eks. "mp4:1080p,mp3:320,original" (erstatter --mode)')
+    parser.add_argument("--out", default=cfg.get("default_dir", DEFAULT_CONFIG["default_dir"]), metavar="MAPPE")
+    parser.add_argument("--jobs", type=int, default=cfg.get("max_workers", DEFAULT_CONFIG["max_workers"]),
+                        help="samtidige nedlastinger")
+    parser.add_argument("--per-host", type=int, default=cfg.get("per_host_limit", DEFAULT_CONFIG["per_host_limit"]),
+                        help="maks samtidige nedlastinger per nettsted")
+    parser.add_argument("--fragments", type=int, metavar="N",
+                        default=cfg.get("fragment_concurrency", DEFAULT_CONFIG["fragment_concurrency"]),
+                        help="samtidige HLS/DASH-fragmenter; 0 = automatisk per nettsted (standard)")
+    parser.add_argument("--connections", type=int, metavar="N",
+                        default=cfg.get("segment_connections", DEFAULT_CONFIG["segment_connections"]),
+                        help="tilkoblinger per stor enkeltfil (HTTP Range); 0/1 = av (standard fra config)")
+    parser.add_argument("--limit", type=float, metavar="MBIT",
+                        default=cfg.get("rate_limit_mbps", DEFAULT_CONFIG["rate_limit_mbps"]),
+                        help="felles fartsgrense i Mbit/s for alle nedlastinger; 0 = ingen (arbeidstid fra config gjelder)")
+    parser.add_argument("--browser", choices=("none", "chrome", "edge", "firefox"), default="none",
+                        help="les cookies fra nettleser")
+    parser.add_argument("--playlist", choices=("all", "first"), default="all", help="hele spillelister eller kun første")
+    parser.add_argument("--overwrite", action="store_true", default=cfg.get("overwrite_existing", False))
+    parser.add_argument("--keep-norwegian", action="store_true", default=cfg.get("keep_norwegian_chars", False),
+                        help="behold æøå i filnavn")
+    parser.add_argument("--no-cache", action="store_true", help="ikke bruk metadata-bufferen")
+    parser.add_argument("--report", metavar="FIL", help="lagre tidsbruk per fase og URL som .json eller .csv")
+    parser.add_argument("--profile", metavar="FIL", help="lagre en cProfile-dump av arbeidertrådene (python -m pstats FIL)")
+    parser.add_argument("--json", action="store_true", help="skriv hendelser som JSON-linjer på stdout")
+    parser.add_argument("--progress-interval", type=float, default=2.0, metavar="SEK",
+                        help="sekunder mellom fremdriftslinjer (standard: 2)")
+    return parser
+
+
+class BatchPrinter:
+    """Skriver meldinger fra Downloader som tekst eller JSON-linjer"""
+    def __init__(self, as_json: bool):
+        self.as_json = as_json
+
+
+    def emit(self, kind: str, text: str | None = None, **fields):
+        if self.as_json:
+            print(json.dumps({"type": kind, **fields, **({"text": text} if text is not None else {})}, ensure_ascii=False), flush=True)
+        elif text is not None:
+            print(text, flush=True)
+
+
+    def message(self, kind: str, data: list):
+        if kind == "log":
+            text, job_id = data
+            prefix = f"[{job_id}] " if job_id is not None and not self.as_json else ""
+            lead = text[:len(text) - len(text.lstrip("\n"))]
+            self.emit("log", lead + prefix + text.lstrip("\n"), job=job_id)
+        elif kind == "job":
+            self.emit("job", None, job=data[0], state=data[1])
+        elif kind == "pp_status":
+            self.emit("pp_status", None, active=data[0], queued=data[1])
+
+
+    def progress(self, job_id: int, state: tuple, limit: float = 0):
+        pct, speed, eta, filename, item = state
+        connections = (item or {}).get("connections")
+        if self.as_json:
+            self.emit("progress", None, job=job_id, pct=round(pct or 0.0, 1), speed=speed, eta=eta,
+                      file=Path(filename).name if filename else None, limit=limit or None, connections=connections)
+            return
+        spd_txt = f"{speed/1024/1024:.2f} MB/s" if speed else "–"
+        if limit: spd_txt += f" (grense {limit/1024/1024:.2f} MB/s)"
+        if connections: spd_txt += f" ×{connections}"
+        name = Path(filename).name if filename else ""
+        self.emit("progress", f"[{job_id}] {pct or 0.0:5.1f} %  {spd_txt}  Gjenstår: {format_eta(eta)}  {name}")
+
+
+def main(argv: list[str] | None = None) -> int:
+    cfg = load_config()
+    args = build_parser(cfg).parse_args(argv)
+    out = BatchPrinter(args.json)
+    pending = None
+    if args.resume:
+        try:
+            import nedlastarn_core as core
+        except SystemExit as e:
+            out.emit("error", str(e))
+            return EXIT_MISSING_DEP
+        pending = core.BatchJournal().pending()
+        if pending is None:
+            out.emit("log", "Ingen uferdig batch å fortsette.")
+            return EXIT_OK
+        urls, settings = pending["urls"], pending["settings"]
+        args.out, args.mode, args.quality = settings["out_dir"], settings["mode"], settings["quality"]
+        args.mp3_quality, args.browser = settings["mp3_quality"], settings["browser"]
+        args.outputs = settings.get("outputs") or None
+        args.playlist = "first" if settings["playlist_items"] == "1" else "all"
+        out.emit("log", f"↻ Fortsetter batch {pending['id']}: {len(urls)} URL(er) gjenstår.", batch=pending["id"])
+    else:
+        try:
+            urls = read_urls(args.batch)
+        except OSError as e:
+            out.emit("error", f"❌ Kunne ikke lese {args.batch}: {e}")
+            return EXIT_USAGE
+    if isinstance(args.outputs, str):
+        try:
+            args.outputs = parse_outputs(args.outputs)
+        except ValueError as e:
+            out.emit("error", f"❌ --outputs: {e}")
+            return EXIT_USAGE
+    if args.outputs: args.mode = "multi"
+    valid, invalid = validate_urls(urls)
+    if invalid:
+        out.emit("error", "❌ Ugyldige URLer:\n" + "\n".join(invalid), urls=invalid)
+        return EXIT_USAGE
+    if not valid:
+        out.emit("error", "❌ Ingen URLer i " + str(args.batch))
+        return EXIT_USAGE
+    ensure_ffmpeg_on_path()
+    if any(mode != "best" for mode, _ in args.outputs or [(args.mode, None)]) and not _check_ffmpeg():
+        out.emit("error", "❌ FFmpeg ikke funnet. Legg ffmpeg.exe i samme mappe eller installer FFmpeg.")
+        return EXIT_MISSING_DEP
+    try:
+        import nedlastarn_core as core
+    except SystemExit as e:  # nedlastarn_core kaster SystemExit når yt-dlp mangler
+        out.emit("error", str(e))
+        return EXIT_MISSING_DEP
+
+    msgs: queue.Queue = queue.Queue()
+    worker = core.Downloader(valid, Path(args.out), args.mode, args.quality, args.browser, args.keep_norwegian,
+                             args.overwrite, msgs, mp3_quality=args.mp3_quality,
+                             playlist_items="1" if args.playlist == "first" else None,
+                             max_workers=args.jobs, per_host_limit=args.per_host,
+                             info_cache=None if args.no_cache else core.InfoCache.from_config(cfg),
+                             cookie_store=core.CookieStore.from_config(cfg),
+                             progress_hz=cfg.get("progress_hz", DEFAULT_CONFIG["progress_hz"]),
+                             pp_workers=cfg.get("pp_workers", DEFAULT_CONFIG["pp_workers"]),
+                             fragment_tuner=core.FragmentTuner.from_config({**cfg, "fragment_concurrency": args.fragments}),
+                             journal=core.BatchJournal(), batch_id=pending["id"] if pending else None,
+                             wait_on_paused=False,
+                             rate_limiter=core.RateLimiter.from_config({**cfg, "rate_limit_mbps": args.limit}),
+                             segments=args.connections,
+                             segment_min_mb=cfg.get("segment_min_mb", DEFAULT_CONFIG["segment_min_mb"]),
+                             report_path=Path(args.report) if args.report else None,
+                             profile_path=Path(args.profile) if args.profile else None, outputs=args.outputs)
+    started = time.monotonic()
+    worker.start()
+    next_progress = time.monotonic() + args.progress_interval
+    cancelled = False
+    while True:
+        try:
+            alive = worker.is_alive()
+            while True:
+                try: kind, *data = msgs.get(timeout=0.1 if alive else 0)
+                except queue.Empty: break
+                out.message(kind, data)
+            if not alive:
+                break
+            if time.monotonic() >= next_progress:
+                next_progress = time.monotonic() + args.progress_interval
+                for job_id, state in worker.progress.drain(force=True).items():
+                    out.progress(job_id, state, worker.rate_limiter.current_limit())
+        except KeyboardInterrupt:
+            if cancelled: return EXIT_CANCELLED
+            cancelled = True
+            out.emit("log", "⛔ Avbryter… (Ctrl+C igjen for å avslutte med en gang)")
+            worker.cancel()
+
+    learned = worker.fragment_tuner.learned()
+    if learned != cfg.get("fragment_hosts"):
+        save_config({**cfg, "fragment_hosts": learned})
+    counts = {state: sum(1 for j in worker.jobs if j.state == state) for state in ("done", "skipped", "failed", "cancelled")}
+    out.emit("summary", None, elapsed=round(time.monotonic() - started, 2), duplicates=worker.duplicates, **counts)
+    if cancelled or counts["cancelled"]: return EXIT_CANCELLED
+    return EXIT_FAILED if counts["failed"] else EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,206 @@
+"""Stier, konfigurasjon og lette systemsjekker – uten tunge avhengigheter, så GUI-et kan starte raskt"""
+import os
+import sys
+import json
+import logging
+import logging.handlers
+import shutil
+from pathlib import Path
+from urllib.parse import urlparse
+
+
+APP_NAME = "Nedlastarn"
+APP_DIR = Path(getattr(sys, "_MEIPASS", Path(__file__).resolve().parent))
+CONFIG_DIR = Path(os.environ.get("APPDATA", str(Path.home()))) / APP_NAME
+CONFIG_PATH = CONFIG_DIR / "config.json"
+INFO_CACHE_PATH = CONFIG_DIR / "info_cache.sqlite3"
+ARCHIVE_PATH = CONFIG_DIR / "archive.sqlite3"
+JOURNAL_PATH = CONFIG_DIR / "journal.sqlite3"
+LEGACY_ARCHIVE_NAME = "downloaded.txt"
+LOG_PATH = CONFIG_DIR / "logs" / "nedlastarn.log"
+REPORT_DIR = CONFIG_DIR / "reports"
+
+# Antall linjer som vises i loggvinduet; hele historikken ligger i LOG_PATH
+LOG_MAX_LINES = 2000
+
+# Konstanter for filnavn-maler
+DEFAULT_OUTPUT_TEMPLATE = "%(title)s [%(id)s].%(ext)s"
+SIMPLE_OUTPUT_TEMPLATE = "%(title)s.%(ext)s"
+
+
+def ensure_ffmpeg_on_path():
+    candidates = [
+        APP_DIR / "ffmpeg.exe",
+        Path.cwd() / "ffmpeg.exe",
+        Path(os.environ.get("PROGRAMFILES", "")) / "ffmpeg/bin/ffmpeg.exe",
+        Path(os.environ.get("PROGRAMFILES(X86)", "")) / "ffmpeg/bin/ffmpeg.exe",
+    ]
+    if shutil.which("ffmpeg"):
+        return
+    for exe in candidates:
+        if exe and exe.exists():
+            os.environ["PATH"] = str(exe.parent) + os.pathsep + os.environ.get("PATH", "")
+            break
+
+
+BROWSER_CANDIDATES = {
+    "chrome": [
+        Path(os.environ.get("PROGRAMFILES", "")) / "Google/Chrome/Application/chrome.exe",
+        Path(os.environ.get("PROGRAMFILES(X86)", "")) / "Google/Chrome/Application/chrome.exe",
+        Path.home() / "AppData/Local/Google/Chrome/Application/chrome.exe",
+    ],
+    "edge": [
+        Path(os.environ.get("PROGRAMFILES", "")) / "Microsoft/Edge/Application/msedge.exe",
+        Path(os.environ.get("PROGRAMFILES(X86)", "")) / "Microsoft/Edge/Application/msedge.exe",
+        Path.home() / "AppData/Local/Microsoft/Edge/Application/msedge.exe",
+    ],
+    "firefox": [
+        Path(os.environ.get("PROGRAMFILES", "")) / "Mozilla Firefox/firefox.exe",
+        Path(os.environ.get("PROGRAMFILES(X86)", "")) / "Mozilla Firefox/firefox.exe",
+        Path.home() / "AppData/Local/Mozilla Firefox/firefox.exe",
+    ],
+}
+
+
+def _check_ffmpeg() -> bool:
+    """Sjekk om FFmpeg er tilgjengelig"""
+    return shutil.which("ffmpeg") is not None
+
+
+def bundled_extractors() -> set[str] | None:
+    """Extractorene i en trimmet build (extractors.json fra build_exe.py --extractors), ellers None = alle"""
+    try:
+        return set(json.loads((APP_DIR / "extractors.json").read_text(encoding="utf-8"))["ie_names"])
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def autodetect_browser() -> str:
+    for key, paths in BROWSER_CANDIDATES.items():
+        for p in paths:
+            if p and p.exists():
+                return key
+    return "none"
+
+
+DEFAULT_CONFIG = {
+    "keep_norwegian_chars": False,
+    "default_dir": str(Path.home() / "Nedlastinger"),
+    "overwrite_existing": False,
+    "dark_mode": True,
+    "max_workers": 3,
+    "per_host_limit": 2,
+    "info_cache_enabled": True,
+    "info_cache_ttl_minutes": 60,
+    "info_cache_max_mb": 50,
+    "cookie_cache_minutes": 60,
+    "progress_hz": 5,
+    "pp_workers": 0,  # Tråder for ffmpeg-etterbehandling; 0 = antall CPU-kjerner
+    "fragment_concurrency": 0,  # Samtidige HLS/DASH-fragmenter; 0 = automatisk (måles per nettsted)
+    "fragment_min": 2,
+    "fragment_max": 16,
+    "fragment_hosts": {},  # Beste målte verdi per nettsted, oppdateres etter hver batch
+    "segment_connections": 0,  # Tilkoblinger per stor enkeltfil (HTTP Range); 0/1 = av
+    "segment_min_mb": 20,  # Filer mindre enn dette lastes ned over én tilkobling
+    "rate_limit_mbps": 0,  # Felles fartsgrense for alle nedlastinger (Mbit/s); 0 = ingen
+    "work_hours": "",  # Arbeidstid på hverdager, f.eks. "08:00-16:00"; tom = ingen
+    "work_hours_limit_mbps": 0,  # Grense i arbeidstiden; 0 = samme som rate_limit_mbps
+    "work_hours_hold": False,  # Ikke start nye nedlastinger i arbeidstiden
+    "prefetch_enabled": True,  # Hent info om innlimte URLer i bakgrunnen før "Last ned"
+    "perf_report": False,  # Lagre tidsbruk per fase som JSON i REPORT_DIR etter hver batch
+}
+
+
+def get_file_logger() -> logging.Logger:
+    """Logger som skriver hele logghistorikken til en roterende fil i CONFIG_DIR"""
+    logger = logging.getLogger(APP_NAME)
+    if not logger.handlers:
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        try:
+            LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
+            handler = logging.handlers.RotatingFileHandler(LOG_PATH, maxBytes=1024 * 1024, backupCount=3, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(asctime)s %(message)s", "%Y-%m-%d %H:%M:%S"))
+            logger.addHandler(handler)
+        except OSError as e:
+            print("Kunne ikke åpne loggfil:", e)
+            logger.addHandler(logging.NullHandler())
+    return logger
+
+
+def load_config() -> dict:
+    try:
+        if CONFIG_PATH.exists():
+            return {**DEFAULT_CONFIG, **json.loads(CONFIG_PATH.read_text(encoding="utf-8"))}
+    # Din forbedrede feilhåndtering:
+    except (json.JSONDecodeError, PermissionError) as e:
+        print(f"Advarsel: Kunne ikke laste konfigurasjonsfilen ({CONFIG_PATH}). Bruker standardinnstillinger. Feil: {e}")
+    except Exception as e:
+        # En generell fallback for andre uventede feil
+        print(f"Advarsel: En uventet feil oppstod ved lasting av config. Bruker standardinnstillinger. Feil: {e}")
+   
+    return DEFAULT_CONFIG.copy()
+
+
+def validate_urls(urls: list[str]) -> tuple[list[str], list[str]]:
+    """Del opp i gyldige (http/https med vertsnavn) og ugyldige URLer"""
+    valid, invalid = [], []
+    for u in urls: (valid if _url_is_valid(u) else invalid).append(u)
+    return valid, invalid
+
+
+def _url_is_valid(url: str) -> bool:
+    try:
+        p = urlparse(url)
+        return p.scheme in ("http", "https") and bool(p.netloc)
+    except Exception:
+        return False
+
+
+def parse_work_hours(text: str) -> tuple[int, int] | None:
+    """"08:00-16:00" → (480, 960) i minutter etter midnatt; tom tekst = ingen arbeidstid (ValueError ved feil format)"""
+    text = (text or "").strip()
+    if not text: return None
+    start, end = (part.strip() for part in text.split("-"))
+    minutes = []
+    for part in (start, end):
+        h, m = (int(x) for x in part.split(":"))
+        if not (0 <= h < 24 and 0 <= m < 60): raise ValueError(f"Ugyldig klokkeslett: {part}")
+        minutes.append(h * 60 + m)
+    return minutes[0], minutes[1]
+
+
+OUTPUT_QUALITIES = {"mp4": ("best", "1080p", "720p", "480p"), "mp3": ("192", "128", "256", "320"), "best": ("",)}
+OUTPUT_ALIASES = {"original": "best", "video": "mp4", "lyd": "mp3"}
+
+
+def parse_outputs(text: str) -> list[tuple[str, str]]:
+    """"mp4:1080p,mp3:320,original" → [("mp4", "1080p"), ("mp3", "320"), ("best", "")] for flerformat-modus.
+    Uten kvalitet brukes første verdi i OUTPUT_QUALITIES (ValueError ved feil format eller samme format to ganger)"""
+    outputs = []
+    for part in (text or "").split(","):
+        if not part.strip(): continue
+        mode, _, quality = part.strip().lower().partition(":")
+        mode = OUTPUT_ALIASES.get(mode, mode)
+        if mode not in OUTPUT_QUALITIES: raise ValueError(f"Ukjent format: {part.strip()} (bruk mp4, mp3 eller original)")
+        quality = quality.strip() or OUTPUT_QUALITIES[mode][0]
+        if quality not in OUTPUT_QUALITIES[mode]: raise ValueError(f"Ugyldig kvalitet for {mode}: {quality}")
+        if any(m == mode for m, _ in outputs): raise ValueError(f"{mode} er valgt mer enn én gang")
+        outputs.append((mode, quality))
+    if not outputs: raise ValueError("Ingen formater valgt")
+    return outputs
+
+
+def format_eta(secs: int | None) -> str:
+    if secs is None: return "–"
+    secs = max(0, int(secs))
+    h, m, s = secs // 3600, (secs % 3600) // 60, secs % 60
+    return f"{h:d}:{m:02d}:{s:02d}" if h else f"{m:d}:{s:02d}"
+
+
+def save_config(cfg: dict):
+    try:
+        CONFIG_DIR.mkdir(parents=True, exist_ok=True)
+        CONFIG_PATH.write_text(json.dumps(cfg, indent=2, ensure_ascii=False), encoding="utf-8")
+    except Exception as e:
+        print("Kunne ikke lagre config:", e)
@@ -0,0 +1,2286 @@
+"""Nedlastingsmotoren: yt-dlp, buffere, arkiv, cookies og Downloader-tråden"""
+import os
+import re
+import csv
+import json
+import time
+import sqlite3
+import functools
+import contextlib
+import collections
+import io
+import threading
+import queue
+import uuid
+from pathlib import Path
+from datetime import datetime
+from urllib.parse import urlparse, urlunparse
+
+from nedlastarn_config import (APP_NAME, CONFIG_DIR, INFO_CACHE_PATH, ARCHIVE_PATH, JOURNAL_PATH, LEGACY_ARCHIVE_NAME,
+                               DEFAULT_OUTPUT_TEMPLATE, BROWSER_CANDIDATES, bundled_extractors, parse_work_hours)
+
+# Avhengighet: pip install yt-dlp
+try:
+    from yt_dlp import YoutubeDL
+    from yt_dlp.utils import (ContentTooShortError, DownloadError, DownloadCancelled, EntryNotInPlaylist, PlaylistEntries,
+                              determine_protocol, make_archive_id, parse_http_range, prepend_extension, replace_extension,
+                              unsmuggle_url)
+    from yt_dlp.utils.networking import HTTPHeaderDict
+    from yt_dlp.networking import Request
+    from yt_dlp.networking.exceptions import HTTPError, TransportError
+    from yt_dlp.downloader import PROTOCOL_MAP
+    from yt_dlp.downloader.http import HttpFD
+    from yt_dlp.postprocessor import FFmpegPostProcessor, PostProcessor
+    from yt_dlp.extractor import gen_extractor_classes
+    from yt_dlp.cookies import YoutubeDLCookieJar, extract_cookies_from_browser
+except Exception as e:
+    raise SystemExit(
+        "Mangler 'yt_dlp'. Installer med: pip install yt-dlp\nFeil: " + str(e)
+    )
+
+
+# Bare disse extractorene finnes i en trimmet build; None = alle
+ALLOWED_EXTRACTORS = bundled_extractors()
+# Protokoller som lastes ned som fragmenter med concurrent_fragment_downloads
+FRAGMENT_PROTOCOLS = {"m3u8_native", "http_dash_segments", "http_dash_segments_generator", "ism", "f4m"}
+QUALITY_HEIGHTS = {"1080p": 1080, "720p": 720, "480p": 480}
+
+
+def normalize_url(url: str) -> str:
+    """Kanonisk form av en URL (små bokstaver i vertsnavn, sortert query, uten fragment)"""
+    p = urlparse(url.strip())
+    host = (p.hostname or "").lower()
+    if p.port and (p.scheme, p.port) not in (("http", 80), ("https", 443)):
+        host += f":{p.port}"
+    query = "&".join(sorted(q for q in p.query.split("&") if q))
+    return urlunparse((p.scheme.lower(), host, p.path or "/", "", query, ""))
+
+
+@functools.lru_cache(maxsize=4096)
+def match_extractor(url: str) -> tuple[str, str | None]:
+    """Finn extractor-nøkkel og (om mulig) video-ID for en URL uten nettverkskall"""
+    for ie in gen_extractor_classes():
+        if ALLOWED_EXTRACTORS is not None and ie.IE_NAME.lower() not in ALLOWED_EXTRACTORS:
+            continue
+        if ie.suitable(url):
+            return ie.ie_key(), ie.get_temp_id(url)
+    return "Generic", None
+
+
+def url_key(url: str) -> str:
+    """Nøkkel for duplikatsjekk uten nettverk: arkiv-ID når extractoren kan lese video-ID-en
+    fra URLen (youtu.be/X og youtube.com/watch?v=X&t=30 gir samme nøkkel), ellers normalisert URL"""
+    ie_key, video_id = match_extractor(url)
+    return make_archive_id(ie_key, video_id) if video_id is not None else normalize_url(url)
+
+
+PLAYLIST_EXTRACTOR = re.compile(r"(Tab|Playlist|Series|Season|Channel|Album|User|Show|Collection)$")
+
+
+def classify_url(url: str) -> tuple[str, bool]:
+    """(duplikatnøkkel, ser ut som spilleliste) uten nettverk, for URL-analysen i GUI-et"""
+    ie_key, video_id = match_extractor(url)
+    return url_key(url), "list=" in url or bool(PLAYLIST_EXTRACTOR.search(ie_key))
+
+
+def warm_up():
+    """Last alle extractor-klassene på forhånd, så første URL-oppslag ikke betaler for det"""
+    match_extractor("https://example.com/")
+
+
+def extract_unprocessed(ydl: YoutubeDL, url: str, ie_key: str | None = None) -> dict | None:
+    """extract_info uten å løse opp formater eller spillelisteelementer; rene videresendinger ("url") følges"""
+    info = ydl.extract_info(url, download=False, process=False, ie_key=ie_key)
+    while isinstance(info, dict) and info.get("_type") == "url":
+        info = ydl.extract_info(info["url"], download=False, process=False,
+                                ie_key=info.get("ie_key"), extra_info={"original_url": url})
+    return info
+
+
+def estimate_sizes(info: dict) -> dict[str, int]:
+    """Anslått størrelse i bytes per kvalitetsvalg ("best", "1080p" …) ut fra formatlisten, uten nedlasting"""
+    formats = info.get("formats") or [info]
+    duration = info.get("duration") or 0
+    def size(f): return f.get("filesize") or f.get("filesize_approx") or int((f.get("tbr") or 0) * 125 * duration)
+    audio = max((f for f in formats if f.get("vcodec") == "none"), key=lambda f: f.get("abr") or f.get("tbr") or 0, default=None)
+    out = {}
+    for quality, hmax in (("best", None), ("1080p", 1080), ("720p", 720), ("480p", 480)):
+        videos = [f for f in formats if f.get("vcodec") != "none" and f.get("height") and (hmax is None or f["height"] <= hmax)]
+        if not videos: continue
+        best = max(videos, key=lambda f: (f["height"], f.get("tbr") or 0))
+        total = size(best) + (size(audio) if audio and best.get("acodec") == "none" else 0)
+        if total: out[quality] = total
+    if not out and len(formats) == 1 and size(formats[0]): out["best"] = size(formats[0])
+    return out
+
+
+def summarize_info(info: dict | None) -> dict:
+    """Det GUI-et viser om en forhåndshentet URL: tittel, varighet, antall elementer og anslåtte størrelser"""
+    if not isinstance(info, dict): return {"error": "Fant ingen video"}
+    if info.get("_type") in ("playlist", "multi_video"):
+        entries = info.get("entries")
+        return {"title": info.get("title") or info.get("id"), "playlist": True,
+                "count": info.get("playlist_count") or (len(entries) if isinstance(entries, list) else None)}
+    return {"title": info.get("title") or info.get("id"), "duration": info.get("duration"), "sizes": estimate_sizes(info)}
+
+
+def _strip_private(obj):
+    """Fjern yt-dlp sine interne "__"-nøkler før info-dicten serialiseres"""
+    if isinstance(obj, dict):
+        return {k: _strip_private(v) for k, v in obj.items() if not str(k).startswith("__")}
+    if isinstance(obj, (list, tuple)):
+        return [_strip_private(v) for v in obj]
+    return obj
+
+
+class InfoCache:
+    """Diskbuffer for info-dicter fra extractorene, lagret som SQLite i CONFIG_DIR.
+
+    Nøkkelen er extractor + normalisert URL. Oppføringer eldre enn TTL forkastes
+    (format-URLer utløper), og de minst nylig brukte kastes ut når bufferen
+    overstiger størrelsesgrensen. Feil i bufferen skal aldri stoppe en nedlasting.
+    """
+    def __init__(self, path: Path = INFO_CACHE_PATH, ttl_s: float = 3600, max_bytes: int = 50 * 1024 * 1024):
+        self.path = path
+        self.ttl_s = ttl_s
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._db: sqlite3.Connection | None = None
+
+
+    @classmethod
+    def from_config(cls, cfg: dict) -> "InfoCache | None":
+        if not cfg.get("info_cache_enabled", True): return None
+        return cls(ttl_s=float(cfg.get("info_cache_ttl_minutes", 60)) * 60,
+                   max_bytes=int(cfg.get("info_cache_max_mb", 50)) * 1024 * 1024)
+
+
+    def _conn(self) -> sqlite3.Connection:
+        if self._db is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(self.path), timeout=10, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, extractor TEXT, "
+                             "created REAL, accessed REAL, size INTEGER, data TEXT)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS info_accessed ON info (accessed)")
+        return self._db
+
+
+    @staticmethod
+    def key_for(url: str) -> tuple[str, str]:
+        ie_key = match_extractor(url)[0]
+        return f"{ie_key}|{normalize_url(url)}", ie_key
+
+
+    def get(self, url: str) -> dict | None:
+        key, _ = self.key_for(url)
+        now = time.time()
+        with self._lock:
+            try:
+                db = self._conn()
+                row = db.execute("SELECT created, data FROM info WHERE key = ?", (key,)).fetchone()
+                if row is None: return None
+                if now - row[0] > self.ttl_s:
+                    db.execute("DELETE FROM info WHERE key = ?", (key,)); db.commit()
+                    return None
+                db.execute("UPDATE info SET accessed = ? WHERE key = ?", (now, key)); db.commit()
+                return json.loads(row[1])
+            except (sqlite3.Error, ValueError) as e:
+                print("Metadata-buffer utilgjengelig:", e)
+                return None
+
+
+    def put(self, url: str, info: dict) -> bool:
+        """Lagre en uprosessert info-dict. Spillelister med late oppføringer hoppes over."""
+        if info.get("_type", "video") not in ("video", "playlist", "multi_video"): return False
+        if "entries" in info and not isinstance(info["entries"], list): return False
+        try:
+            data = json.dumps(_strip_private(info), ensure_ascii=False)
+        except (TypeError, ValueError):
+            return False  # Inneholder objekter som ikke kan serialiseres
+        key, ie_key = self.key_for(url)
+        now = time.time()
+        with self._lock:
+            try:
+                db = self._conn()
+                db.execute("INSERT OR REPLACE INTO info VALUES (?, ?, ?, ?, ?, ?)",
+                           (key, ie_key, now, now, len(data), data))
+                db.execute("DELETE FROM info WHERE created < ?", (now - self.ttl_s,))
+                self._evict(db)
+                db.commit()
+                return True
+            except sqlite3.Error as e:
+                print("Kunne ikke skrive til metadata-buffer:", e)
+                return False
+
+
+    def _evict(self, db: sqlite3.Connection):
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM info").fetchone()[0]
+        if total <= self.max_bytes: return
+        for key, size in db.execute("SELECT key, size FROM info ORDER BY accessed").fetchall():
+            db.execute("DELETE FROM info WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes: break
+
+
+    def invalidate(self, url: str):
+        key, _ = self.key_for(url)
+        with self._lock:
+            try:
+                db = self._conn()
+                db.execute("DELETE FROM info WHERE key = ?", (key,)); db.commit()
+            except sqlite3.Error: pass
+
+
+    def clear(self):
+        with self._lock:
+            try:
+                db = self._conn()
+                db.execute("DELETE FROM info"); db.commit()
+                db.execute("VACUUM")
+            except sqlite3.Error as e:
+                print("Kunne ikke tømme metadata-buffer:", e)
+
+
+class DownloadArchive:
+    """Nedlastingsarkiv i SQLite (CONFIG_DIR), delt av alle mapper og batcher.
+
+    Hver rad er én nedlastet video per lagringsmappe, med tidspunkt og filsti,
+    og er indeksert på extractor + ID. Gamle `downloaded.txt`-filer importeres
+    automatisk første gang en mappe brukes (og på nytt hvis filen endres).
+    """
+    def __init__(self, path: Path = ARCHIVE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db: sqlite3.Connection | None = None
+
+
+    def _conn(self) -> sqlite3.Connection:
+        if self._db is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(self.path), timeout=10, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS archive (folder TEXT, extractor TEXT, video_id TEXT, "
+                             "recorded REAL, path TEXT, PRIMARY KEY (folder, extractor, video_id))")
+            self._db.execute("CREATE INDEX IF NOT EXISTS archive_ie_id ON archive (extractor, video_id)")
+            self._db.execute("CREATE TABLE IF NOT EXISTS migrated (folder TEXT PRIMARY KEY, mtime REAL)")
+        return self._db
+
+
+    @staticmethod
+    def folder_key(folder: Path) -> str:
+        return os.path.normcase(str(Path(folder).resolve()))
+
+
+    @staticmethod
+    def split_id(archive_id: str) -> tuple[str, str]:
+        extractor, _, video_id = archive_id.strip().partition(" ")
+        return extractor.lower(), video_id
+
+
+    def _migrate_legacy(self, db: sqlite3.Connection, folder: Path, key: str):
+        legacy = Path(folder) / LEGACY_ARCHIVE_NAME
+        try:
+            mtime = legacy.stat().st_mtime
+        except OSError:
+            return
+        row = db.execute("SELECT mtime FROM migrated WHERE folder = ?", (key,)).fetchone()
+        if row and row[0] == mtime: return
+        try:
+            lines = legacy.read_text(encoding="utf-8").splitlines()
+        except (OSError, UnicodeDecodeError) as e:
+            print(f"Kunne ikke lese {legacy}:", e)
+            return
+        rows = [(key, *self.split_id(line), mtime, None) for line in lines if " " in line.strip()]
+        db.executemany("INSERT OR IGNORE INTO archive VALUES (?, ?, ?, ?, ?)", rows)
+        db.execute("INSERT OR REPLACE INTO migrated VALUES (?, ?)", (key, mtime))
+        db.commit()
+
+
+    def open_folder(self, folder: Path) -> "ArchiveView":
+        """Last alle ID-er for en mappe én gang; brukes av hele batchen"""
+        key = self.folder_key(folder)
+        with self._lock:
+            db = self._conn()
+            self._migrate_legacy(db, folder, key)
+            ids = {f"{ie} {vid}" for ie, vid in db.execute(
+                "SELECT extractor, video_id FROM archive WHERE folder = ?", (key,))}
+        return ArchiveView(self, key, ids)
+
+
+    def record(self, folder_key: str, archive_id: str, path: str | None = None):
+        with self._lock:
+            try:
+                db = self._conn()
+                db.execute("INSERT INTO archive VALUES (?, ?, ?, ?, ?) ON CONFLICT (folder, extractor, video_id) "
+                           "DO UPDATE SET recorded = excluded.recorded, path = COALESCE(excluded.path, archive.path)",
+                           (folder_key, *self.split_id(archive_id), time.time(), path))
+                db.commit()
+            except sqlite3.Error as e:
+                print("Kunne ikke skrive til nedlastingsarkivet:", e)
+
+
+class ArchiveView:
+    """Arkivet for én mappe, i formen yt-dlp forventer av `download_archive` (in/add)"""
+    def __init__(self, archive: DownloadArchive, folder_key: str, ids: set[str]):
+        self.archive = archive
+        self.folder_key = folder_key
+        self._ids = ids
+        self._lock = threading.Lock()
+
+
+    def __contains__(self, archive_id: str) -> bool:
+        return archive_id in self._ids
+
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+
+    def add(self, archive_id: str, path: str | None = None):
+        with self._lock:
+            self._ids.add(archive_id)
+        self.archive.record(self.folder_key, archive_id, path)
+
+
+    def contains_url(self, url: str) -> bool:
+        """Rask sjekk uten ekstraksjon, for extractorer som kan lese ID-en fra URLen"""
+        ie_key, video_id = match_extractor(url)
+        return video_id is not None and make_archive_id(ie_key, video_id) in self
+
+
+    def record_info(self, info: dict):
+        """Lagre en ferdig behandlet video med endelig filsti"""
+        if info.get("id") and info.get("extractor_key"):
+            self.add(make_archive_id(info["extractor_key"], info["id"]), info.get("filepath"))
+
+
+class BatchJournal:
+    """Journal over batcher i CONFIG_DIR, så en krasjet eller avbrutt batch kan fortsettes.
+
+    Hver URL har en rad med plass i køen, prioritet, løst format, filnavn, bytes lastet
+    ned og fase (queued/paused → downloading → downloaded → postprocessing →
+    done/skipped/failed/cancelled), så journalen er også den lagrede nedlastingskøen.
+    Selve overføringen fortsetter fra .part-filene (HTTP Range) og .ytdl-filene for
+    fragmenter; journalen husker hvilke URLer og innstillinger som gjenstår.
+    Fremdrift skrives høyst hvert PROGRESS_INTERVAL sekund per URL, og batchen
+    slettes når alle URLene er ferdige eller hoppet over.
+    """
+    PROGRESS_INTERVAL = 2.0
+    MAX_AGE_S = 30 * 24 * 3600
+    FINISHED = ("done", "skipped")
+    _NOT_FINISHED = f"stage NOT IN ({', '.join('?' * len(FINISHED))})"
+
+    def __init__(self, path: Path = JOURNAL_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db: sqlite3.Connection | None = None
+        self._last_progress: dict[tuple[str, str], float] = {}
+
+
+    def _conn(self) -> sqlite3.Connection:
+        if self._db is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(self.path), timeout=10, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS batches (id TEXT PRIMARY KEY, created REAL, settings TEXT)")
+            self._db.execute("CREATE TABLE IF NOT EXISTS entries (batch TEXT, url TEXT, pos INTEGER, stage TEXT, "
+                             "format_id TEXT, filename TEXT, bytes_done INTEGER, total_bytes INTEGER, updated REAL, "
+                             "priority INTEGER DEFAULT 0, PRIMARY KEY (batch, url))")
+            try:
+                self._db.execute("ALTER TABLE entries ADD COLUMN priority INTEGER DEFAULT 0")  # Journaler uten kø-felt
+            except sqlite3.OperationalError:
+                pass
+        return self._db
+
+
+    def _write(self, sql: str, params: tuple = ()):
+        with self._lock:
+            try:
+                db = self._conn()
+                db.execute(sql, params)
+                db.commit()
+            except sqlite3.Error as e:
+                print("Kunne ikke skrive til batch-journalen:", e)
+
+
+    def begin(self, batch_id: str, settings: dict, urls: list[str]) -> dict[str, dict]:
+        """Registrer batchen (eller fortsett en gammel); returnerer tidligere rader per URL"""
+        now = time.time()
+        with self._lock:
+            db = self._conn()
+            old = [row[0] for row in db.execute("SELECT id FROM batches WHERE created < ?", (now - self.MAX_AGE_S,))]
+            db.executemany("DELETE FROM entries WHERE batch = ?", [(b,) for b in old])
+            db.executemany("DELETE FROM batches WHERE id = ?", [(b,) for b in old])
+            db.execute("INSERT OR IGNORE INTO batches VALUES (?, ?, ?)", (batch_id, now, json.dumps(settings)))
+            rows = {url: {"stage": stage, "format_id": fmt, "filename": fn, "bytes_done": done, "priority": prio or 0}
+                    for url, stage, fmt, fn, done, prio in db.execute(
+                        "SELECT url, stage, format_id, filename, bytes_done, priority FROM entries WHERE batch = ?", (batch_id,))}
+            db.commit()
+        self.add(batch_id, urls)
+        return rows
+
+
+    def add(self, batch_id: str, urls: list[str], start: int = 0):
+        """Legg URLer til i køen (URLer som allerede finnes i batchen beholder raden sin)"""
+        now = time.time()
+        with self._lock:
+            try:
+                db = self._conn()
+                db.executemany("INSERT OR IGNORE INTO entries (batch, url, pos, stage, bytes_done, updated) "
+                               "VALUES (?, ?, ?, 'queued', 0, ?)", [(batch_id, url, start + i, now) for i, url in enumerate(urls)])
+                db.commit()
+            except sqlite3.Error as e:
+                print("Kunne ikke skrive til batch-journalen:", e)
+
+
+    def reorder(self, batch_id: str, urls: list[str]):
+        """Lagre ny rekkefølge for køen"""
+        with self._lock:
+            try:
+                db = self._conn()
+                db.executemany("UPDATE entries SET pos = ? WHERE batch = ? AND url = ?",
+                               [(pos, batch_id, url) for pos, url in enumerate(urls)])
+                db.commit()
+            except sqlite3.Error as e:
+                print("Kunne ikke skrive til batch-journalen:", e)
+
+
+    def update(self, batch_id: str, url: str, stage: str | None = None, format_id: str | None = None,
+               filename: str | None = None, priority: int | None = None):
+        self._write("UPDATE entries SET stage = COALESCE(?, stage), format_id = COALESCE(?, format_id), "
+                    "filename = COALESCE(?, filename), priority = COALESCE(?, priority), updated = ? "
+                    "WHERE batch = ? AND url = ?", (stage, format_id, filename, priority, time.time(), batch_id, url))
+
+
+    def progress(self, batch_id: str, url: str, done: int, total: int | None):
+        now = time.monotonic()
+        if now - self._last_progress.get((batch_id, url), 0.0) < self.PROGRESS_INTERVAL: return
+        self._last_progress[(batch_id, url)] = now
+        self._write("UPDATE entries SET bytes_done = ?, total_bytes = ?, updated = ? WHERE batch = ? AND url = ?",
+                    (int(done), int(total) if total else None, time.time(), batch_id, url))
+
+
+    def finish(self, batch_id: str) -> bool:
+        """Slett batchen hvis alle URLene er ferdige; returnerer True hvis noe gjenstår"""
+        with self._lock:
+            try:
+                db = self._conn()
+                left = db.execute(f"SELECT COUNT(*) FROM entries WHERE batch = ? AND {self._NOT_FINISHED}",
+                                  (batch_id, *self.FINISHED)).fetchone()[0]
+            except sqlite3.Error as e:
+                print("Kunne ikke lese batch-journalen:", e)
+                return True
+        if not left: self.discard(batch_id)
+        return bool(left)
+
+
+    def pending(self) -> dict | None:
+        """Nyeste batch med URLer som gjenstår: {"id", "settings", "urls", "bytes_done"}"""
+        with self._lock:
+            try:
+                db = self._conn()
+                for batch_id, settings in db.execute("SELECT id, settings FROM batches ORDER BY created DESC").fetchall():
+                    rows = db.execute(f"SELECT url, bytes_done FROM entries WHERE batch = ? AND {self._NOT_FINISHED} "
+                                      "ORDER BY pos", (batch_id, *self.FINISHED)).fetchall()
+                    if rows:
+                        return {"id": batch_id, "settings": json.loads(settings), "urls": [url for url, _ in rows],
+                                "bytes_done": sum(done or 0 for _, done in rows)}
+            except sqlite3.Error as e:
+                print("Kunne ikke lese batch-journalen:", e)
+        return None
+
+
+    def discard(self, batch_id: str):
+        self._write("DELETE FROM entries WHERE batch = ?", (batch_id,))
+        self._write("DELETE FROM batches WHERE id = ?", (batch_id,))
+
+
+class DeferredArchive:
+    """Arkivet slik nedlastingstrådene ser det: oppslag går rett til arkivet,
+    men registreringen venter til etterbehandlingen er ferdig (se PostProcessPool)"""
+    def __init__(self, view: ArchiveView):
+        self.view = view
+
+
+    def __contains__(self, archive_id: str) -> bool:
+        return archive_id in self.view
+
+
+    def add(self, archive_id: str):
+        pass
+
+
+def _dpapi(data: bytes, protect: bool) -> bytes | None:
+    """Krypter/dekrypter med Windows DPAPI (knyttet til brukerkontoen). None utenfor Windows."""
+    if os.name != "nt": return None
+    import ctypes
+    import ctypes.wintypes
+
+    class DATA_BLOB(ctypes.Structure):
+        _fields_ = [("cbData", ctypes.wintypes.DWORD), ("pbData", ctypes.POINTER(ctypes.c_char))]
+
+    buffer = ctypes.create_string_buffer(data, len(data))
+    blob_in, blob_out = DATA_BLOB(len(data), buffer), DATA_BLOB()
+    func = ctypes.windll.crypt32.CryptProtectData if protect else ctypes.windll.crypt32.CryptUnprotectData
+    if not func(ctypes.byref(blob_in), None, None, None, None, 0, ctypes.byref(blob_out)):
+        return None
+    try:
+        return ctypes.string_at(blob_out.pbData, blob_out.cbData)
+    finally:
+        ctypes.windll.kernel32.LocalFree(blob_out.pbData)
+
+
+class CookieStore:
+    """Cookies fra nettleseren, hentet og dekryptert én gang og delt av alle jobber.
+
+    Jaren holdes i minnet til den er eldre enn `max_age_s`. Med `persist` lagres
+    den også kryptert (DPAPI, kun Windows) i CONFIG_DIR, så neste oppstart slipper
+    å kopiere og dekryptere nettleserens cookie-database på nytt.
+    """
+    def __init__(self, max_age_s: float = 3600, persist: bool = True):
+        self.max_age_s = max_age_s
+        self.persist = persist
+        self._lock = threading.Lock()
+        self._jars: dict[str, tuple[float, YoutubeDLCookieJar]] = {}
+
+
+    @classmethod
+    def from_config(cls, cfg: dict) -> "CookieStore":
+        minutes = float(cfg.get("cookie_cache_minutes", 60))
+        return cls(max_age_s=minutes * 60, persist=minutes > 0)
+
+
+    @staticmethod
+    def cache_path(browser: str) -> Path:
+        return CONFIG_DIR / f"cookies_{browser}.bin"
+
+
+    def get(self, browser: str) -> YoutubeDLCookieJar:
+        with self._lock:
+            hit = self._jars.get(browser)
+            if hit is None or time.time() - hit[0] >= self.max_age_s:
+                hit = self._load_cache(browser)
+            if hit is None:
+                hit = (time.time(), extract_cookies_from_browser(browser))
+                self._save_cache(browser, *hit)
+            self._jars[browser] = hit
+            return hit[1]
+
+
+    def refresh(self, browser: str | None = None):
+        """Glem bufrede cookies, så de leses fra nettleseren ved neste batch"""
+        with self._lock:
+            for name in ([browser] if browser else [*BROWSER_CANDIDATES, *self._jars]):
+                self._jars.pop(name, None)
+                try: self.cache_path(name).unlink()
+                except OSError: pass
+
+
+    def _load_cache(self, browser: str) -> tuple[float, YoutubeDLCookieJar] | None:
+        if not self.persist: return None
+        try:
+            raw = _dpapi(self.cache_path(browser).read_bytes(), protect=False)
+        except OSError:
+            return None
+        if raw is None: return None
+        stamp, _, text = raw.decode("utf-8").partition("\n")
+        try:
+            created = float(stamp)
+        except ValueError:
+            return None
+        if time.time() - created >= self.max_age_s: return None
+        jar = YoutubeDLCookieJar()
+        jar.load(io.StringIO(text))
+        return created, jar
+
+
+    def _save_cache(self, browser: str, created: float, jar: YoutubeDLCookieJar):
+        if not self.persist: return
+        buf = io.StringIO()
+        jar.save(buf)
+        data = _dpapi(f"{created}\n{buf.getvalue()}".encode("utf-8"), protect=True)
+        if data is None: return  # Ingen sikker lagring tilgjengelig – bare i minnet
+        try:
+            CONFIG_DIR.mkdir(parents=True, exist_ok=True)
+            self.cache_path(browser).write_bytes(data)
+        except OSError as e:
+            print("Kunne ikke lagre cookie-buffer:", e)
+
+
+class Prefetcher:
+    """Løser opp innlimte URLer i bakgrunnen mens brukeren velger format og mappe.
+
+    En liten trådpool kjører samme uprosesserte ekstraksjon som Downloader
+    (extract_unprocessed), og Downloader tar info-dicten i bruk med `take()` i stedet
+    for å ekstrahere på nytt. Et sammendrag per URL (summarize_info) legges på
+    `results` for GUI-et. Bare de siste innlimte URLene hentes (`submit` erstatter
+    ønskelisten), høyst MAX_URLS om gangen, og resultater eldre enn TTL brukes ikke.
+    """
+    MAX_URLS = 100
+
+    def __init__(self, cookie_store: "CookieStore | None" = None, workers: int = 2, ttl_s: float = 900):
+        self.cookie_store = cookie_store
+        self.workers = workers
+        self.ttl_s = ttl_s
+        self.results: queue.Queue[tuple[str, dict]] = queue.Queue()
+        self._q: queue.Queue[tuple[str, str]] = queue.Queue()
+        self._lock = threading.Lock()
+        self._infos: dict[tuple[str, str], tuple[float, dict]] = {}
+        self._known: set[tuple[str, str]] = set()  # I køen, under arbeid eller ferdig
+        self._wanted: set[str] = set()
+        self._threads: list[threading.Thread] = []
+
+
+    def submit(self, urls: list[str], browser: str = "none"):
+        """Hent URLene som ikke er hentet før; URLer som ikke lenger står i listen droppes fra køen"""
+        browser = (browser or "none").lower()
+        urls = list(dict.fromkeys(urls))[:self.MAX_URLS]
+        with self._lock:
+            self._wanted = set(urls)
+            for key in [k for k in self._infos if k[0] not in self._wanted]:
+                del self._infos[key]
+                self._known.discard(key)
+            new = [url for url in urls if (url, browser) not in self._known]
+            self._known.update((url, browser) for url in new)
+            while new and len(self._threads) < self.workers:
+                self._threads.append(threading.Thread(target=self._run, daemon=True, name=f"{APP_NAME}-prefetch-{len(self._threads)}"))
+                self._threads[-1].start()
+        for url in new: self._q.put((url, browser))
+
+
+    def take(self, url: str, browser: str = "none") -> dict | None:
+        """Info-dicten for URLen hvis den er hentet og fersk (kan bare tas én gang)"""
+        key = (url, (browser or "none").lower())
+        with self._lock:
+            fetched, info = self._infos.pop(key, (0.0, None))
+            self._known.discard(key)
+        return info if info is not None and time.time() - fetched < self.ttl_s else None
+
+
+    def _run(self):
+        ydls: dict[str, YoutubeDL] = {}  # Én instans per nettleser i hver tråd
+        while True:
+            url, browser = self._q.get()
+            with self._lock:
+                wanted = url in self._wanted
+                if not wanted: self._known.discard((url, browser))
+            if not wanted: continue
+            try:
+                if browser not in ydls:
+                    ydls[browser] = YoutubeDL({"quiet": True, "no_warnings": True, "socket_timeout": 20,
+                                               "extractor_args": {"youtube": {"skip": ["translated_subs"]}},
+                                               **({"allowed_extractors": [re.escape(n) for n in sorted(ALLOWED_EXTRACTORS)]}
+                                                  if ALLOWED_EXTRACTORS is not None else {})})
+                    if browser != "none" and self.cookie_store is not None:
+                        with contextlib.suppress(Exception): ydls[browser].cookiejar = self.cookie_store.get(browser)
+                info = extract_unprocessed(ydls[browser], url)
+                summary = summarize_info(info)
+            except Exception as e:
+                text = re.sub(r"^ERROR:\s*", "", str(e).strip())
+                info, summary = None, {"error": text.splitlines()[0] if text else type(e).__name__}
+            with self._lock:
+                if url not in self._wanted: self._known.discard((url, browser))  # Fjernet mens den ble hentet
+                elif isinstance(info, dict): self._infos[(url, browser)] = (time.time(), info)
+            self.results.put((url, summary))
+
+
+class ProgressChannel:
+    """Siste fremdriftsstatus per jobb, delt mellom nedlastingstrådene og GUI-et.
+
+    Hookene fra yt-dlp overskriver bare tilstanden til jobben (ingen kømelding
+    per fragment), og leseren henter endrede jobber med `drain()` høyst `hz`
+    ganger i sekundet. Hastighet og ETA regnes ut her fra antall bytes over tid
+    med eksponentiell glatting, i stedet for yt-dlp sine øyeblikksverdier.
+    """
+    SMOOTHING = 0.3
+    MIN_SAMPLE_S = 0.2
+
+    def __init__(self, hz: float = 5.0):
+        self.min_interval = 1.0 / max(0.5, float(hz))
+        self._lock = threading.Lock()
+        self._states: dict[int, dict] = {}
+        self._dirty: set[int] = set()
+        self._last_drain = 0.0
+
+
+    def update(self, job_id: int, pct: float | None, downloaded: int | None = None, total: int | None = None,
+               filename: str | None = None, item_info: dict | None = None):
+        now = time.monotonic()
+        with self._lock:
+            st = self._states.setdefault(job_id, {"bytes": None, "t": now, "speed": None, "eta": None})
+            if downloaded is not None:
+                if st["bytes"] is None or downloaded < st["bytes"]:
+                    st["bytes"], st["t"] = downloaded, now  # Første måling eller ny strøm (f.eks. lyd etter video)
+                elif now - st["t"] >= self.MIN_SAMPLE_S:
+                    sample = (downloaded - st["bytes"]) / (now - st["t"])
+                    st["speed"] = sample if st["speed"] is None else st["speed"] + self.SMOOTHING * (sample - st["speed"])
+                    st["bytes"], st["t"] = downloaded, now
+                speed = st["speed"]
+                st["eta"] = int((total - downloaded) / speed) if total and speed else None
+            else:
+                st["bytes"] = st["speed"] = st["eta"] = None
+            st.update(pct=pct, filename=filename, item_info=item_info)
+            self._dirty.add(job_id)
+
+
+    def finish(self, job_id: int, filename: str | None = None):
+        self.update(job_id, 100.0, filename=filename, item_info=self._states.get(job_id, {}).get("item_info"))
+
+
+    def drain(self, force: bool = False) -> dict[int, tuple]:
+        """Endrede jobber siden sist som {job_id: (pct, fart, eta, filnavn, element)}"""
+        now = time.monotonic()
+        with self._lock:
+            if not self._dirty or (not force and now - self._last_drain < self.min_interval):
+                return {}
+            self._last_drain = now
+            out = {}
+            for job_id in self._dirty:
+                st = self._states[job_id]
+                out[job_id] = (st["pct"], st["speed"], st["eta"], st["filename"], st["item_info"])
+            self._dirty.clear()
+            return out
+
+
+class StageTimer:
+    """Tidsbruk per fase og URL, til sammendraget etter batchen og ytelsesrapporten.
+
+    Fasene måles der de skjer: rundt extract-kallene, i progress_hook (nettverkstid
+    og bytes fra yt-dlp sin "finished"-status), i postprosessor-hookene og i
+    etterbehandlingskøen. Hver måling er en monotonic() og en dict-oppdatering
+    under lås, så målingen kan alltid være på. job_id None er batchen selv (cookies).
+    """
+    LABELS = {"cookies": "Cookies", "extract": "Ekstraksjon", "format": "Formatvalg", "playlist": "Spilleliste",
+              "download": "Nettverk", "throttle": "  herav fartsgrense", "pp_wait": "Kø til etterbehandling",
+              "postprocess": "Etterbehandling", "pp:Merger": "  FFmpeg-fletting", "pp:SmartMp4": "  MP4 (remux/omkoding)",
+              "pp:FFmpegVideoRemuxer": "  Remux", "pp:FFmpegExtractAudio": "  MP3-konvertering",
+              "pp:EmbedThumbnail": "  Miniatyrbilde", "pp:FFmpegMetadata": "  Metadata", "pp:MoveFiles": "  Flytting"}
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._jobs: dict[int | None, dict] = {}
+        self._open: dict[tuple, float] = {}
+        self.started = time.time()
+
+
+    def add(self, job_id: int | None, stage: str, seconds: float, nbytes: int = 0):
+        with self._lock:
+            row = self._jobs.setdefault(job_id, {"stages": {}, "bytes": 0})
+            row["stages"][stage] = row["stages"].get(stage, 0.0) + seconds
+            row["bytes"] += nbytes
+
+
+    @contextlib.contextmanager
+    def stage(self, job_id: int | None, stage: str):
+        t0 = time.monotonic()
+        try:
+            yield
+        finally:
+            self.add(job_id, stage, time.monotonic() - t0)
+
+
+    def start(self, job_id: int | None, stage: str):
+        with self._lock:
+            self._open[(job_id, stage)] = time.monotonic()
+
+
+    def stop(self, job_id: int | None, stage: str):
+        with self._lock:
+            t0 = self._open.pop((job_id, stage), None)
+        if t0 is not None: self.add(job_id, stage, time.monotonic() - t0)
+
+
+    def totals(self) -> dict[str, dict]:
+        """{fase: {"seconds", "urls", "mean_s"}} over hele batchen, i visningsrekkefølge"""
+        out: dict[str, dict] = {}
+        with self._lock:
+            for row in self._jobs.values():
+                for stage, seconds in row["stages"].items():
+                    t = out.setdefault(stage, {"seconds": 0.0, "urls": 0})
+                    t["seconds"] += seconds
+                    t["urls"] += 1
+        order = list(self.LABELS)
+        for t in out.values(): t["mean_s"] = t["seconds"] / t["urls"]
+        return dict(sorted(out.items(), key=lambda kv: order.index(kv[0]) if kv[0] in order else len(order)))
+
+
+    def rows(self, jobs: list["DownloadJob"]) -> list[dict]:
+        """Én rad per jobb med bytes, nettverksfart og sekunder per fase"""
+        with self._lock:
+            rows = []
+            for job in jobs:
+                row = self._jobs.get(job.id, {"stages": {}, "bytes": 0})
+                net = row["stages"].get("download")
+                rows.append({"job": job.id, "url": job.url, "state": job.state, "bytes": row["bytes"],
+                             "mb_s": round(row["bytes"] / net / 1024 / 1024, 2) if net else None,
+                             **{stage: round(sec, 3) for stage, sec in row["stages"].items()}})
+            return rows
+
+
+    def summary(self, wall_s: float) -> str:
+        """Tabell til loggen: totalt, snitt per URL og andel av målt tid per fase"""
+        totals = self.totals()
+        measured = sum(t["seconds"] for stage, t in totals.items() if stage in ("cookies", "extract", "format", "playlist", "download", "pp_wait", "postprocess"))
+        lines = [f"📊 Tidsbruk per fase ({wall_s:.1f} s totalt):", f"  {'Fase':<24}{'Totalt':>10}{'Snitt/URL':>11}{'Andel':>7}"]
+        for stage, t in totals.items():
+            share = f"{t['seconds'] / measured * 100:.0f} %" if measured and not self.LABELS.get(stage, "").startswith(" ") else ""
+            lines.append(f"  {self.LABELS.get(stage, stage):<24}{t['seconds']:>8.1f} s{t['mean_s']:>9.2f} s{share:>7}")
+        with self._lock: nbytes = sum(row["bytes"] for row in self._jobs.values())
+        net = totals.get("download", {}).get("seconds")
+        if nbytes and net:
+            lines.append(f"  {nbytes / 1024 / 1024:.1f} MB lastet ned, {nbytes / 1024 / 1024 / net:.2f} MB/s per nedlasting i snitt")
+        return "\n".join(lines)
+
+
+    def write(self, path: Path, jobs: list["DownloadJob"], wall_s: float, batch_id: str):
+        """Lagre rapporten som CSV (én rad per URL) eller JSON (også totaler), etter filendelsen"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        rows = self.rows(jobs)
+        if path.suffix.lower() == ".csv":
+            stages = list(dict.fromkeys(k for row in rows for k in row if k not in ("job", "url", "state", "bytes", "mb_s")))
+            with path.open("w", newline="", encoding="utf-8") as f:
+                writer = csv.DictWriter(f, fieldnames=["job", "url", "state", "bytes", "mb_s", *stages])
+                writer.writeheader()
+                writer.writerows(rows)
+            return
+        report = {"batch": batch_id, "started": datetime.fromtimestamp(self.started).isoformat(timespec="seconds"),
+                  "wall_s": round(wall_s, 3), "batch_stages": (self._jobs.get(None) or {}).get("stages", {}),
+                  "totals": {k: {key: round(v, 3) for key, v in t.items()} for k, t in self.totals().items()}, "jobs": rows}
+        path.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+
+
+class FragmentTuner:
+    """Velger antall samtidige fragmenter (HLS/DASH) per nettsted ut fra målt gjennomstrømning.
+
+    yt-dlp låser fragmentpoolen når en nedlasting starter, så justeringen skjer mellom
+    nedlastinger (hvert spillelisteelement, hver strøm og hver URL). Etter hver fragmentert
+    nedlasting sammenlignes farten med de andre verdiene som er prøvd for nettstedet:
+    er den beste, prøves ett steg videre i samme retning; ellers går vi tilbake til beste
+    verdi og prøver den andre veien. Når begge naboene er målt dårligere, blir verdien
+    stående. Beste verdi per nettsted lagres i config og er startpunktet neste gang.
+    Med `fixed` > 0 brukes den verdien overalt og ingenting måles.
+    """
+    DEFAULT_N = 5
+    SMOOTHING = 0.5
+    MIN_GAIN = 1.05  # En høyere verdi må være minst 5 % raskere for å telle som bedre
+    MIN_SAMPLE_S = 1.0
+    MIN_SAMPLE_BYTES = 1024 * 1024
+
+    def __init__(self, min_n: int = 2, max_n: int = 16, fixed: int = 0, learned: dict[str, int] | None = None):
+        self.min_n, self.max_n = sorted((max(1, int(min_n)), max(1, int(max_n))))
+        self.fixed = max(0, int(fixed or 0))
+        self._lock = threading.Lock()
+        self._hosts: dict[str, dict] = {}
+        self._learned = {host: int(n) for host, n in (learned or {}).items()}
+
+
+    @classmethod
+    def from_config(cls, cfg: dict) -> "FragmentTuner":
+        return cls(min_n=cfg.get("fragment_min", 2), max_n=cfg.get("fragment_max", 16),
+                   fixed=cfg.get("fragment_concurrency", 0), learned=cfg.get("fragment_hosts"))
+
+
+    def _clamp(self, n: int) -> int:
+        return min(self.max_n, max(self.min_n, int(n)))
+
+
+    def _host(self, host: str) -> dict:
+        st = self._hosts.get(host)
+        if st is None:
+            st = self._hosts[host] = {"next": self._clamp(self._learned.get(host, self.DEFAULT_N)), "dir": 1, "rates": {}}
+        return st
+
+
+    def value(self, host: str) -> int:
+        """Antall samtidige fragmenter for neste nedlasting fra nettstedet"""
+        if self.fixed: return self.fixed
+        with self._lock:
+            return self._host(host)["next"]
+
+
+    def record(self, host: str, n: int, nbytes: int, seconds: float) -> int | None:
+        """Registrer en ferdig nedlasting med n fragmenter; returnerer ny verdi hvis den endres"""
+        if self.fixed or not n or seconds < self.MIN_SAMPLE_S or nbytes < self.MIN_SAMPLE_BYTES:
+            return None
+        rate = nbytes / seconds
+        with self._lock:
+            st = self._host(host)
+            rates = st["rates"]
+            rates[n] = rate if n not in rates else rates[n] + self.SMOOTHING * (rate - rates[n])
+            top = max(rates.values())
+            best = min(k for k, r in rates.items() if r * self.MIN_GAIN >= top)  # Færrest tilkoblinger ved uavgjort
+            self._learned[host] = best
+            if n != best:
+                st["dir"] = 1 if best > n else -1
+                nxt = best
+            else:
+                nxt = n
+                for direction in (st["dir"], -st["dir"]):
+                    step = max(1, round(n / 4))
+                    cand = self._clamp(n + direction * step)
+                    if cand != n and cand not in rates:
+                        st["dir"], nxt = direction, cand
+                        break
+            changed = nxt != st["next"]
+            st["next"] = nxt
+            return nxt if changed else None
+
+
+    def learned(self) -> dict[str, int]:
+        """Beste kjente verdi per nettsted, for lagring i config"""
+        with self._lock:
+            return dict(self._learned)
+
+
+def mbps_to_bytes(mbps) -> float:
+    return max(0.0, float(mbps or 0)) * 1_000_000 / 8
+
+
+class RateLimiter:
+    """Felles fartsgrense for alle samtidige nedlastinger (token bucket), med valgfri arbeidstid.
+
+    Fremdriftshooken trekker nedlastede bytes fra bøtta, og nedlastingstråden venter når
+    den går i minus, så summen av alle jobbene holder seg under grensen. På hverdager i
+    arbeidstiden gjelder `work_limit` (0 = samme som `limit`), og med `hold_in_work_hours`
+    startes ingen nye jobber før arbeidstiden er over. Grensene er i bytes/s; 0 = ingen.
+    """
+    BURST_S = 1.0
+
+    def __init__(self, limit: float = 0, work_hours: tuple[int, int] | None = None, work_limit: float = 0,
+                 hold_in_work_hours: bool = False):
+        self.limit = max(0.0, float(limit))
+        self.work_hours = work_hours
+        self.work_limit = max(0.0, float(work_limit))
+        self.hold_in_work_hours = hold_in_work_hours
+        self._lock = threading.Lock()
+        self._tokens = 0.0
+        self._t = time.monotonic()
+
+
+    @classmethod
+    def from_config(cls, cfg: dict) -> "RateLimiter":
+        try:
+            work_hours = parse_work_hours(cfg.get("work_hours", ""))
+        except ValueError:
+            work_hours = None
+        return cls(limit=mbps_to_bytes(cfg.get("rate_limit_mbps", 0)), work_hours=work_hours,
+                   work_limit=mbps_to_bytes(cfg.get("work_hours_limit_mbps", 0)),
+                   hold_in_work_hours=bool(cfg.get("work_hours_hold", False)))
+
+
+    def in_work_hours(self, now: datetime | None = None) -> bool:
+        if not self.work_hours: return False
+        now = now or datetime.now()
+        if now.weekday() >= 5: return False
+        minute, (start, end) = now.hour * 60 + now.minute, self.work_hours
+        return start <= minute < end if start <= end else (minute >= start or minute < end)
+
+
+    def current_limit(self) -> float:
+        """Grensen som gjelder nå, i bytes/s (0 = ubegrenset)"""
+        return (self.work_limit or self.limit) if self.in_work_hours() else self.limit
+
+
+    def holding(self) -> bool:
+        """True når nye jobber skal vente til arbeidstiden er over"""
+        return self.hold_in_work_hours and self.in_work_hours()
+
+
+    def reserve(self, nbytes: int) -> float:
+        """Trekk nbytes fra bøtta; returnerer hvor mange sekunder tråden må vente"""
+        limit = self.current_limit()
+        if not limit or nbytes <= 0: return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(limit * self.BURST_S, self._tokens + (now - self._t) * limit)
+            self._t = now
+            self._tokens -= nbytes
+            return max(0.0, -self._tokens / limit)
+
+
+class SmartMp4PP(FFmpegPostProcessor):
+    """Gjør ferdig MP4 med minst mulig arbeid.
+
+    Strømmene undersøkes med ffprobe (eller info-dicten når ffprobe mangler): kodeker
+    MP4 takler (også VP9, Opus og FLAC) kopieres (remux), og bare det som ikke passer
+    omkodes – full omkoding er siste utvei. Valget rapporteres via `report`, slik at det havner i loggen. Med `max_height`
+    (flerformat-modus, der kilden kan være høyere enn MP4-målet) skaleres
+    høyere video ned til en egen fil, f.eks. "Tittel.1080p.mp4". Med `keep_source`
+    (originalen er også et utformat) overskrives aldri en MP4-kilde; den konverterte
+    filen får navnet "Tittel.konvertert.mp4".
+    """
+    MP4_VIDEO = {"h264", "hevc", "av1", "vp9", "mpeg4"}
+    MP4_AUDIO = {"aac", "mp3", "ac3", "eac3", "alac", "opus", "flac"}
+    # Kodeknavn fra yt-dlp (vcodec/acodec) → ffprobe-navn, brukt når ffprobe mangler
+    INFO_CODECS = {"avc1": "h264", "avc3": "h264", "h264": "h264", "hev1": "hevc", "hvc1": "hevc", "h265": "hevc",
+                   "av01": "av1", "av1": "av1", "vp09": "vp9", "vp9": "vp9", "mp4v": "mpeg4", "mp4a": "aac",
+                   "aac": "aac", "mp3": "mp3", "ac-3": "ac3", "ac3": "ac3", "ec-3": "eac3", "eac3": "eac3",
+                   "alac": "alac", "opus": "opus", "flac": "flac"}
+
+    def __init__(self, downloader=None, report=None, max_height: int | None = None, keep_source: bool = False):
+        super().__init__(downloader)
+        self._report = report or self.to_screen
+        self.max_height = max_height
+        self.keep_source = keep_source
+
+
+    def _probe_codecs(self, path: str) -> tuple[set[str], set[str], int] | None:
+        try:
+            streams = self.get_metadata_object(path).get("streams") or []
+        except Exception:
+            return None
+        video_streams = [s for s in streams if s.get("codec_type") == "video" and not (s.get("disposition") or {}).get("attached_pic")]
+        video = {s.get("codec_name") for s in video_streams}
+        audio = {s.get("codec_name") for s in streams if s.get("codec_type") == "audio"}
+        return video, audio, max((int(s.get("height") or 0) for s in video_streams), default=0)
+
+
+    def _info_codecs(self, info: dict) -> tuple[set[str], set[str], int]:
+        """Kodeker fra info-dicten (for hvert format i en fletting); ukjente blir "?" og omkodes"""
+        formats = info.get("requested_formats") or [info]
+        def names(field: str) -> set[str]:
+            found = {str(f.get(field) or "?").split(".")[0].lower() for f in formats}
+            return {self.INFO_CODECS.get(c, "?") for c in found if c != "none"}
+        return names("vcodec"), names("acodec"), info.get("height") or 0
+
+
+    @PostProcessor._restrict_to(images=False)
+    def run(self, info):
+        path, ext = info["filepath"], info["ext"].lower()
+        codecs = self._probe_codecs(path)
+        video, audio, height = codecs if codecs is not None else self._info_codecs(info)
+        scale = bool(self.max_height and height > self.max_height)
+        copy_video, copy_audio = video <= self.MP4_VIDEO and not scale, audio <= self.MP4_AUDIO
+        codec_txt = "/".join(sorted(c for c in video | audio if c and c != "?")) or "ukjente kodeker"
+        if scale:
+            self._report(f"  MP4: skalerer ned fra {height}p til {self.max_height}p ({codec_txt}) – kan ta tid.")
+        elif ext == "mp4" and copy_video and copy_audio:
+            self._report(f"  MP4: allerede MP4 med kompatible kodeker ({codec_txt}) – ingen behandling.")
+            return [], info
+        elif ext == "mp4" and codecs is None:
+            self._report(f"  MP4: allerede MP4, kodeker ikke undersøkt uten ffprobe ({codec_txt}) – ingen behandling.")
+            return [], info
+        elif copy_video and copy_audio:
+            self._report(f"  MP4: remux uten omkoding ({codec_txt}).")
+        elif copy_video:
+            self._report(f"  MP4: kopierer video, omkoder bare lyd til AAC ({codec_txt}).")
+        elif copy_audio:
+            self._report(f"  MP4: omkoder video til H.264, kopierer lyd ({codec_txt}) – kan ta tid.")
+        else:
+            self._report(f"  MP4: full omkoding ({codec_txt}) – kan ta tid.")
+        opts = ["-map", "0:V?", "-map", "0:a?", "-dn", "-ignore_unknown",
+                "-c:v", *(["copy"] if copy_video else ["libx264", "-preset", "fast", "-crf", "20"]),
+                *(["-vf", f"scale=-2:{self.max_height}"] if scale else []),
+                "-c:a", *(["copy"] if copy_audio else ["aac", "-b:a", "192k"]),
+                "-movflags", "+faststart"]
+        outpath = replace_extension(path, f"{self.max_height}p.mp4" if scale else "mp4", ext)
+        if self.keep_source and outpath == path: outpath = replace_extension(path, "konvertert.mp4", ext)
+        temp = prepend_extension(outpath, "temp")
+        self.run_ffmpeg(path, temp, opts)
+        os.replace(temp, outpath)
+        info["filepath"] = outpath
+        info["format"] = info["ext"] = "mp4"
+        if scale: info["height"], info["width"] = self.max_height, None
+        return ([path] if path != outpath else []), info
+
+
+class HandoffPP(PostProcessor):
+    """Sender ferdig nedlastede filer til etterbehandlingskøen i stedet for å kjøre ffmpeg
+    i nedlastingstråden, slik at tråden kan gå videre til neste nedlasting med en gang"""
+    def __init__(self, downloader=None, handoff=None):
+        super().__init__(downloader)
+        self._handoff = handoff
+
+
+    def run(self, info):
+        task = dict(info)
+        task.pop("__postprocessors", None)  # Fixups er allerede kjørt her
+        task["__files_to_move"] = dict(info.get("__files_to_move") or {})
+        self._handoff(task)
+        return [], info
+
+
+class JobParamsPP(PostProcessor):
+    """Setter innstillinger som varierer per jobb (fragmenter, fartsgrense, segmentert
+    nedlasting) rett før hver nedlasting, også for hvert spillelisteelement"""
+    def __init__(self, downloader=None, pick=None):
+        super().__init__(downloader)
+        self._pick = pick
+
+
+    def run(self, info):
+        self._downloader.params.update(self._pick(info))
+        return [], info
+
+
+class FilesExist(Exception):
+    """Alle utfilene finnes allerede; nedlastingen hoppes over (se Downloader._check_files)"""
+
+
+class FileCheckPP(PostProcessor):
+    """Kjører i samme prosessering som nedlastingen, når formatet er valgt men før noe
+    skrives, så filnavn og eksisterende filer kan sjekkes uten en egen formatvalgrunde"""
+    def __init__(self, downloader=None, check=None):
+        super().__init__(downloader)
+        self._check = check
+
+
+    def run(self, info):
+        self._check(info)
+        return [], info
+
+
+class RangeNotSupported(Exception):
+    """Serveren svarte på en Range-forespørsel med hele filen (eller feil del av den)"""
+
+
+class SegmentedHttpFD(HttpFD):
+    """Laster ned én stor progressiv fil (MP4/WebM over HTTP) over flere tilkoblinger.
+
+    Filen deles i HTTP Range-biter som hentes parallelt og skrives rett på plass i en
+    forhåndsallokert .seg.part-fil (hver tråd med egen filpeker og offset). Ferdige biter
+    lagres i en .seg.ytdl-fil ved siden av, så pause og krasj fortsetter der det stoppet,
+    og lengden sjekkes før filen får endelig navn. Støtter ikke serveren Range, eller er
+    filen mindre enn grensen, lastes den ned som før med HttpFD. Antall tilkoblinger og
+    grensen kommer fra info["downloader_options"] (se Downloader._mark_segmented).
+    """
+    MIN_CHUNK = 1024 * 1024
+    MAX_CHUNK = 16 * 1024 * 1024
+    BLOCK = 64 * 1024
+    HOOK_INTERVAL_S = 0.1
+    THROTTLE_PARAM = "nedlastarn_throttle"  # throttle(nbytes): trekk fra fartsgrensen og vent, per blokk
+
+    def real_download(self, filename, info_dict):
+        opts = info_dict.get("downloader_options") or {}
+        connections = int(opts.get("segments") or 0)
+        headers = HTTPHeaderDict({"Accept-Encoding": "identity"}, info_dict.get("http_headers"))
+        if (connections < 2 or filename == "-" or "Range" in headers or self.params.get("test")
+                or info_dict.get("request_data") or self._get_impersonate_target(info_dict) is not None):
+            return super().real_download(filename, info_dict)
+        total = self._probe_length(info_dict["url"], headers)
+        if not total or total < (opts.get("segment_min_bytes") or 0):
+            return super().real_download(filename, info_dict)
+        try:
+            return self._download_segments(filename, info_dict, headers, total, connections, opts.get("http_chunk_size"))
+        except RangeNotSupported:
+            return super().real_download(filename, info_dict)
+
+
+    def _probe_length(self, url: str, headers) -> int | None:
+        """Total lengde fra en Range-forespørsel på første byte; None hvis serveren ikke støtter Range"""
+        request = Request(url, None, headers)
+        request.headers["Range"] = "bytes=0-0"
+        try:
+            response = self.ydl.urlopen(request)
+        except (HTTPError, TransportError):
+            return None
+        with contextlib.closing(response):
+            start, _, total = parse_http_range(response.headers.get("Content-Range"))
+            return total if response.status == 206 and start == 0 else None
+
+
+    @staticmethod
+    def _load_state(state_path: str, tmp: str, total: int, chunk: int) -> set[int]:
+        """Bitene som allerede er ferdige, hvis .part-filen er fra samme fil og oppdeling"""
+        try:
+            state = json.loads(Path(state_path).read_text(encoding="utf-8"))
+            if state["total"] == total and state["chunk"] == chunk and os.path.getsize(tmp) == total:
+                return set(state["done"])
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        return set()
+
+
+    def _download_segments(self, filename: str, info_dict: dict, headers, total: int, connections: int,
+                           max_chunk: int | None) -> bool:
+        url = info_dict["url"]
+        tmp, state_path = f"{filename}.seg.part", f"{filename}.seg.ytdl"
+        chunk = max(self.MIN_CHUNK, min(total // (connections * 4), max_chunk or self.MAX_CHUNK, self.MAX_CHUNK))
+        ranges = [(start, min(start + chunk, total) - 1) for start in range(0, total, chunk)]
+        done = self._load_state(state_path, tmp, total, chunk) if self.params.get("continuedl", True) else set()
+        with open(tmp, "r+b" if done else "wb") as f:
+            f.truncate(total)  # Forhåndsallokert, så hver bit kan skrives på sin plass
+        todo = collections.deque(i for i in range(len(ranges)) if i not in done)
+        resumed = sum(ranges[i][1] - ranges[i][0] + 1 for i in done)
+        if resumed: self.report_resuming_byte(resumed)
+        lock, gate, stop = threading.Lock(), threading.Lock(), threading.Event()
+        counter = {"bytes": resumed, "active": 0}
+        errors: list[BaseException] = []
+        start_time = time.time()
+        throttle = self.params.get(self.THROTTLE_PARAM)
+
+        def fetch(index: int, out):
+            first, last = ranges[index]
+            pos, error = first, None
+            for _ in range(int(self.params.get("retries") or 0) + 1):
+                request = Request(url, None, headers)
+                request.headers["Range"] = f"bytes={pos}-{last}"
+                try:
+                    response = self.ydl.urlopen(request)
+                    with contextlib.closing(response):
+                        if response.status != 206 or parse_http_range(response.headers.get("Content-Range"))[0] != pos:
+                            raise RangeNotSupported(f"HTTP {response.status} for bytes={pos}-{last}")
+                        out.seek(pos)
+                        while pos <= last and not stop.is_set():
+                            want = min(self.BLOCK, last - pos + 1)
+                            if throttle is not None: throttle(want)  # Før lesingen, så summen av tilkoblingene holder grensen
+                            block = response.read(want)
+                            if not block: break
+                            out.write(block)
+                            pos += len(block)
+                            with lock: counter["bytes"] += len(block)
+                            with gate: pass  # Vent mens hovedtråden står i progress-hooken (pause)
+                            if throttle is None: self.slow_down(start_time, None, counter["bytes"] - resumed)
+                    if pos > last or stop.is_set(): return
+                    error = ContentTooShortError(pos - first, last - first + 1)
+                except HTTPError as e:
+                    if not 500 <= e.status < 600: raise
+                    error = e
+                except TransportError as e:
+                    error = e
+            raise error
+
+        def work():
+            try:
+                with open(tmp, "r+b") as out:
+                    while not stop.is_set():
+                        with lock:
+                            if not todo: return
+                            index = todo.popleft()
+                            counter["active"] += 1
+                        try:
+                            fetch(index, out)
+                        finally:
+                            with lock: counter["active"] -= 1
+                        if stop.is_set(): return
+                        with lock:
+                            done.add(index)
+                            Path(state_path).write_text(json.dumps({"total": total, "chunk": chunk, "done": sorted(done)}), encoding="utf-8")
+            except BaseException as e:
+                errors.append(e)
+                stop.set()
+
+        threads = [threading.Thread(target=work, daemon=True, name=f"{APP_NAME}-segment") for _ in range(min(connections, len(todo)))]
+        for t in threads: t.start()
+        try:
+            while any(t.is_alive() for t in threads):
+                stop.wait(self.HOOK_INTERVAL_S)
+                elapsed = time.time() - start_time
+                speed = (counter["bytes"] - resumed) / elapsed if elapsed > 0 else None
+                with gate:
+                    self._hook_progress({
+                        "status": "downloading", "downloaded_bytes": counter["bytes"], "total_bytes": total,
+                        "filename": filename, "tmpfilename": tmp, "elapsed": elapsed, "speed": speed,
+                        "eta": int((total - counter["bytes"]) / speed) if speed else None,
+                        "connections": counter["active"], "ctx_id": info_dict.get("ctx_id"),
+                    }, info_dict)
+        finally:
+            stop.set()
+            for t in threads: t.join()
+        if errors:
+            if isinstance(errors[0], DownloadCancelled): raise errors[0]  # Avbrutt eller pauset mens tråden ventet
+            if isinstance(errors[0], RangeNotSupported):
+                for path in (tmp, state_path): Path(path).unlink(missing_ok=True)
+                raise errors[0]
+            self.report_error(f"Segmentert nedlasting feilet: {errors[0]}")
+            return False
+        if len(done) != len(ranges) or os.path.getsize(tmp) != total:
+            self.report_error(f"Segmentert nedlasting ga feil lengde ({os.path.getsize(tmp)} av {total} bytes)")
+            return False
+        self.try_rename(tmp, filename)
+        Path(state_path).unlink(missing_ok=True)
+        self._hook_progress({
+            "status": "finished", "downloaded_bytes": total, "total_bytes": total, "filename": filename,
+            "elapsed": time.time() - start_time, "connections": len(threads), "ctx_id": info_dict.get("ctx_id"),
+        }, info_dict)
+        return True
+
+
+SEGMENTED_PROTOCOL = "nedlastarn_segmented"
+PROTOCOL_MAP[SEGMENTED_PROTOCOL] = SegmentedHttpFD  # Valgt per format av Downloader._mark_segmented
+
+
+class YdlSession:
+    """En YoutubeDL-instans som gjenbrukes gjennom batchen; `job` er jobben som låner den nå"""
+    def __init__(self):
+        self.ydl: YoutubeDL | None = None
+        self.job: DownloadJob | None = None
+
+
+class DownloadJob:
+    """Én URL i en batch, med egen tilstand og avbrytelse"""
+    def __init__(self, job_id: int, url: str):
+        self.id = job_id
+        self.url = url
+        host = (urlparse(url).hostname or "").lower()
+        self.host = host[4:] if host.startswith("www.") else host
+        self.state = "queued"  # queued | paused | running | postprocessing | done | skipped | failed | cancelled
+        self.priority = 0  # 1 = høy, 0 = normal, -1 = lav
+        self.pause_requested = False
+        self.cancelled = False
+        self.last_filename = None
+        self.last_pl_index = None
+        self.info_from_cache = False
+        self.use_cache = True
+        self.pl_decision_q: queue.Queue[str] = queue.Queue()
+        self.download_done = False
+        self.pp_pending = 0
+        self.pp_submitted = 0
+        self.pp_failed = False
+        self.fragments: int | None = None  # Samtidige fragmenter for nedlastingen som pågår
+        self.resume: dict | None = None  # Raden fra batch-journalen når batchen fortsettes
+        self.limiter: RateLimiter | None = None  # Egen fartsgrense i stedet for den felles
+        self.rate_seen: dict[str, int] = {}  # Bytes per fil som allerede er trukket fra fartsgrensen
+        self.parent: int | None = None  # Spillelistejobben elementet kom fra
+        self.ie_key: str | None = None  # Extractor fra spillelisten, så URLen ikke må matches på nytt
+        self.extra_info: dict = {}  # Spillelistefelter (playlist_index, n_entries …) som legges på info-dicten
+        self.check_files = False  # Sjekk utfilene når formatet er valgt (se FileCheckPP)
+
+
+    @functools.cached_property
+    def key(self) -> str:
+        """Duplikatnøkkel (se url_key); regnes ut først når den trengs, utenfor GUI-tråden"""
+        return url_key(self.url)
+
+
+    def requeue(self):
+        """Nullstill kjøretilstanden før jobben kjøres på nytt (fortsett etter pause eller prøv igjen)"""
+        self.cancelled = self.pause_requested = self.download_done = self.pp_failed = False
+        self.last_pl_index = None
+        self.use_cache = True
+        self.rate_seen = {}
+
+
+class Downloader(threading.Thread):
+    """Kjører en batch med URLer over flere samtidige arbeidertråder.
+
+    Meldinger til GUI-et legges på `msgs` som tupler merket med jobb-id:
+    ("log", tekst, job_id), ("job", job_id, tilstand) og ("ask_playlist", job_id, antall),
+    samt ("pp_status", aktive, i_kø) for etterbehandlingen.
+    Fremdrift går utenom køen, via `progress` (en ProgressChannel).
+
+    Jobbene er en kø: nye URLer kan legges til mens batchen kjører (`add_urls`), og hver
+    jobb kan få prioritet, flyttes, pauses, fortsettes eller prøves igjen. Batchen varer
+    til ingen jobber er i kø, pauset eller aktive. Køen lagres i batch-journalen.
+
+    Nedlasting og etterbehandling (ffmpeg) kjører i hver sin trådpool: nettverkstrådene
+    leverer ferdige filer til en kø og går videre, mens en pool på størrelse med antall
+    CPU-kjerner gjør konvertering/remux. Jobben er "done" når begge delene er ferdige.
+
+    Med mode="multi" lastes kilden ned én gang (i høyeste kvalitet et av `outputs` trenger),
+    og etterbehandlingen lager hvert utformat fra den, f.eks. [("mp4", "1080p"), ("mp3", "320"),
+    ("best", "")]. Kilden beholdes til alle er ferdige, og slettes bare hvis "best" (original)
+    ikke er blant dem.
+    """
+    def __init__(self, urls: list[str], out_dir: Path, mode: str, quality: str,
+                 browser: str, keep_norwegian: bool, overwrites: bool, msgs: queue.Queue,
+                 mp3_quality: str = "192", playlist_items: str | None = None,
+                 max_workers: int = 3, per_host_limit: int = 2, info_cache: InfoCache | None = None,
+                 cookie_store: CookieStore | None = None, progress_hz: float = 5.0, pp_workers: int = 0,
+                 fragment_tuner: FragmentTuner | None = None, journal: BatchJournal | None = None,
+                 batch_id: str | None = None, wait_on_paused: bool = True, rate_limiter: RateLimiter | None = None,
+                 report_path: Path | None = None, profile_path: Path | None = None, prefetcher: "Prefetcher | None" = None,
+                 outputs: list[tuple[str, str]] | None = None, segments: int = 0, segment_min_mb: float = 20):
+        super().__init__(daemon=True)
+        self.jobs = [DownloadJob(i, u) for i, u in enumerate(urls, 1)]
+        self.out_dir = out_dir
+        self.mode = mode
+        self.quality = quality
+        self.browser = browser
+        self.keep_norwegian = keep_norwegian
+        self.overwrites = overwrites
+        self.msgs = msgs
+        self.mp3_quality = mp3_quality
+        # Utformater i flerformat-modus; MP3 til slutt, så miniatyrbildet er der til EmbedThumbnail sletter det
+        self.outputs = sorted((tuple(o) for o in outputs or []), key=lambda o: o[0] == "mp3") if mode == "multi" else []
+        self.playlist_items = playlist_items
+        self.max_workers = max(1, int(max_workers))
+        self.per_host_limit = max(1, int(per_host_limit))
+        self.info_cache = info_cache
+        self.prefetcher = prefetcher  # Info hentet i bakgrunnen mens URLene ble limt inn
+        self.cookie_store = cookie_store or CookieStore(persist=False)
+        self.cookie_jar: YoutubeDLCookieJar | None = None
+        self.progress = ProgressChannel(progress_hz)
+        self.fragment_tuner = fragment_tuner or FragmentTuner()
+        self.journal = journal
+        self.batch_id = batch_id or uuid.uuid4().hex[:12]
+        self.archive: ArchiveView | None = None
+        self._sessions_lock = threading.Lock()
+        self._idle_sessions: dict[tuple, list[YdlSession]] = {}
+        self._all_sessions: list[YdlSession] = []
+        self._cancel = False
+        self._cond = threading.Condition()
+        self._pending = list(self.jobs)  # Køen i rekkefølge; høyere prioritet går først
+        self._host_active: dict[str, int] = {}
+        self._running = 0
+        self._closed = False  # Satt når arbeiderne er ferdige; da kan ingenting legges til
+        self.wait_on_paused = wait_on_paused  # False: pausede jobber holder ikke batchen i live (batch-modus)
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self._rate_lock = threading.Lock()
+        self._hold_logged = False
+        self.segments = max(0, int(segments))  # Tilkoblinger per stor progressiv fil; 0/1 = av
+        self.segment_min_bytes = int(float(segment_min_mb) * 1024 * 1024)
+        self.pp_workers = max(1, int(pp_workers) or os.cpu_count() or 2)
+        self._pp_q: queue.Queue[tuple | None] = queue.Queue()
+        self._pp_active = 0
+        self.duplicates = 0  # URL-varianter og spillelisteelementer som allerede var i batchen
+        self.timer = StageTimer()
+        self.report_path = report_path  # Ytelsesrapport (.json/.csv) etter batchen
+        self.profile_path = profile_path  # cProfile-dump av arbeidertrådene
+        self._profiles: list = []
+
+
+    @property
+    def urls(self) -> list[str]:
+        return [job.url for job in self.jobs]
+
+
+    def settings(self) -> dict:
+        """Innstillingene som trengs for å fortsette batchen senere (lagres i journalen)"""
+        return {"out_dir": str(self.out_dir), "mode": self.mode, "quality": self.quality, "browser": self.browser,
+                "mp3_quality": self.mp3_quality, "playlist_items": self.playlist_items, "outputs": self.outputs}
+
+
+    def log(self, text: str, job: DownloadJob | None = None):
+        self.msgs.put(("log", text, job.id if job else None))
+
+
+    def prog(self, job: DownloadJob, pct: float | None, downloaded: int | None = None, total: int | None = None, filename: str | None = None, item_info: dict | None = None):
+        self.progress.update(job.id, pct, downloaded, total, filename, item_info)
+
+
+    def _journal(self, job: DownloadJob, **fields):
+        if self.journal is not None:
+            self.journal.update(self.batch_id, job.url, **fields)
+
+
+    def _set_state(self, job: DownloadJob, state: str):
+        job.state = state
+        self._journal(job, stage="downloading" if state == "running" else state)
+        if state in ("done", "skipped", "failed", "cancelled"):
+            self.progress.finish(job.id, job.last_filename)
+        self.msgs.put(("job", job.id, state))
+
+
+    def _request_playlist_decision(self, job: DownloadJob, approx_total):
+        self.msgs.put(("ask_playlist", job.id, approx_total))
+
+
+    def set_playlist_decision(self, job_id: int, choice: str):
+        for job in self.jobs:
+            if job.id == job_id:
+                job.pl_decision_q.put(choice)
+
+
+    def _check_cancel(self, job: DownloadJob):
+        if self._cancel or job.cancelled:
+            raise DownloadCancelled("User cancelled")
+
+
+    def progress_hook(self, job: DownloadJob, d):
+        self._check_cancel(job)
+        if job.pause_requested: raise DownloadCancelled("Paused")
+        status = d.get("status")
+        info = d.get("info_dict", {}) or {}
+        fname = d.get("filename") or info.get("_filename")
+        if fname:
+            job.last_filename = fname
+        pl_index = info.get("playlist_index")
+        n_entries = info.get("n_entries") or info.get("playlist_count")
+        if pl_index and pl_index != job.last_pl_index:
+            job.last_pl_index = pl_index
+            total = int(n_entries) if n_entries else "?"
+            self.log(f"  Spilleliste-element: {pl_index} av {total}", job)
+        item_info = {"i": None, "n": None, "title": info.get("title"), "connections": d.get("connections")}
+        try:
+            if pl_index: item_info["i"] = int(pl_index)
+            if n_entries: item_info["n"] = int(n_entries)
+        except Exception: pass
+        if status == "downloading":
+            p = d.get("downloaded_bytes", 0)
+            t = d.get("total_bytes") or d.get("total_bytes_estimate", 0)
+            pct = (p / t * 100) if t else 0
+            if item_info.get("i") and item_info.get("n") and job.parent is None:  # Spillelisten lastes ned i samme jobb
+                overall_pct = ((item_info["i"] - 1) + (pct / 100.0)) / item_info["n"] * 100.0
+            else:
+                overall_pct = pct
+            self.prog(job, overall_pct, p, t, fname, item_info)
+            if self.journal is not None: self.journal.progress(self.batch_id, job.url, p, t)
+            if fname and p and "connections" not in d: self._throttle(job, fname, p)  # SegmentedHttpFD trekker selv
+        elif status == "finished":
+            self.log("  Ferdig nedlastet.", job)
+            if fname and "connections" not in d:  # Rester etter en avbrutt segmentert nedlasting (se SegmentedHttpFD)
+                for leftover in (f"{fname}.seg.part", f"{fname}.seg.ytdl"): Path(leftover).unlink(missing_ok=True)
+            if d.get("elapsed"): self.timer.add(job.id, "download", d["elapsed"], d.get("total_bytes") or d.get("downloaded_bytes") or 0)
+            if info.get("protocol") in FRAGMENT_PROTOCOLS and d.get("elapsed"):
+                nxt = self.fragment_tuner.record(job.host, job.fragments, d.get("total_bytes") or d.get("downloaded_bytes") or 0, d["elapsed"])
+                if nxt: self.log(f"  ⚙ Fragmenter for {job.host}: {job.fragments} → {nxt} samtidige", job)
+            self.prog(job, 100.0, None, None, fname, item_info)
+
+
+    def _limiter_for(self, job: DownloadJob) -> RateLimiter:
+        return job.limiter or self.rate_limiter
+
+
+    def _throttle(self, job: DownloadJob, fname: str, downloaded: int):
+        """Trekk nye bytes fra fartsgrensen og vent (i små steg, så avbryt/pause virker) ved behov"""
+        with self._rate_lock:
+            last = job.rate_seen.get(fname)
+            job.rate_seen[fname] = downloaded
+        if last is None: return  # Første måling (f.eks. fortsatt .part-fil) teller ikke
+        self._wait_for_limit(job, downloaded - last)
+
+
+    def _wait_for_limit(self, job: DownloadJob, nbytes: int, share: float = 1.0):
+        """Trekk nbytes fra fartsgrensen og vent ved behov; `share` er andelen av ventetiden som
+        føres som tid (tilkoblingene i en segmentert nedlasting venter samtidig)"""
+        wait = self._limiter_for(job).reserve(nbytes)
+        if wait > 0: self.timer.add(job.id, "throttle", wait * share)
+        while wait > 0:
+            time.sleep(min(wait, 0.25))
+            wait -= 0.25
+            self._check_cancel(job)
+            if job.pause_requested: raise DownloadCancelled("Paused")
+
+
+    def _job_params(self, job: DownloadJob, info: dict) -> dict:
+        """yt-dlp-innstillinger for neste nedlasting i jobben (se JobParamsPP)"""
+        if self.segments > 1: self._mark_segmented(info)
+        job.fragments = self.fragment_tuner.value(job.host)
+        limit = self._limiter_for(job).current_limit()
+        return {"concurrent_fragment_downloads": job.fragments, "ratelimit": int(limit) if limit else None,
+                SegmentedHttpFD.THROTTLE_PARAM: lambda nbytes: self._wait_for_limit(job, nbytes, 1 / max(1, self.segments))}
+
+
+    def _mark_segmented(self, info: dict):
+        """Send progressive HTTP-formater til SegmentedHttpFD; den faller selv tilbake til vanlig
+        nedlasting når filen er mindre enn grensen eller serveren ikke støtter Range"""
+        def changes(f: dict) -> dict:
+            size = f.get("filesize") or f.get("filesize_approx")
+            if determine_protocol(f) not in ("http", "https") or (size and size < self.segment_min_bytes): return {}
+            return {"protocol": SEGMENTED_PROTOCOL, "downloader_options": {
+                **(f.get("downloader_options") or {}), "segments": self.segments, "segment_min_bytes": self.segment_min_bytes}}
+        if info.get("requested_formats"):
+            info["requested_formats"] = [{**f, **changes(f)} for f in info["requested_formats"]]
+        else:
+            info.update(changes(info))
+
+
+    def _fmt_for_quality(self):
+        mode, hmax = self.mode, QUALITY_HEIGHTS.get(self.quality)
+        if mode == "multi":
+            # Kilden må holde til det beste utformatet; lavere MP4-kvalitet skaleres ned i etterbehandlingen
+            heights = [QUALITY_HEIGHTS.get(q) for m, q in self.outputs if m != "mp3"]
+            mode = "mp4" if heights else "mp3"
+            hmax = None if None in heights else max(heights, default=None)
+        if mode == "mp3": return "bestaudio/best"
+        if hmax: return f"bv*[height<={hmax}]+ba/best[height<={hmax}]"
+        return "bv*+ba/best"
+
+
+    def _opts_key(self, job: DownloadJob, stage: str = "download", target: tuple[str, str] | None = None) -> tuple:
+        """Alle innstillinger som gir en egen YoutubeDL-instans (modus, format, cookies, spilleliste, fase,
+        og utformatet som etterbehandles i flerformat-modus)"""
+        fmt = self._fmt_for_quality()
+        mode, mp3_quality, max_height = self.mode, self.mp3_quality, None
+        if target is not None:
+            mode, quality = target
+            if mode == "mp3": mp3_quality = quality
+            else: max_height = QUALITY_HEIGHTS.get(quality)
+        merge_fmt = pp_key = None
+        if mode == "mp4":
+            merge_fmt, pp_key = ("mkv", "FFmpegVideoRemuxer") if "nrk.no" in job.url.lower() else ("mp4", "SmartMp4")
+        browser = self.browser.lower() if self.browser and self.browser.lower() != "none" else None
+        playlist_items = self.playlist_items if self.playlist_items != "ASK" else None
+        return (mode, fmt, merge_fmt, pp_key, mp3_quality, browser, playlist_items, stage, max_height)
+
+
+    def _ydl_opts(self, key: tuple, session: YdlSession) -> dict:
+        mode, fmt, merge_fmt, pp_key, mp3_quality, browser, playlist_items, stage, _max_height = key
+        targets = {m for m, _ in self.outputs}
+        def pp_hook(d):
+            self._check_cancel(session.job)
+            name = d.get("postprocessor")
+            if name not in ("Handoff", "JobParams", "FileCheck"):
+                if d.get("status") == "started": self.timer.start(session.job.id, f"pp:{name}")
+                elif d.get("status") == "finished": self.timer.stop(session.job.id, f"pp:{name}")
+        opts = {
+            "outtmpl": str(self.out_dir / DEFAULT_OUTPUT_TEMPLATE),
+            "progress_hooks": [lambda d: self.progress_hook(session.job, d)], "noprogress": True,
+            "nopart": False, "continuedl": True,  # .part-filer fortsettes med HTTP Range etter krasj/avbrudd
+            "concurrent_fragment_downloads": FragmentTuner.DEFAULT_N, "retries": 5, "fragment_retries": 5,
+            "socket_timeout": 20, "overwrites": self.overwrites,
+            "restrictfilenames": not self.keep_norwegian, "windowsfilenames": True,
+            "trim_file_name": 200, "download_archive": DeferredArchive(self.archive) if self.archive is not None else None,
+            "quiet": True, "no_warnings": True, "extractor_args": {"youtube": {"skip": ["translated_subs"]}},
+            "postprocessor_hooks": [pp_hook], "format": fmt,
+        }
+        if ALLOWED_EXTRACTORS is not None:
+            opts["allowed_extractors"] = [re.escape(name) for name in sorted(ALLOWED_EXTRACTORS)]
+        if mode == "mp4":
+            # Ved lik oppløsning foretrekkes H.264/AAC, som kan remuxes rett til MP4
+            opts.update({"merge_output_format": merge_fmt, "format_sort": ["res", "vcodec:h264", "acodec:aac"]})
+            if pp_key != "SmartMp4" and stage == "postprocess":
+                opts["postprocessors"] = [{"key": pp_key, "preferedformat": merge_fmt}]
+        elif mode == "mp3":
+            opts["writethumbnail"] = True
+            if stage == "postprocess":
+                opts["postprocessors"] = [{"key": "FFmpegExtractAudio", "preferredcodec": "mp3", "preferredquality": mp3_quality}, {"key": "EmbedThumbnail"}, {"key": "FFmpegMetadata"}]
+        elif mode == "multi":
+            # Kildeformatet bestemmes i _fmt_for_quality; ingen merge_output_format, så originalen beholdes som den er
+            if "mp4" in targets: opts["format_sort"] = ["res", "vcodec:h264", "acodec:aac"]
+            opts["writethumbnail"] = "mp3" in targets
+        if stage == "postprocess" and self.mode == "multi":
+            opts["keepvideo"] = True  # Kilden trengs til neste utformat; slettes i _postprocess_targets
+        if playlist_items:
+            opts["playlist_items"] = playlist_items
+        return opts
+
+
+    @contextlib.contextmanager
+    def _session(self, job: DownloadJob, stage: str = "download", target: tuple[str, str] | None = None):
+        """Lån en YoutubeDL-instans for jobbens innstillinger.
+
+        Instansene lever hele batchen, så innstillinger, arkiv, cookies og
+        HTTP-tilkoblinger (keep-alive) settes opp én gang per innstillingssett
+        i stedet for per URL. Én instans brukes bare av én jobb om gangen.
+        Nedlastingsinstanser har bare HandoffPP; ffmpeg-stegene ligger i egne
+        instanser for etterbehandlingspoolen (stage="postprocess").
+        """
+        key = self._opts_key(job, stage, target)
+        playlist_items = key[6]
+        with self._sessions_lock:
+            idle = self._idle_sessions.setdefault(key, [])
+            session = idle.pop() if idle else None
+        if session is None:
+            session = YdlSession()
+            session.ydl = YoutubeDL(self._ydl_opts(key, session))
+            if self.cookie_jar is not None:
+                session.ydl.cookiejar = self.cookie_jar  # Delt jar i stedet for egen lesing av nettleseren
+            if stage == "download":
+                session.ydl.add_post_processor(HandoffPP(session.ydl, handoff=lambda info: self._submit_pp(session.job, info)))
+                session.ydl.add_post_processor(FileCheckPP(session.ydl, check=lambda info: self._check_files(session.job, session.ydl, info)), when="video")
+                session.ydl.add_post_processor(JobParamsPP(session.ydl, pick=lambda info: self._job_params(session.job, info)), when="before_dl")
+            elif key[3] == "SmartMp4":
+                session.ydl.add_post_processor(SmartMp4PP(session.ydl, report=lambda msg: self.log(msg, session.job),
+                                                          max_height=key[8], keep_source=("best", "") in self.outputs))
+            with self._sessions_lock:
+                self._all_sessions.append(session)
+        session.job = job
+        if playlist_items: session.ydl.params["playlist_items"] = playlist_items
+        else: session.ydl.params.pop("playlist_items", None)
+        try:
+            yield session.ydl
+        finally:
+            session.job = None
+            with self._sessions_lock:
+                self._idle_sessions[key].append(session)
+
+
+    def _close_sessions(self):
+        with self._sessions_lock:
+            sessions, self._all_sessions, self._idle_sessions = self._all_sessions, [], {}
+        for session in sessions:
+            try: session.ydl.close()
+            except Exception: pass
+
+
+    def _extract_once(self, ydl: YoutubeDL, job: DownloadJob) -> dict | None:
+        """Kjør extractoren én gang uten å løse opp spillelisteelementer.
+
+        Resultatet mates senere rett inn i process_ie_result, så verken nettsiden
+        eller spillelisten hentes på nytt når nedlastingen starter. Rene
+        videresendinger ("url") følges her, slik at vi vet om det er en spilleliste
+        før brukeren spørres. Returnerer None hvis URLen allerede er i arkivet.
+        Metadata-bufferen sjekkes først og oppdateres etter en ekte ekstraksjon.
+        """
+        url = job.url
+        job.info_from_cache = False
+        info = self.prefetcher.take(url, self.browser) if self.prefetcher and job.use_cache else None
+        if info is not None:
+            job.info_from_cache = True
+            self.log("⚡ Metadata var hentet mens URLen ble limt inn.", job)
+        elif self.info_cache and job.use_cache and (info := self.info_cache.get(url)) is not None:
+            job.info_from_cache = True
+            self.log("⚡ Bruker bufret metadata.", job)
+        else:
+            info = extract_unprocessed(ydl, url, job.ie_key)
+            if self.info_cache and isinstance(info, dict):
+                self.info_cache.put(url, info)
+        return {**info, **job.extra_info} if job.extra_info and isinstance(info, dict) else info
+
+
+    def _download_url(self, job: DownloadJob):
+        url = job.url
+        self.log(f"\n▶ Nedlasting: {unsmuggle_url(url)[0]}", job)
+        self.prog(job, 0.0)
+        if self.archive is not None and self.archive.contains_url(url):
+            self.log("⚠ Finnes allerede i nedlastingsarkivet – hopper over.", job)
+            self._set_state(job, "skipped")
+            return
+        with self._session(job) as ydl, self._resumed_format(ydl, job):
+            self.log("Starter nedlasting…", job)
+            with self.timer.stage(job.id, "extract"):
+                info = self._extract_once(ydl, job)
+            is_playlist = isinstance(info, dict) and info.get("_type") in ("playlist", "multi_video")
+            if info is None or (not is_playlist and ydl.in_download_archive(info)):
+                self.log("⚠ Finnes allerede i nedlastingsarkivet – hopper over.", job)
+                self._set_state(job, "skipped")
+                return
+            if is_playlist and self.playlist_items == "ASK":
+                entries = info.get("entries")
+                approx_total = info.get("playlist_count") or (len(entries) if isinstance(entries, list) else "?")
+                self._request_playlist_decision(job, approx_total)
+                decision = job.pl_decision_q.get(timeout=3600)
+                if decision == "cancel": raise DownloadCancelled("User cancelled")
+                elif decision == "first": ydl.params["playlist_items"] = "1"
+                else: ydl.params.pop("playlist_items", None)
+            if is_playlist:
+                self.log("📜 Playliste oppdaget – elementene legges i køen etter hvert som de listes opp.", job)
+                with self.timer.stage(job.id, "playlist"):
+                    self._expand_playlist(job, ydl, info)
+                return
+            # Én prosessering: info fra ekstraksjonen gjenbrukes, og FileCheckPP sjekker filene etter formatvalget
+            job.check_files = True
+            self.timer.start(job.id, "format")
+            try:
+                ydl.process_ie_result(info, download=True)
+            except FilesExist:
+                self._set_state(job, "skipped")
+                return
+            finally:
+                job.check_files = False
+                self.timer.stop(job.id, "format")
+        if job.pp_submitted: self.log("  Nedlasting ferdig – resten skjer i etterbehandlingen.", job)
+        else: self.log("✅ Ferdig for denne URLen.", job)
+
+
+    def _check_files(self, job: DownloadJob, ydl: YoutubeDL, info: dict):
+        """Journalfør valgt format og filnavn, og hopp over når alle utfilene finnes (se FileCheckPP)"""
+        if not job.check_files: return  # Spillelisteelementer som lastes ned direkte i foreldrejobben
+        job.check_files = False
+        self.timer.stop(job.id, "format")
+        if not (name := ydl.prepare_filename(info)): return
+        prep_name = Path(name)
+        final_paths = self._final_paths(prep_name, info, "nrk.no" in job.url.lower())
+        job.last_filename = str(final_paths[0])
+        self._journal(job, format_id=info.get("format_id"), filename=str(final_paths[0]))
+        if not (existing := [p for p in final_paths if p.exists()]): return
+        names = ", ".join(p.name for p in existing)
+        half = [p for p in existing if p != prep_name]
+        if (job.resume or {}).get("stage") == "postprocessing" and half and prep_name.exists():
+            # Kilden finnes fortsatt, så etterbehandlingen ble avbrutt og utfilene kan være halvferdige
+            self.log(f"↻ Etterbehandlingen ble avbrutt sist – lager {', '.join(p.name for p in half)} på nytt.", job)
+            for path in half: path.unlink(missing_ok=True)
+        elif self.overwrites:
+            self.log(f"↻ Overskriver eksisterende fil: {names}", job)
+        elif len(existing) == len(final_paths):
+            self.log(f"⚠ Fil finnes allerede – hopper over: {names}", job)
+            raise FilesExist(names)
+
+
+    def _final_paths(self, prep_name: Path, info: dict, is_nrk_url: bool) -> list[Path]:
+        """Filene nedlastingen ender som: én per utformat i flerformat-modus, ellers én"""
+        targets = self.outputs or [(self.mode, self.quality)]
+        paths = []
+        for mode, quality in targets:
+            if mode == "mp3": paths.append(prep_name.with_suffix(".mp3"))
+            elif mode != "mp4": paths.append(prep_name)
+            elif is_nrk_url: paths.append(prep_name.with_suffix(".mkv"))
+            elif self.outputs and (height := QUALITY_HEIGHTS.get(quality)) and (info.get("height") or 0) > height:
+                paths.append(prep_name.with_suffix(f".{height}p.mp4"))  # Skaleres ned av SmartMp4PP
+            else: paths.append(prep_name.with_suffix(".mp4"))
+        return paths
+
+
+    def _expand_playlist(self, job: DownloadJob, ydl: YoutubeDL, info: dict):
+        """Legg spillelisteelementene i køen etter hvert som de listes opp.
+
+        Oppføringene hentes lat (side for side) og løses ikke opp her: hvert element
+        blir en egen jobb som neste ledige arbeider løser opp og laster ned, så første
+        nedlasting starter mens resten av listen fortsatt hentes, og info-dictene
+        holdes ikke i minnet for hele listen. Elementer som extractoren allerede har
+        løst opp, lastes ned direkte her.
+        """
+        try:
+            entries = PlaylistEntries(ydl, info)
+        except EntryNotInPlaylist:
+            self.log("⚠ Spillelisten er tom.", job)
+            return
+        n_entries = info.get("playlist_count") or entries.get_full_count()
+        context = {"playlist": info.get("title") or info.get("id"), "playlist_id": info.get("id"),
+                   "playlist_title": info.get("title"), "n_entries": n_entries}
+        children, archived, duplicates, count = [], 0, 0, 0
+        with self._host_slot_released(job):
+            for index, entry in entries.get_requested_items():
+                self._check_cancel(job)
+                if not isinstance(entry, dict): continue
+                count += 1
+                if ydl.in_download_archive(entry):
+                    archived += 1
+                    continue
+                extra = {**context, "playlist_index": index}
+                if entry.get("_type") not in ("url", "url_transparent"):
+                    ydl.process_ie_result({**entry, **extra}, download=True)
+                    continue
+                child = DownloadJob(0, entry["url"])
+                child.parent, child.ie_key, child.priority = job.id, entry.get("ie_key"), job.priority
+                if entry.get("ie_key") and entry.get("id"): child.key = make_archive_id(entry["ie_key"], entry["id"])
+                if entry["_type"] == "url_transparent":
+                    extra = {**{k: v for k, v in entry.items() if k not in ("_type", "url", "ie_key") and v is not None}, **extra}
+                child.extra_info = extra
+                if self._add_jobs([child], parent=job): children.append(child)
+                else: duplicates += 1
+        for child in children:
+            if child.state == "queued": child.extra_info["n_entries"] = count  # Antallet er kjent først nå
+        self.duplicates += duplicates
+        skipped = [f"{duplicates} var allerede i køen"] * bool(duplicates) + [f"{archived} finnes allerede i arkivet"] * bool(archived)
+        self.log(f"📜 Spilleliste: {len(children)} element(er) lagt i køen" + (f" ({', '.join(skipped)})." if skipped else "."), job)
+
+
+    @contextlib.contextmanager
+    def _host_slot_released(self, job: DownloadJob):
+        """Gi fra seg jobbens plass hos verten, så spillelisteelementene kan starte mens listen hentes"""
+        with self._cond:
+            self._host_active[job.host] -= 1
+            self._cond.notify_all()
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._host_active[job.host] += 1
+
+
+    @contextlib.contextmanager
+    def _resumed_format(self, ydl: YoutubeDL, job: DownloadJob):
+        """En fortsatt jobb velger formatet fra journalen først, så de halve .part-filene passer"""
+        format_id = (job.resume or {}).get("format_id")
+        default = ydl.format_selector
+        if format_id: ydl.format_selector = ydl.build_format_selector(f"{format_id}/{ydl.params['format']}")
+        try:
+            yield
+        finally:
+            ydl.format_selector = default
+
+
+    def _run_job(self, job: DownloadJob):
+        self._set_state(job, "running")
+        try:
+            self._check_cancel(job)
+            try:
+                self._download_url(job)
+            except DownloadError:
+                if not job.info_from_cache: raise
+                # Bufrede format-URLer kan ha utløpt før TTL – prøv én gang med fersk ekstraksjon
+                if self.info_cache: self.info_cache.invalidate(job.url)
+                self.log("↻ Bufret metadata var utdatert – henter på nytt…", job)
+                job.use_cache = False
+                self._download_url(job)
+        except DownloadCancelled:
+            if job.pause_requested and not (self._cancel or job.cancelled):
+                self.log("⏸ Pauset – fortsetter fra .part-filen senere.", job)
+                with self._cond:
+                    job.state = "paused"
+                    self._pending.insert(0, job)
+                self._set_state(job, "paused")
+                return
+            self.log("⛔ Avbrutt.", job)
+            self._set_state(job, "cancelled")
+        except DownloadError as e:
+            self.log(f"❌ Nedlastingsfeil: {e}", job)
+            self._set_state(job, "failed")
+        except FileNotFoundError:
+            self.log("❌ FFmpeg ikke funnet. Legg ffmpeg.exe i samme mappe.", job)
+            self._set_state(job, "failed")
+        except Exception as e:
+            self.log(f"❌ Uventet feil: {e}", job)
+            self._set_state(job, "failed")
+        self._settle(job, download_done=True)
+
+
+    def _settle(self, job: DownloadJob, download_done: bool = False, pp_done: bool = False):
+        """Sett sluttilstand når både nedlasting og all etterbehandling for jobben er ferdig"""
+        with self._cond:
+            if download_done: job.download_done = True
+            if pp_done: job.pp_pending -= 1
+            if not job.download_done or job.state not in ("running", "postprocessing"):
+                return
+            if job.pp_pending:
+                state = "postprocessing"
+            else:
+                state = "failed" if job.pp_failed else "done"
+        if state != job.state: self._set_state(job, state)
+
+
+    def _pp_status(self):
+        self.msgs.put(("pp_status", self._pp_active, self._pp_q.qsize()))
+
+
+    def _submit_pp(self, job: DownloadJob, info: dict):
+        with self._cond:
+            job.pp_pending += 1
+            job.pp_submitted += 1
+        self._journal(job, stage="downloaded")
+        self._pp_q.put((job, info, time.monotonic()))
+        self._pp_status()
+
+
+    def _postprocess(self, job: DownloadJob, info: dict):
+        """Kjør etterbehandlingen for én ferdig nedlastet fil og registrer den i arkivet"""
+        self._journal(job, stage="postprocessing")
+        if self.outputs:
+            self._postprocess_targets(job, info)
+            return
+        with self._session(job, "postprocess") as ydl:
+            if self.mode in ("mp3", "mp4"):
+                self.log(f"  Etterbehandler: {Path(info['filepath']).name}", job)
+            info = ydl.post_process(info["filepath"], info, info.pop("__files_to_move"))
+        job.last_filename = info["filepath"]
+        if self.archive is not None: self.archive.record_info(info)
+        self.log(f"✅ Lagret: {Path(info['filepath']).name}", job)
+
+
+    def _postprocess_targets(self, job: DownloadJob, info: dict):
+        """Lag hvert utformat fra den samme nedlastede kilden (flerformat-modus).
+
+        Kilden ligger i mappen til alle utformatene er ferdige, og slettes deretter med
+        mindre den selv er et av dem (original, eller MP4 som ikke trengte behandling).
+        """
+        source, files_to_move = info["filepath"], info.pop("__files_to_move")
+        kept, failed = set(), []
+        for target in self.outputs:
+            self._check_cancel(job)
+            label = f"{target[0].upper()} {target[1]}".strip() if target[0] != "best" else "original"
+            try:
+                if target[0] == "best":
+                    out = {**info, "filepath": source}
+                else:
+                    self.log(f"  Etterbehandler ({label}): {Path(source).name}", job)
+                    with self._session(job, "postprocess", target) as ydl:
+                        out = ydl.post_process(source, dict(info), dict(files_to_move))
+            except DownloadCancelled:
+                raise
+            except Exception as e:
+                self.log(f"❌ {label} feilet: {e}", job)
+                failed.append(label)
+                continue
+            kept.add(os.path.abspath(out["filepath"]))
+            job.last_filename = out["filepath"]
+            self.log(f"✅ Lagret ({label}): {Path(out['filepath']).name}", job)
+        if os.path.abspath(source) not in kept and not failed:
+            with contextlib.suppress(OSError): os.remove(source)
+        if failed:
+            raise RuntimeError(f"{', '.join(failed)} ble ikke laget (kilden er beholdt: {Path(source).name})")
+        if self.archive is not None: self.archive.record_info(info)
+
+
+    def _pp_worker_loop(self):
+        while (task := self._pp_q.get()) is not None:
+            job, info, submitted = task
+            self.timer.add(job.id, "pp_wait", time.monotonic() - submitted)
+            with self._cond: self._pp_active += 1
+            self._pp_status()
+            try:
+                self._check_cancel(job)
+                with self.timer.stage(job.id, "postprocess"):
+                    self._postprocess(job, info)
+            except DownloadCancelled:
+                job.pp_failed = True
+            except FileNotFoundError:
+                self.log("❌ FFmpeg ikke funnet. Legg ffmpeg.exe i samme mappe.", job)
+                job.pp_failed = True
+            except Exception as e:
+                self.log(f"❌ Etterbehandling feilet: {e}", job)
+                job.pp_failed = True
+            finally:
+                with self._cond: self._pp_active -= 1
+                self._pp_status()
+                if (self._cancel or job.cancelled) and job.state in ("running", "postprocessing"):
+                    self._set_state(job, "cancelled")
+                self._settle(job, pp_done=True)
+
+
+    def _drop_duplicates(self):
+        """Slå sammen varianter av samme URL (samme url_key) før start"""
+        with self._cond:
+            unique = list({job.key: job for job in reversed(self.jobs)}.values())[::-1]
+            dropped = len(self.jobs) - len(unique)
+            for i, job in enumerate(unique, 1): job.id = i
+            self.jobs, self._pending = unique, list(unique)
+        if dropped:
+            self.duplicates += dropped
+            self.log(f"🔁 {dropped} duplikat(er) fjernet – samme video med ulike URLer lastes bare ned én gang.")
+
+
+    def _skip_archived(self):
+        """Hopp over URLer som allerede er i arkivet (video-ID lest fra URLen) uten å bruke en arbeider"""
+        archived = [job for job in self.jobs if self.archive is not None and self.archive.contains_url(job.url)]
+        if archived:
+            with self._cond:
+                for job in archived: self._pending.remove(job)
+            for job in archived: self._set_state(job, "skipped")
+            self.log(f"⚠ {len(archived)} URL(er) finnes allerede i nedlastingsarkivet – hoppes over.")
+
+
+    def _next_job(self) -> DownloadJob | None:
+        """Hent neste jobb (høyest prioritet først) hvis verten har ledig kapasitet, ellers vent.
+
+        Arbeiderne venter så lenge noe kjører eller er pauset, siden det kan komme nye
+        jobber (add_urls, retry, unpause); None når køen er tom og ingenting er aktivt.
+        """
+        with self._cond:
+            while True:
+                waiting = any(job.state == "queued" for job in self._pending) or (self.wait_on_paused and self._pending)
+                if self._cancel or self._closed or not (waiting or self._running):
+                    self._closed = True
+                    self._cond.notify_all()
+                    return None
+                holding = self.rate_limiter.holding()
+                if holding != self._hold_logged:
+                    self._hold_logged = holding
+                    if holding: self.log("🌙 Arbeidstid – nye nedlastinger venter til arbeidstiden er over.")
+                for job in sorted(self._pending, key=lambda j: -j.priority):
+                    if holding and job.limiter is None: continue  # Jobber med egen fartsgrense kan kjøre likevel
+                    if job.state == "queued" and self._host_active.get(job.host, 0) < self.per_host_limit:
+                        self._pending.remove(job)
+                        self._host_active[job.host] = self._host_active.get(job.host, 0) + 1
+                        self._running += 1
+                        return job
+                self._cond.wait(timeout=30 if holding else None)
+
+
+    def _release_job(self, job: DownloadJob):
+        with self._cond:
+            self._host_active[job.host] -= 1
+            self._running -= 1
+            self._cond.notify_all()
+
+
+    def _worker_loop(self):
+        while (job := self._next_job()) is not None:
+            try:
+                if job.cancelled: self._set_state(job, "cancelled")
+                else: self._run_job(job)
+            finally:
+                self._release_job(job)
+
+
+    def run(self):
+        t0 = time.monotonic()
+        try:
+            self.out_dir.mkdir(parents=True, exist_ok=True)
+        except OSError as e:
+            self.log(f"❌ Kunne ikke opprette mappen {self.out_dir}: {e}")
+            return
+        try:
+            self.archive = DownloadArchive().open_folder(self.out_dir)
+        except sqlite3.Error as e:
+            self.log(f"⚠ Nedlastingsarkivet er utilgjengelig ({e}) – fortsetter uten.")
+        if self.browser and self.browser.lower() != "none":
+            try:
+                with self.timer.stage(None, "cookies"):
+                    self.cookie_jar = self.cookie_store.get(self.browser.lower())
+            except Exception as e:
+                self.log(f"❌ Kunne ikke lese cookies fra {self.browser}: {e}")
+                for job in self.jobs: self._set_state(job, "failed")
+                return
+            self.log(f"Bruker cookies fra nettleser: {self.browser} ({len(self.cookie_jar)} stk)")
+        self._drop_duplicates()
+        if self.journal is not None:
+            try:
+                previous = self.journal.begin(self.batch_id, self.settings(), self.urls)
+            except sqlite3.Error as e:
+                self.log(f"⚠ Batch-journalen er utilgjengelig ({e}) – fortsetter uten.")
+                self.journal = None
+            else:
+                for job in self.jobs:
+                    job.resume = previous.get(job.url)
+                    if job.resume:
+                        job.priority = job.resume["priority"]
+                        if job.resume["stage"] == "paused": job.state = "paused"
+                started = sum(1 for job in self.jobs if job.resume and job.resume["stage"] != "queued")
+                if started: self.log(f"↻ Fortsetter forrige batch: {started} URLer var påbegynt.")
+        self._skip_archived()
+        n_workers = self.max_workers  # Ledige arbeidere venter på jobber som legges til underveis
+        workers = [threading.Thread(target=self._profiled(self._worker_loop), daemon=True, name=f"{APP_NAME}-worker-{i}") for i in range(n_workers)]
+        pp_workers = [threading.Thread(target=self._profiled(self._pp_worker_loop), daemon=True, name=f"{APP_NAME}-pp-{i}") for i in range(self.pp_workers)]
+        for w in workers + pp_workers: w.start()
+        for w in workers: w.join()
+        for _ in pp_workers: self._pp_q.put(None)
+        for w in pp_workers: w.join()
+        self._close_sessions()
+        for job in self.jobs:
+            if job.state == "queued": self._set_state(job, "cancelled")
+        if self.journal is not None and self.journal.finish(self.batch_id):
+            self.log("↻ Uferdige URLer er lagret i batch-journalen og kan fortsettes senere.")
+        self._report(time.monotonic() - t0)
+        if self._cancel:
+            self.log("⛔ Avbrutt.")
+            return
+        counts = {state: sum(1 for j in self.jobs if j.state == state) for state in ("done", "skipped", "failed")}
+        if counts["failed"] or counts["skipped"]:
+            self.log(f"\n🏁 Batch ferdig: {counts['done']} fullført, {counts['skipped']} hoppet over, {counts['failed']} feilet. Filer i: {self.out_dir}")
+        else:
+            self.log(f"\n🎉 Alle nedlastinger fullført. Filer i: {self.out_dir}")
+
+
+    def _profiled(self, target):
+        """Kjør tråden under cProfile når profile_path er satt; profilene slås sammen i _report"""
+        if self.profile_path is None: return target
+        import cProfile
+
+        def run():
+            prof = cProfile.Profile()
+            try:
+                prof.enable()
+            except ValueError:  # Python 3.12+: bare én profiler om gangen, og den måler alle tråder
+                return target()
+            self._profiles.append(prof)
+            try:
+                target()
+            finally:
+                prof.disable()
+        return run
+
+
+    def _report(self, wall_s: float):
+        """Tidsbruk per fase i loggen, og ytelsesrapport/profil til fil når det er bedt om"""
+        if any(job.state in ("done", "failed", "postprocessing") for job in self.jobs):
+            self.log("\n" + self.timer.summary(wall_s))
+        if self.report_path is not None:
+            try:
+                self.timer.write(Path(self.report_path), self.jobs, wall_s, self.batch_id)
+                self.log(f"📊 Ytelsesrapport lagret: {self.report_path}")
+            except OSError as e:
+                self.log(f"⚠ Kunne ikke lagre ytelsesrapporten: {e}")
+        if self._profiles:
+            import pstats
+            stats = pstats.Stats(*self._profiles)
+            try:
+                Path(self.profile_path).parent.mkdir(parents=True, exist_ok=True)
+                stats.dump_stats(str(self.profile_path))
+                self.log(f"📊 Profil lagret: {self.profile_path} (les med python -m pstats)")
+            except OSError as e:
+                self.log(f"⚠ Kunne ikke lagre profilen: {e}")
+
+
+    def _find(self, job_id: int) -> DownloadJob | None:
+        return next((job for job in self.jobs if job.id == job_id), None)
+
+
+    def cancel(self, job_id: int | None = None):
+        """Avbryt hele batchen, eller bare én jobb hvis job_id er gitt"""
+        dropped = None
+        with self._cond:
+            if job_id is None:
+                self._cancel = True
+            elif job := self._find(job_id):
+                job.cancelled = True
+                if job.state == "paused" and job in self._pending:
+                    self._pending.remove(job)
+                    dropped = job
+            self._cond.notify_all()
+        if dropped: self._set_state(dropped, "cancelled")
+
+
+    def add_urls(self, urls: list[str]) -> list[DownloadJob] | None:
+        """Legg URLer til i køen mens batchen kjører; URLer (og varianter av dem) som allerede er i batchen hoppes over.
+        Returnerer de nye jobbene, eller None hvis batchen allerede er avsluttet."""
+        return self._add_jobs([DownloadJob(0, url) for url in dict.fromkeys(urls)])
+
+
+    def _add_jobs(self, new: list[DownloadJob], parent: DownloadJob | None = None) -> list[DownloadJob] | None:
+        """Nummerer og legg nye jobber i køen; duplikater av jobber i batchen (samme url_key) hoppes over.
+        Spillelisteelementer (parent) går foran resten av køen, etter elementene fra samme spilleliste."""
+        for job in new: job.key  # Utenfor låsen: kan måtte prøve alle extractorene
+        with self._cond:
+            if self._closed or self._cancel: return None
+            known = {job.key for job in self.jobs}
+            new = [job for job in new if job.key not in known and not known.add(job.key)]
+            for i, job in enumerate(new, len(self.jobs) + 1): job.id = i
+            self.jobs.extend(new)
+            if parent is None: self._pending.extend(new)
+            else:
+                pos = next((i for i, j in enumerate(self._pending) if j.parent != parent.id), len(self._pending))
+                self._pending[pos:pos] = new
+            self._cond.notify_all()
+        if new and self.journal is not None:
+            self.journal.add(self.batch_id, [job.url for job in new], start=len(self.jobs) - len(new))
+        for job in new: self.msgs.put(("job", job.id, job.state))
+        return new
+
+
+    def queue_order(self) -> list[DownloadJob]:
+        """Alle jobber i visningsrekkefølge: aktive, køen (slik den kjøres), så ferdige"""
+        with self._cond:
+            pending = sorted(self._pending, key=lambda j: -j.priority)
+            active = [job for job in self.jobs if job.state in ("running", "postprocessing") and job not in pending]
+            rest = [job for job in self.jobs if job not in pending and job not in active]
+        return active + pending + rest
+
+
+    def _save_order(self):
+        if self.journal is not None:
+            self.journal.reorder(self.batch_id, [job.url for job in self.queue_order()])
+
+
+    def set_priority(self, job_id: int, priority: int):
+        with self._cond:
+            if not (job := self._find(job_id)): return
+            job.priority = priority
+            self._cond.notify_all()
+        self._journal(job, priority=priority)
+        self._save_order()
+
+
+    def move(self, job_id: int, delta: int):
+        """Flytt en ventende jobb opp (delta < 0) eller ned i køen blant jobber med samme prioritet"""
+        with self._cond:
+            job = self._find(job_id)
+            if job not in self._pending: return
+            same = [j for j in self._pending if j.priority == job.priority]
+            target = same.index(job) + delta
+            if not 0 <= target < len(same): return
+            i, j = self._pending.index(job), self._pending.index(same[target])
+            self._pending[i], self._pending[j] = self._pending[j], self._pending[i]
+        self._save_order()
+
+
+    def set_rate_limit(self, job_id: int, limit: float | None):
+        """Egen fartsgrense for én jobb i bytes/s (0 = ubegrenset); None = bruk den felles grensen"""
+        with self._cond:
+            if not (job := self._find(job_id)): return
+            job.limiter = None if limit is None else RateLimiter(limit)
+            self._cond.notify_all()
+
+
+    def pause(self, job_id: int):
+        """Pause en ventende jobb, eller stopp en aktiv nedlasting så den kan fortsette fra .part-filen"""
+        with self._cond:
+            if not (job := self._find(job_id)): return
+            if job.state == "queued":
+                job.state = "paused"
+            elif job.state == "running":
+                job.pause_requested = True
+                return
+            else:
+                return
+        self._set_state(job, "paused")
+
+
+    def unpause(self, job_id: int):
+        with self._cond:
+            if not (job := self._find(job_id)) or job.state != "paused": return
+            job.requeue()
+            job.state = "queued"
+            self._cond.notify_all()
+        self._set_state(job, "queued")
+
+
+    def retry(self, job_id: int):
+        """Legg en feilet eller avbrutt jobb tilbake i køen"""
+        with self._cond:
+            if self._closed or self._cancel or not (job := self._find(job_id)) or job.state not in ("failed", "cancelled"): return
+            job.requeue()
+            job.state = "queued"
+            self._pending.append(job)
+            self._cond.notify_all()
+        self._set_state(job, "queued")
@@ -0,0 +1,107 @@
+"""Analyse av URL-feltet i bakgrunnen (gyldighet, duplikater, spillelister) for GUI-et – kun standardbiblioteket"""
+import threading
+from urllib.parse import urlparse
+
+from nedlastarn_config import APP_NAME, _url_is_valid
+
+
+class UrlAnalyzer:
+    """Validerer og klassifiserer linjene i URL-feltet utenfor GUI-tråden.
+
+    GUI-et sender hele teksten etter en kort pause i skrivingen (`submit`), og bare
+    siste innsendte tekst analyseres. Hver linje klassifiseres bare første gang den sees
+    (buffer per linjetekst), så en liste med 10 000 linjer koster bare for linjene som
+    er endret. `classify` (url → (duplikatnøkkel, spilleliste?)) settes når
+    nedlastingsmotoren er lastet; den kan ta flere millisekunder per ukjent nettsted, så
+    en rask analyse uten den leveres først, og klassifiseringen avbrytes når ny tekst
+    kommer inn. Resultatene leveres via `deliver(generation, analyse)`.
+    """
+    MAX_CACHE = 50_000
+
+    def __init__(self, deliver, classify=None):
+        self.deliver = deliver
+        self.classify = classify
+        self._lock = threading.Lock()
+        self._cache: dict[str, dict] = {}
+        self._latest: tuple[int, str] | None = None
+        self._wake = threading.Event()
+        threading.Thread(target=self._run, daemon=True, name=f"{APP_NAME}-urls").start()
+
+
+    def set_classifier(self, classify):
+        with self._lock:
+            self.classify = classify
+            self._cache.clear()
+
+
+    def submit(self, generation: int, text: str):
+        self._latest = (generation, text)
+        self._wake.set()
+
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            generation, text = self._latest
+            quick = self.analyze(text, classify=False)
+            self.deliver(generation, quick)
+            if not quick["pending"]: continue
+            result = self.analyze(text, stop=self._wake.is_set)
+            if result is not None: self.deliver(generation, result)
+
+
+    @staticmethod
+    def _quick(url: str) -> dict:
+        if not _url_is_valid(url): return {"valid": False}
+        host = (urlparse(url).hostname or "").lower()
+        return {"valid": True, "key": url, "playlist": "list=" in url, "nrk": host == "nrk.no" or host.endswith(".nrk.no"),
+                "host": host[4:] if host.startswith("www.") else host}
+
+
+    def _line(self, url: str, classify: bool) -> tuple[dict, bool]:
+        """(linjeinfo, mangler klassifisering)"""
+        with self._lock:
+            info, classifier = self._cache.get(url), self.classify
+        if info is not None: return info, False
+        info = self._quick(url)
+        if not info["valid"] or classifier is None: return self._store(url, info), False
+        if not classify: return info, True
+        try:
+            info["key"], info["playlist"] = classifier(url)
+        except Exception:
+            pass  # Beholder den enkle analysen
+        return self._store(url, info), False
+
+
+    def _store(self, url: str, info: dict) -> dict:
+        with self._lock:
+            if len(self._cache) > self.MAX_CACHE: self._cache.clear()
+            self._cache[url] = info
+        return info
+
+
+    def analyze(self, text: str, classify: bool = True, stop=None) -> dict | None:
+        """{"urls": gyldige URLer, "lines": [(linjenr, url)], "invalid": [(linjenr, tekst)], "counts": {...},
+        "pending": linjer som ikke er klassifisert ennå}; None hvis `stop()` ble sann underveis"""
+        urls, lines, invalid, keys, hosts = [], [], [], set(), set()
+        counts = {"playlists": 0, "nrk": 0, "duplicates": 0}
+        pending = 0
+        for n, raw in enumerate(text.splitlines(), 1):
+            url = raw.strip()
+            if not url: continue
+            if stop is not None and stop(): return None
+            info, missing = self._line(url, classify)
+            pending += missing
+            if not info["valid"]:
+                invalid.append((n, url))
+                continue
+            urls.append(url)
+            lines.append((n, url))
+            if info["key"] in keys: counts["duplicates"] += 1
+            keys.add(info["key"])
+            hosts.add(info["host"])
+            counts["playlists"] += info["playlist"]
+            counts["nrk"] += info["nrk"]
+        counts.update(urls=len(urls), invalid=len(invalid), sites=len(hosts))
+        return {"urls": urls, "lines": lines, "invalid": invalid, "counts": counts, "pending": pending}